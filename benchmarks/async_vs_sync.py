@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark : débit de l'API selon le type de worker gunicorn (sync ou gevent)
+
+Lance l'API sous gunicorn devant un faux Dolibarr lent, puis monte la
+concurrence par paliers sur GET /api/products/<id>. Pour chaque mode, affiche
+débit et latences par palier et le débit maximal tenu avec un p99 sous la cible.
+
+Usage : python benchmarks/async_vs_sync.py [--modes sync gevent] [--latency-ms 100]
+        [--concurrency 8 32 64 128] [--duration 5] [--p99-target-ms 500]
+"""
+import argparse
+import itertools
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+import fake_dolibarr
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ecommerce-api')
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def start_api(mode, port, workers, dolibarr_url):
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        API_WORKER_CLASS=mode,
+        API_WORKERS=str(workers),
+        DOLIBARR_API_URL=dolibarr_url,
+        DOLIBARR_POOL_SIZE='100',
+        DB_HOST='127.0.0.1',
+        DB_POOL_MIN_SIZE='0',
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=API_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'{url}/api/status/dolibarr', timeout=1)
+            return process, url
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"L'API ({mode}) n'a pas démarré")
+
+
+def load(url, path, product_ids, concurrency, duration):
+    """Charge en boucle fermée : `concurrency` clients enchaînent les requêtes pendant `duration` s"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    ids = itertools.cycle(product_ids)
+    stop_at = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        local, failed = [], 0
+        while time.monotonic() < stop_at:
+            with lock:
+                product_id = next(ids)
+            start = time.perf_counter()
+            try:
+                response = session.get(url + path.format(id=product_id), timeout=30)
+                ok = response.status_code == 200
+            except requests.exceptions.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if ok:
+                local.append(elapsed)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - started
+
+    return {
+        'rps': len(latencies) / wall,
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'errors': errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['sync', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--latency-ms', type=float, default=100.0)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[8, 32, 64, 128])
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--p99-target-ms', type=float, default=500.0)
+    parser.add_argument('--path', default='/api/products/{id}')
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    dolibarr = fake_dolibarr.start(products=args.products, latency_ms=args.latency_ms)
+    product_ids = [product['id'] for product in dolibarr.products]
+    print(f"Faux Dolibarr : {args.latency_ms:.0f} ms par appel, {args.workers} workers gunicorn, "
+          f"cible p99 {args.p99_target_ms:.0f} ms")
+
+    summary = {}
+    for mode in args.modes:
+        process, url = start_api(mode, args.port, args.workers, dolibarr.url)
+        try:
+            print(f"\n{mode}")
+            print(f"{'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'erreurs':>8}")
+            best = 0.0
+            for concurrency in args.concurrency:
+                result = load(url, args.path, product_ids, concurrency, args.duration)
+                print(f"{concurrency:>8} {result['rps']:>8.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} "
+                      f"{result['p99']:>8.1f} {result['errors']:>8}")
+                if result['p99'] <= args.p99_target_ms and not result['errors']:
+                    best = max(best, result['rps'])
+            summary[mode] = best
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print(f"\nDébit maximal avec p99 <= {args.p99_target_ms:.0f} ms")
+    for mode, best in summary.items():
+        print(f"{mode:>8} {best:>8.1f} req/s")
+    dolibarr.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Faux Dolibarr pour les benchmarks : sert /api/index.php/products[/<id>] et
+accepte les POST de thirdparties et orders (création de client et de commande
+du checkout) avec une latence et un taux d'erreur configurables, sans base de
+données. Avec --etag, les réponses portent un ETag et If-None-Match donne un 304.
+
+Usage : python benchmarks/fake_dolibarr.py [--port 8081] [--products 500] [--latency-ms 100] [--error-rate 0] [--etag]
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+PRODUCT_PATH_RE = re.compile(r'^/api/index\.php/products(?:/(\d+))?/?$')
+CREATE_PATH_RE = re.compile(r'^/api/index\.php/(thirdparties|orders)/?$')
+SEASONS = ('Hiver', 'Printemps', 'Été', 'Automne')
+CATEGORIES = ('Fruits', 'Légumes', 'Produits Transformés')
+
+
+def make_products(count):
+    return [
+        {
+            'id': str(product_id),
+            'ref': f'P{product_id:05d}',
+            'label': f'{CATEGORIES[product_id % 3]} {SEASONS[product_id % 4]} n°{product_id}',
+            'description': f'Produit de test {product_id}',
+            'price': f'{1 + product_id % 20}.50',
+        }
+        for product_id in range(1, count + 1)
+    ]
+
+
+class FakeDolibarr(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, products=500, latency_ms=100.0, error_rate=0.0, etag=False, catalog=None):
+        super().__init__(address, _Handler)
+        # catalog : produits à servir (ex. ceux de la base de benchmark), sinon `products` produits générés
+        self.products = catalog if catalog is not None else make_products(products)
+        self.by_id = {product['id']: product for product in self.products}
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.etag = etag
+        self.requests = 0
+        self.created = {'thirdparties': 0, 'orders': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        etag = f'"{hashlib.md5(body).hexdigest()}"' if self.server.etag and status == 200 else None
+        if etag and self.headers.get('If-None-Match') == etag:
+            status, body = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay_or_fail(self):
+        """Latence simulée ; True si l'appel échoue (taux d'erreur)"""
+        server = self.server
+        with server._lock:
+            server.requests += 1
+        if server.latency_ms:
+            time.sleep(server.latency_ms / 1000)
+        if server.error_rate and random.random() < server.error_rate:
+            self._send(503, {'error': {'code': 503, 'message': 'Service Unavailable'}})
+            return True
+        return False
+
+    def do_GET(self):
+        server = self.server
+        if self._delay_or_fail():
+            return
+
+        match = PRODUCT_PATH_RE.match(urlsplit(self.path).path)
+        if not match:
+            return self._send(404, {'error': {'code': 404, 'message': 'Not found'}})
+        if match.group(1) is None:
+            return self._send(200, server.products)
+        product = server.by_id.get(match.group(1))
+        if product is None:
+            return self._send(404, {'error': {'code': 404, 'message': 'Product not found'}})
+        return self._send(200, product)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self._delay_or_fail():
+            return
+        match = CREATE_PATH_RE.match(urlsplit(self.path).path)
+        if not match:
+            return self._send(404, {'error': {'code': 404, 'message': 'Not found'}})
+        server = self.server
+        with server._lock:
+            server.created[match.group(1)] += 1
+            created_id = server.created[match.group(1)]
+        # Objet portant l'identifiant créé, forme lue par le checkout du frontend
+        return self._send(200, {'id': created_id})
+
+
+def start(port=0, **options):
+    """Démarre le faux Dolibarr dans un thread ; renvoie le serveur (server.url, server.shutdown())"""
+    server = FakeDolibarr(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, name='fake-dolibarr', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=100.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--etag', action='store_true')
+    args = parser.parse_args()
+
+    server = FakeDolibarr(('127.0.0.1', args.port), products=args.products,
+                          latency_ms=args.latency_ms, error_rate=args.error_rate, etag=args.etag)
+    print(f"Faux Dolibarr sur {server.url} ({args.products} produits, {args.latency_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Benchmark : scénarios de bout en bout (frontend → API → Dolibarr / MariaDB)
+
+Lance l'API (gunicorn) et le frontend devant un faux Dolibarr (latence, taux
+d'erreur et taille du catalogue configurables) et une base MariaDB initialisée
+par database/init-dolibarr.sql, complétée de produits de benchmark
+(réf. BENCH-xxxxx, stock fixe) que sert aussi le faux Dolibarr.
+
+Chaque scénario tourne en boucle fermée : --concurrency clients enchaînent
+les itérations pendant --warmup puis --duration secondes, seules les
+secondes mesurées comptent. Pour chaque scénario : itérations par seconde,
+latences p50/p95/p99 d'une itération, erreurs. --baseline compare à des
+résultats enregistrés par --save-baseline et sort en erreur si un scénario
+régresse au-delà de --tolerance.
+
+Base : --db docker démarre un conteneur MariaDB jetable (image et script
+d'initialisation de docker-compose) ; --db external utilise --db-host /
+--db-port (par exemple la base de docker-compose, port publié).
+
+Usage : python benchmarks/load_suite.py [--db docker|external] [--products 500] [--latency-ms 50]
+        [--error-rate 0] [--scenarios browse product cart checkout admin_stock stock_export stock_import]
+        [--concurrency 8] [--duration 10] [--warmup 2] [--cart-lines 5] [--output results.json]
+        [--baseline benchmarks/baseline.json] [--save-baseline] [--tolerance 0.15]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import mysql.connector
+import requests
+
+import fake_dolibarr
+from async_vs_sync import percentile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+API_DIR = os.path.join(ROOT, 'ecommerce-api')
+FRONTEND_DIR = os.path.join(ROOT, 'ecommerce-frontend')
+INIT_SQL = os.path.join(ROOT, 'database', 'init-dolibarr.sql')
+
+DB_USER, DB_PASSWORD, DB_NAME = 'dolibarr', 'dolibarrpass', 'dolibarr'
+DOCKER_NAME = 'ecommerce-bench-db'
+DOCKER_IMAGE = 'mariadb:10.11'
+
+BENCH_REF = 'BENCH-{:05d}'
+BENCH_STOCK = 1000
+WAREHOUSE_ID = 1
+
+# Paramètres qui doivent être identiques pour comparer deux exécutions
+COMPARED_PARAMETERS = ('products', 'latency_ms', 'error_rate', 'concurrency', 'cart_lines', 'import_rows',
+                       'api_workers', 'frontend_workers')
+
+# Textes affichés par le frontend quand l'API ou Dolibarr ont échoué (réponse 200 malgré tout)
+ERROR_MARKERS = ('Impossible de charger', 'Impossible de calculer', 'Erreur de connexion', 'Erreur lors')
+
+
+# --- Base de données -------------------------------------------------------
+
+def start_docker_db(port):
+    subprocess.run(['docker', 'rm', '-f', DOCKER_NAME], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subprocess.run([
+        'docker', 'run', '-d', '--rm', '--name', DOCKER_NAME,
+        '-e', 'MYSQL_ROOT_PASSWORD=rootpass',
+        '-e', f'MYSQL_DATABASE={DB_NAME}',
+        '-e', f'MYSQL_USER={DB_USER}',
+        '-e', f'MYSQL_PASSWORD={DB_PASSWORD}',
+        '-p', f'127.0.0.1:{port}:3306',
+        '-v', f'{INIT_SQL}:/docker-entrypoint-initdb.d/init-dolibarr.sql:ro',
+        DOCKER_IMAGE,
+    ], check=True, stdout=subprocess.DEVNULL)
+
+
+def stop_docker_db():
+    subprocess.run(['docker', 'rm', '-f', DOCKER_NAME], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for_db(config, timeout):
+    """Attend que la base réponde, script d'initialisation compris (le serveur n'écoute en TCP qu'ensuite)"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            conn = mysql.connector.connect(**config)
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM llx_product")
+            cursor.fetchall()
+            conn.close()
+            return
+        except mysql.connector.Error as e:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Base de données indisponible: {e}")
+            time.sleep(2)
+
+
+def seed_catalog(config, count):
+    """Crée au besoin les produits BENCH-00001.. et remet leur stock à BENCH_STOCK ; renvoie le catalogue du faux Dolibarr"""
+    generated = fake_dolibarr.make_products(count)
+    conn = mysql.connector.connect(**config)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT ref, rowid FROM llx_product WHERE ref LIKE 'BENCH-%'")
+        existing = dict(cursor.fetchall())
+        missing = [product for number, product in enumerate(generated, start=1)
+                   if BENCH_REF.format(number) not in existing]
+        if missing:
+            cursor.executemany(
+                "INSERT INTO llx_product (ref, entity, label, description, price, price_ttc, tosell, tobuy, datec) "
+                "VALUES (%s, 1, %s, %s, %s, %s, 1, 1, NOW())",
+                [(BENCH_REF.format(int(product['id'])), product['label'], product['description'],
+                  product['price'], product['price']) for product in missing]
+            )
+        cursor.execute("SELECT ref, rowid FROM llx_product WHERE ref LIKE 'BENCH-%'")
+        rowids = dict(cursor.fetchall())
+
+        catalog = []
+        for number, product in enumerate(generated, start=1):
+            catalog.append(dict(product, id=str(rowids[BENCH_REF.format(number)]), ref=BENCH_REF.format(number)))
+        cursor.executemany(
+            "INSERT INTO llx_product_stock (fk_product, fk_entrepot, reel) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE reel = VALUES(reel)",
+            [(int(product['id']), WAREHOUSE_ID, BENCH_STOCK) for product in catalog]
+        )
+        conn.commit()
+        cursor.close()
+        return catalog
+    finally:
+        conn.close()
+
+
+# --- Services --------------------------------------------------------------
+
+def start_service(name, cwd, command, env, health_url):
+    process = subprocess.Popen(command, cwd=cwd, env=dict(os.environ, **env),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} s'est arrêté au démarrage (code {process.returncode})")
+        try:
+            # /ready : 503 tant que le préchauffage n'est pas terminé
+            response = requests.get(health_url, timeout=1)
+            if response.status_code == 200:
+                print(f"{name} prêt (préchauffage {response.json()['duration_seconds']} s)")
+                return process
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{name} n'a pas démarré")
+
+
+def start_api(args, db_config, dolibarr_url):
+    env = {
+        'PORT': str(args.api_port),
+        'API_WORKER_CLASS': args.api_worker_class,
+        'API_WORKERS': str(args.api_workers),
+        'DOLIBARR_API_URL': dolibarr_url,
+        'DOLIBARR_POOL_SIZE': '100',
+        'DB_HOST': db_config['host'],
+        'DB_PORT': str(db_config['port']),
+        'DB_USER': db_config['user'],
+        'DB_PASSWORD': db_config['password'],
+        'DB_NAME': db_config['database'],
+        'FRONTEND_PURGE_URLS': '',
+        'LOG_LEVEL': 'WARNING',
+    }
+    url = f'http://127.0.0.1:{args.api_port}'
+    process = start_service('API', API_DIR, [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                            env, f'{url}/ready')
+    return process, url
+
+
+def start_frontend(args, api_url):
+    env = {'API_URL': api_url, 'LOG_LEVEL': 'WARNING'}
+    url = f'http://127.0.0.1:{args.frontend_port}'
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{args.frontend_port}',
+               '-w', str(args.frontend_workers), '-k', 'gthread', '--threads', '16', 'app:app']
+    return start_service('Frontend', FRONTEND_DIR, command, env, f'{url}/ready'), url
+
+
+# --- Scénarios -------------------------------------------------------------
+
+class Context:
+    def __init__(self, frontend_url, catalog, cart_lines, import_rows):
+        self.frontend = frontend_url
+        self.product_ids = [product['id'] for product in catalog]
+        self.search_terms = sorted({word for product in catalog for word in product['label'].split()
+                                    if word.isalpha() and len(word) > 3})
+        self.cart_lines = min(cart_lines, len(self.product_ids))
+        self.import_csv = 'product_id,stock\n' + ''.join(
+            f'{product_id},{BENCH_STOCK}\n' for product_id in self.product_ids[:import_rows]
+        )
+
+
+def _page_ok(response):
+    return response.status_code == 200 and not any(marker in response.text for marker in ERROR_MARKERS)
+
+
+def _fill_cart(session, rng, ctx):
+    session.cookies.clear()
+    for product_id in rng.sample(ctx.product_ids, ctx.cart_lines):
+        response = session.post(f'{ctx.frontend}/add_to_cart', data={'product_id': product_id, 'quantity': rng.randint(1, 3)},
+                                allow_redirects=False)
+        if response.status_code != 302:
+            return False
+    return True
+
+
+def browse(session, rng, ctx):
+    """Page d'accueil avec un filtre tiré au hasard (recherche, saison, catégorie ou aucun)"""
+    params = {}
+    choice = rng.random()
+    if choice < 0.25:
+        params['search'] = rng.choice(ctx.search_terms)
+    elif choice < 0.5:
+        params['season'] = rng.choice(fake_dolibarr.SEASONS)
+    elif choice < 0.75:
+        params['category'] = rng.choice(fake_dolibarr.CATEGORIES)
+    return _page_ok(session.get(f'{ctx.frontend}/', params=params))
+
+
+def product(session, rng, ctx):
+    """Fiche produit avec son stock"""
+    return _page_ok(session.get(f'{ctx.frontend}/product/{rng.choice(ctx.product_ids)}'))
+
+
+def cart(session, rng, ctx):
+    """Panier de --cart-lines lignes, puis affichage du panier chiffré"""
+    return _fill_cart(session, rng, ctx) and _page_ok(session.get(f'{ctx.frontend}/cart'))
+
+
+def checkout(session, rng, ctx):
+    """Panier, puis commande : chiffrage, création du client et de la commande dans Dolibarr"""
+    if not _fill_cart(session, rng, ctx):
+        return False
+    response = session.post(f'{ctx.frontend}/checkout', data={
+        'name': 'Client Benchmark', 'email': 'bench@example.com', 'address': '1 rue du Verger', 'phone': '0600000000',
+    })
+    return response.status_code == 200 and 'confirmée' in response.text
+
+
+def admin_stock(session, rng, ctx):
+    """Première page de la gestion des stocks"""
+    return _page_ok(session.get(f'{ctx.frontend}/admin/stock'))
+
+
+def stock_export(session, rng, ctx):
+    """Export CSV complet des stocks, lu jusqu'au bout"""
+    with session.get(f'{ctx.frontend}/admin/stock/export', stream=True) as response:
+        if response.status_code != 200 or not response.headers.get('Content-Type', '').startswith('text/csv'):
+            return False
+        for _ in response.iter_content(65536):
+            pass
+    return True
+
+
+def stock_import(session, rng, ctx):
+    """Import CSV de --import-rows lignes (stocks inchangés), attendu jusqu'à la fin du traitement"""
+    response = session.post(f'{ctx.frontend}/admin/stock/import',
+                            files={'file': ('benchmark.csv', io.BytesIO(ctx.import_csv.encode()), 'text/csv')},
+                            allow_redirects=False)
+    location = response.headers.get('Location', '')
+    if response.status_code != 302 or '/admin/stock/import/' not in location:
+        return False
+    status_url = f"{ctx.frontend}/admin/stock/import/{location.rstrip('/').rsplit('/', 1)[-1]}"
+    while True:
+        job = session.get(status_url, params={'format': 'json'}).json()
+        if job.get('status') not in ('queued', 'running'):
+            return job.get('status') == 'done'
+        time.sleep(0.05)
+
+
+# Scénario : (fonction d'une itération, concurrence maximale)
+SCENARIOS = {
+    'browse': (browse, None),
+    'product': (product, None),
+    'cart': (cart, None),
+    'checkout': (checkout, None),
+    'admin_stock': (admin_stock, None),
+    'stock_export': (stock_export, 4),
+    # Les imports sont sérialisés côté base : plus de clients n'ajoute que de l'attente
+    'stock_import': (stock_import, 2),
+}
+
+
+def run_scenario(iteration, ctx, concurrency, warmup, duration, seed):
+    """Boucle fermée ; ne compte que les itérations commencées après le préchauffage"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    measure_from = time.monotonic() + warmup
+    stop_at = measure_from + duration
+
+    def client(index):
+        session = requests.Session()
+        rng = random.Random(seed * 1000 + index)
+        local, failed = [], 0
+        while True:
+            started_at = time.monotonic()
+            if started_at >= stop_at:
+                break
+            start = time.perf_counter()
+            try:
+                ok = iteration(session, rng, ctx)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if started_at < measure_from:
+                continue
+            if ok:
+                local.append(elapsed)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    total = len(latencies) + errors[0]
+    return {
+        'concurrency': concurrency,
+        'iterations': len(latencies),
+        'rps': len(latencies) / duration,
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'errors': errors[0],
+        'error_rate': errors[0] / total if total else 0.0,
+    }
+
+
+# --- Rapport ---------------------------------------------------------------
+
+def print_results(results):
+    print(f"\n{'scénario':<14} {'clients':>7} {'it/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'erreurs':>8}")
+    for name, result in results.items():
+        print(f"{name:<14} {result['concurrency']:>7} {result['rps']:>8.1f} {result['p50']:>8.1f} "
+              f"{result['p95']:>8.1f} {result['p99']:>8.1f} {result['errors']:>8}")
+
+
+def compare(results, parameters, baseline, tolerance):
+    """Affiche les écarts à la référence ; renvoie les scénarios en régression"""
+    different = [key for key in COMPARED_PARAMETERS if baseline['parameters'].get(key) != parameters.get(key)]
+    if different:
+        print(f"\nAttention : paramètres différents de la référence ({', '.join(different)}), comparaison indicative")
+    print(f"\nComparaison avec la référence {baseline['parameters'].get('commit') or ''} (tolérance {tolerance:.0%})")
+    print(f"{'scénario':<14} {'p95 réf.':>9} {'p95':>9} {'écart':>7} {'it/s réf.':>10} {'it/s':>8} {'écart':>7}")
+    regressions = []
+    for name, result in results.items():
+        reference = baseline['scenarios'].get(name)
+        if reference is None:
+            print(f"{name:<14} (absent de la référence)")
+            continue
+        p95_delta = result['p95'] / reference['p95'] - 1 if reference['p95'] else 0.0
+        rps_delta = result['rps'] / reference['rps'] - 1 if reference['rps'] else 0.0
+        regressed = (p95_delta > tolerance or rps_delta < -tolerance
+                     or result['error_rate'] > reference['error_rate'] + 0.01)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<14} {reference['p95']:>9.1f} {result['p95']:>9.1f} {p95_delta:>+7.0%} "
+              f"{reference['rps']:>10.1f} {result['rps']:>8.1f} {rps_delta:>+7.0%}{'  RÉGRESSION' if regressed else ''}")
+    return regressions
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', choices=('docker', 'external'), default='docker')
+    parser.add_argument('--db-host', default='127.0.0.1')
+    parser.add_argument('--db-port', type=int, default=3307)
+    parser.add_argument('--db-timeout', type=float, default=300.0)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--cart-lines', type=int, default=5)
+    parser.add_argument('--import-rows', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--api-port', type=int, default=5098)
+    parser.add_argument('--api-workers', type=int, default=2)
+    parser.add_argument('--api-worker-class', default='gevent')
+    parser.add_argument('--frontend-port', type=int, default=5097)
+    parser.add_argument('--frontend-workers', type=int, default=2)
+    parser.add_argument('--output', help="Fichier JSON des résultats")
+    parser.add_argument('--baseline', help="Résultats de référence à comparer (JSON)")
+    parser.add_argument('--save-baseline', action='store_true', help="Enregistre les résultats comme référence (--baseline)")
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+
+    db_config = {'host': args.db_host, 'port': args.db_port, 'user': DB_USER, 'password': DB_PASSWORD, 'database': DB_NAME}
+    processes = []
+    dolibarr = None
+    try:
+        if args.db == 'docker':
+            print(f"Base MariaDB jetable ({DOCKER_IMAGE}) sur le port {args.db_port}, initialisée par {os.path.relpath(INIT_SQL, ROOT)}")
+            start_docker_db(args.db_port)
+        wait_for_db(db_config, args.db_timeout)
+        catalog = seed_catalog(db_config, args.products)
+
+        dolibarr = fake_dolibarr.start(latency_ms=args.latency_ms, error_rate=args.error_rate, catalog=catalog)
+        api_process, api_url = start_api(args, db_config, dolibarr.url)
+        processes.append(api_process)
+        frontend_process, frontend_url = start_frontend(args, api_url)
+        processes.append(frontend_process)
+        print(f"Faux Dolibarr : {len(catalog)} produits, {args.latency_ms:.0f} ms par appel, "
+              f"{args.error_rate:.0%} d'erreurs ; {args.concurrency} clients, {args.duration:.0f} s par scénario")
+
+        ctx = Context(frontend_url, catalog, args.cart_lines, args.import_rows)
+        results = {}
+        for name in args.scenarios:
+            iteration, max_concurrency = SCENARIOS[name]
+            concurrency = min(args.concurrency, max_concurrency or args.concurrency)
+            print(f"  {name}...", flush=True)
+            results[name] = run_scenario(iteration, ctx, concurrency, args.warmup, args.duration, args.seed)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+        if dolibarr is not None:
+            dolibarr.shutdown()
+        if args.db == 'docker':
+            stop_docker_db()
+
+    print_results(results)
+
+    parameters = {key: getattr(args, key) for key in COMPARED_PARAMETERS}
+    parameters.update(duration=args.duration, seed=args.seed, commit=current_commit(),
+                      python=platform.python_version(), date=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    report = {'parameters': parameters, 'scenarios': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+        print(f"\nRéférence enregistrée dans {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, encoding='utf-8') as source:
+            regressions = compare(results, parameters, json.load(source), args.tolerance)
+        if regressions:
+            print(f"\nRégression : {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark : nombre d'allers-retours SQL de GET /api/orders selon le nombre de commandes
+
+Remplace les connexions du pool MariaDB de l'API par une connexion factice qui
+compte les appels à execute() et sert des commandes synthétiques (3 lignes chacune).
+
+Usage : python benchmarks/orders_round_trips.py [nombre de commandes ...]
+"""
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ecommerce-api'))
+
+import app as api  # noqa: E402
+
+LINES_PER_ORDER = 3
+
+
+class CountingCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, query, params=()):
+        with self.connection.lock:
+            self.connection.round_trips += 1
+        orders = self.connection.orders
+        if 'llx_commandedet' in query:
+            wanted = set(params) if params else range(1, orders + 1)
+            self.rows = [
+                {'order_id': order_id, 'product_id': line, 'product_name': f'Produit {line}',
+                 'quantity': 1, 'total': 2.5}
+                for order_id in range(1, orders + 1) if order_id in wanted
+                for line in range(1, LINES_PER_ORDER + 1)
+            ]
+        elif 'COUNT(*)' in query:
+            self.rows = [{'total': orders}]
+        else:
+            start = date(2026, 1, 1)
+            self.rows = [
+                {'id': order_id, 'ref': f'CO{order_id:05d}', 'customer_name': 'Client',
+                 'date': start + timedelta(days=order_id % 365), 'status': 1, 'total': 7.5}
+                for order_id in range(1, orders + 1)
+            ]
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchone(self):
+        return self.fetchall()[0]
+
+    def close(self):
+        pass
+
+
+class CountingConnection:
+    def __init__(self, orders):
+        self.orders = orders
+        self.round_trips = 0
+        self.lock = threading.Lock()
+
+    def cursor(self, dictionary=False):
+        return CountingCursor(self)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run(orders, path='/api/orders'):
+    connection = CountingConnection(orders)
+    # Les lectures parallèles (fan_out) empruntent chacune une connexion au pool
+    api.db_pool.acquire = lambda timeout=None: connection
+    client = api.app.test_client()
+
+    start = time.perf_counter()
+    response = client.get(path)
+    elapsed = time.perf_counter() - start
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert all(len(order['items']) == LINES_PER_ORDER for order in body)
+    return connection.round_trips, elapsed
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000, 5000]
+    print(f"{'commandes':>10} {'requêtes SQL':>13} {'page de 50':>11} {'avant (N+1)':>12} {'durée (ms)':>11}")
+    for orders in sizes:
+        round_trips, elapsed = run(orders)
+        page_round_trips, _ = run(orders, '/api/orders?limit=50&count=0')
+        print(f"{orders:>10} {round_trips:>13} {page_round_trips:>11} {orders + 1:>12} {elapsed * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
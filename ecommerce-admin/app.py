@@ -6,10 +6,16 @@ Interface d'administration pour Le Verger du Coin
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
 import mysql.connector
 import json
+import os
+import urllib.error
+import urllib.request
 from datetime import datetime
 
+from structured_log import correlation_headers, setup_logging
+
 app = Flask(__name__)
 app.secret_key = 'votre_cle_secrete_admin_ici'
+log = setup_logging(app, 'ecommerce-admin')
 
 # Configuration de la base de données Dolibarr
 DB_CONFIG = {
@@ -20,11 +26,17 @@ DB_CONFIG = {
     'database': 'dolibarr'
 }
 
+# API e-commerce, à laquelle les écritures de stock sont déléguées
+API_URL = os.getenv('API_URL', 'http://ecommerce_api:5000')
+
+# Stocks totaux lus dans llx_product_stock_total (à activer comme STOCK_TOTALS_TABLE de l'API)
+STOCK_TOTALS_TABLE = os.getenv('STOCK_TOTALS_TABLE', '0') == '1'
+
 def get_db():
     try:
         return mysql.connector.connect(**DB_CONFIG)
     except Exception as e:
-        print(f"Erreur DB: {e}")
+        log.error("Erreur DB: %s", e)
         return None
 
 # Authentification
@@ -74,11 +86,17 @@ def admin_products():
     
     try:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
+        if STOCK_TOTALS_TABLE:
+            # Une ligne par produit, tenue à jour par l'API
+            stock_join = "LEFT JOIN llx_product_stock_total st ON p.rowid = st.fk_product"
+        else:
+            stock_join = """LEFT JOIN (SELECT fk_product, SUM(reel) as reel FROM llx_product_stock
+                       GROUP BY fk_product) st ON p.rowid = st.fk_product"""
+        cursor.execute(f"""
             SELECT p.rowid, p.ref, p.label, p.description, p.price, 
-                   COALESCE(ps.reel, 0) as stock
+                   COALESCE(st.reel, 0) as stock
             FROM llx_product p
-            LEFT JOIN llx_product_stock ps ON p.rowid = ps.fk_product
+            {stock_join}
             ORDER BY p.label
         """)
         products = cursor.fetchall()
@@ -93,26 +111,34 @@ def admin_products():
 @app.route('/admin/stock/update', methods=['POST'])
 @admin_required
 def update_stock():
-    conn = get_db()
-    if not conn:
-        return jsonify({'success': False, 'error': 'DB connection failed'})
+    """Délègue à PUT /api/stock/<id> : mutation atomique (set / increment / decrement),
+    version attendue facultative ; l'API rafraîchit le stock total du produit"""
+    data = request.get_json(silent=True) or {}
+    product_id = data.pop('product_id', None)
+    try:
+        product_id = int(product_id)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'product_id manquant ou invalide'}), 400
     
+    req = urllib.request.Request(
+        f'{API_URL}/api/stock/{product_id}',
+        data=json.dumps(data).encode(),
+        headers=dict(correlation_headers(), **{'Content-Type': 'application/json'}),
+        method='PUT'
+    )
     try:
-        data = request.get_json()
-        product_id = data.get('product_id')
-        new_stock = data.get('stock')
-        
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE llx_product_stock SET reel = %s WHERE fk_product = %s
-        """, (new_stock, product_id))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return jsonify({'success': True, 'message': 'Stock mis à jour'})
+        with urllib.request.urlopen(req, timeout=10) as response:
+            return jsonify(json.load(response)), response.status
+    except urllib.error.HTTPError as e:
+        # 400 / 404 / 409 : le corps de l'API décrit le refus (version, stock actuel)
+        try:
+            payload = json.load(e)
+        except ValueError:
+            payload = {'error': e.reason}
+        payload['success'] = False
+        return jsonify(payload), e.code
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return jsonify({'success': False, 'error': str(e)}), 502
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5002, debug=True)
@@ -0,0 +1,164 @@
+"""Journalisation structurée commune aux applications (API, frontend, admin)
+
+Une copie identique de ce module se trouve dans chaque application (chacune
+est construite depuis son propre répertoire) : les modifier ensemble.
+
+- LOG_LEVEL (INFO par défaut) : sous ce niveau, logger.debug(...) s'arrête au
+  test de niveau, sans créer d'enregistrement ni formater de message
+- messages formatés au plus tard, dans le thread d'écriture :
+  logger.info("Produit %s", product_id) et non une f-string
+- écriture par une file bornée vidée par un thread dédié : une requête
+  n'attend jamais la sortie standard ; si la file est pleine, le message est
+  perdu et compté
+- LOG_DEBUG_SAMPLE : proportion des messages DEBUG conservés (1 = tous)
+- identifiant de corrélation par requête (en-tête X-Request-ID, repris s'il
+  est fourni, généré sinon), ajouté à chaque message, renvoyé dans la réponse
+  et transmis aux services appelés (correlation_headers)
+- LOG_FORMAT : json (défaut, une ligne JSON par message) ou text
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+
+from flask import g, request
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+# Attributs standard d'un LogRecord : le reste (extra=...) devient des champs JSON
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_handler = None
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def correlation_headers():
+    """En-têtes à ajouter aux appels sortants pour les rattacher à la requête en cours"""
+    request_id = _request_id.get()
+    return {REQUEST_ID_HEADER: request_id} if request_id else {}
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par message : horodatage, niveau, service, logger, message, request_id, extra"""
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'service': self.service,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _ContextFilter(logging.Filter):
+    """Échantillonne les messages DEBUG et y attache l'identifiant de la requête (thread appelant)"""
+
+    def __init__(self, debug_sample):
+        super().__init__()
+        self.debug_sample = debug_sample
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and self.debug_sample < 1 and random.random() >= self.debug_sample:
+            return False
+        record.request_id = _request_id.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Dépose l'enregistrement sans le formater et sans jamais bloquer.
+
+    Le message est formaté par le thread d'écriture : les arguments passés au
+    logger ne doivent pas être modifiés ensuite.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _bind_request_id():
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id_token = _request_id.set(incoming if REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex)
+    g.request_started = time.perf_counter()
+
+
+def _send_request_id(response):
+    response.headers[REQUEST_ID_HEADER] = _request_id.get()
+    log = logging.getLogger('request')
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug('%s %s -> %s', request.method, request.path, response.status_code,
+                  extra={'duration_ms': round((time.perf_counter() - g.request_started) * 1000, 1)})
+    return response
+
+
+def _unbind_request_id(exc):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        _request_id.reset(token)
+
+
+def setup_logging(app, service):
+    """Configure la journalisation du processus (une fois) et la corrélation des requêtes de app ; renvoie le logger du service"""
+    global _handler
+    if _handler is None:
+        stream = logging.StreamHandler(sys.stdout)
+        if os.getenv('LOG_FORMAT', 'json') == 'json':
+            stream.setFormatter(JsonFormatter(service))
+        else:
+            stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+        _handler = _QueueHandler(queue.Queue(int(os.getenv('LOG_QUEUE_SIZE', '10000'))))
+        _handler.addFilter(_ContextFilter(float(os.getenv('LOG_DEBUG_SAMPLE', '1'))))
+        listener = logging.handlers.QueueListener(_handler.queue, stream)
+        listener.start()
+        # Vide la file à l'arrêt du processus
+        atexit.register(listener.stop)
+
+        root = logging.getLogger()
+        root.handlers[:] = [_handler]
+        root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
+    app.before_request(_bind_request_id)
+    app.after_request(_send_request_id)
+    app.teardown_request(_unbind_request_id)
+    return logging.getLogger(service)
+
+
+def dropped_messages():
+    """Messages perdus faute de place dans la file"""
+    return _handler.dropped if _handler is not None else 0
@@ -1,15 +1,39 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, has_app_context, send_file
 from flask_cors import CORS
 import requests
+import contextvars
 import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 import mysql.connector
+from mysql.connector.constants import ClientFlag
 from dotenv import load_dotenv
 
+from db_pool import ConnectionPool, PoolTimeoutError
+from dolibarr_client import DolibarrClient
+from metrics import Metrics
+from catalog import CatalogCache, CatalogUnavailable
+from cart_quote import price_cart
+from catalog_snapshot import SnapshotProducts
+from circuit_breaker import CircuitBreaker, UpstreamError, UpstreamSelector
+from conditional import args_digest, conditional, not_modified
+from pagination import InvalidPageRequest, encode_cursor, keyset_after_desc, page_args, page_response
+from streaming import STREAM_FORMATS, stream_response, stream_rows
+from stock_import import ImportConflict, ImportNotFound, StockImportJobs
+from stock_mutations import (CONFLICT, INSUFFICIENT, NOT_FOUND, InvalidMutation, apply_mutation,
+                             parse_mutation, stock_version)
+from stock_totals import StockTotals
+from structured_log import correlation_headers, dropped_messages, setup_logging
+from tracing import Tracer, trace_headers
+from warmup import Warmup
+
 # Charger les variables d'environnement
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Total-Count', 'Link', 'X-Request-ID'])
+log = setup_logging(app, 'ecommerce-api')
 
 # Configuration de la base de données
 DB_CONFIG = {
@@ -17,239 +41,382 @@ DB_CONFIG = {
     'user': os.getenv('DB_USER', 'dolibarr'),
     'password': os.getenv('DB_PASSWORD', 'dolibarrpass'),
     'database': os.getenv('DB_NAME', 'dolibarr'),
-    'port': 3306
+    'port': int(os.getenv('DB_PORT', '3306')),
+    # Implémentation Python du connecteur, nécessaire sous les workers gevent (E/S coopératives)
+    'use_pure': os.getenv('DB_USE_PURE', '0') == '1',
+    # rowcount : lignes trouvées et non seulement modifiées (une écriture de la même valeur compte)
+    'client_flags': [ClientFlag.FOUND_ROWS]
 }
 
+# Pool de connexions partagé par tous les handlers
+db_pool = ConnectionPool(
+    DB_CONFIG,
+    min_size=int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+    max_size=int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+    ping_on_borrow=os.getenv('DB_POOL_PING', '1') == '1',
+    recycle=int(os.getenv('DB_POOL_RECYCLE', '3600'))
+)
+
 # Configuration de l'API Dolibarr
 DOLIBARR_API_URL = os.getenv('DOLIBARR_API_URL', 'http://dolibarr:80')
 DOLIBARR_API_KEY = os.getenv('DOLIBARR_API_KEY', 'dev_api_key_2026')
 
-def get_dolibarr_headers():
-    headers = {'Content-Type': 'application/json'}
-    if DOLIBARR_API_KEY and DOLIBARR_API_KEY != 'your_dolibarr_api_key':
-        headers['DOLAPIKEY'] = DOLIBARR_API_KEY
-    return headers
+def _timeout_env(prefix, default_connect, default_read):
+    return (
+        float(os.getenv(f'{prefix}_CONNECT_TIMEOUT', default_connect)),
+        float(os.getenv(f'{prefix}_READ_TIMEOUT', default_read))
+    )
+
+def outgoing_headers():
+    """Identifiant de corrélation et contexte de trace de la requête en cours"""
+    return dict(correlation_headers(), **trace_headers())
+
+# Session HTTP keep-alive partagée vers Dolibarr (timeouts par endpoint)
+dolibarr = DolibarrClient(
+    DOLIBARR_API_URL,
+    api_key=DOLIBARR_API_KEY,
+    pool_size=int(os.getenv('DOLIBARR_POOL_SIZE', '10')),
+    retries=int(os.getenv('DOLIBARR_RETRIES', '2')),
+    backoff=float(os.getenv('DOLIBARR_RETRY_BACKOFF', '0.3')),
+    revalidate_entries=int(os.getenv('DOLIBARR_REVALIDATE_ENTRIES', '256')),
+    context_headers=outgoing_headers,
+    timeouts={
+        'default': _timeout_env('DOLIBARR', '3', '10'),
+        'products': _timeout_env('DOLIBARR_PRODUCTS', '3', '20'),
+        'product': _timeout_env('DOLIBARR_PRODUCT', '3', '5'),
+        'orders': _timeout_env('DOLIBARR_ORDERS', '3', '15'),
+        'thirdparties': _timeout_env('DOLIBARR_THIRDPARTIES', '3', '15'),
+    }
+)
+
+# Métriques Prometheus (GET /metrics) ; METRICS_DIR agrège les workers gunicorn
+metrics = Metrics(
+    'ecommerce_api',
+    snapshot_dir=os.getenv('METRICS_DIR') or None,
+    flush_interval=float(os.getenv('METRICS_FLUSH_INTERVAL', '10'))
+)
+metrics.init_app(app)
+upstream_latency = metrics.histogram(
+    'upstream_request_duration_seconds', 'Durée des appels aux services amont (Dolibarr, MariaDB) et des purges des frontends',
+    ('target', 'operation', 'outcome')
+)
+
+def observe_sql(statement, elapsed, error):
+    upstream_latency.observe(('mariadb', statement.split(None, 1)[0].upper(), 'error' if error else 'ok'), elapsed)
+
+def observe_dolibarr(method, endpoint, elapsed, status, error):
+    outcome = f'{status // 100}xx' if status is not None else 'error'
+    upstream_latency.observe(('dolibarr', f'{method} {endpoint}', outcome), elapsed)
+
+db_pool.observers.append(observe_sql)
+dolibarr.observers.append(observe_dolibarr)
+
+# Traces distribuées (TRACE_EXPORT : fichier ou collecteur Zipkin, vide : désactivées)
+tracer = Tracer(
+    'ecommerce-api',
+    export=os.getenv('TRACE_EXPORT') or None,
+    sample_rate=float(os.getenv('TRACE_SAMPLE', '0.1'))
+)
+tracer.init_app(app)
+
+def trace_sql(statement, elapsed, error):
+    if tracer.recording():
+        tracer.record(statement.split(None, 1)[0].upper(), elapsed, remote='mariadb',
+                      tags={'db.system': 'mysql', 'db.statement': ' '.join(statement.split())[:500]}, error=error)
+
+def trace_dolibarr(method, endpoint, elapsed, status, error):
+    if tracer.recording():
+        if error is None and status is not None and status >= 500:
+            error = f'HTTP {status}'
+        tracer.record(f'{method} {endpoint}', elapsed, remote='dolibarr', propagated=True,
+                      tags={'http.method': method, 'http.status_code': status}, error=error)
+
+if tracer.enabled:
+    db_pool.observers.append(trace_sql)
+    dolibarr.observers.append(trace_dolibarr)
+
+metrics.collect('trace_spans_exported_total', 'Spans exportés', lambda: {(): tracer.stats()['exported']}, kind='counter')
+metrics.collect('trace_spans_dropped_total', 'Spans perdus (file pleine, export en échec)',
+                lambda: {(): tracer.stats()['dropped']}, kind='counter')
+
+metrics.collect_stats('db_pool', 'Pool de connexions MariaDB', db_pool.stats,
+                      gauges=('size', 'in_use', 'idle'),
+                      counters=('borrows', 'waits', 'timeouts', 'created', 'recycled', 'discarded'))
+metrics.collect('db_pool_wait_seconds_total', "Attente cumulée pour emprunter une connexion",
+                lambda: {(): db_pool.stats()['wait_time_total_ms'] / 1000}, kind='counter')
+metrics.collect_stats('dolibarr_http', 'Session HTTP vers Dolibarr', dolibarr.stats,
+                      counters=('requests', 'new_connections'))
+metrics.collect('dolibarr_http_not_modified_total', 'Réponses Dolibarr revalidées (304)',
+                lambda: {(): (dolibarr.stats()['revalidation'] or {}).get('not_modified', 0)}, kind='counter')
+metrics.collect('log_dropped_messages_total', 'Messages de log perdus (file pleine)',
+                lambda: {(): dropped_messages()}, kind='counter')
 
 def get_db_connection():
-    """Établit une connexion à la base de données"""
+    """Emprunte une connexion au pool (conn.close() la rend au pool)"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except mysql.connector.Error as err:
-        print(f"Erreur de connexion à la base de données: {err}")
+        conn = db_pool.acquire()
+    except (mysql.connector.Error, PoolTimeoutError) as err:
+        log.error("Erreur de connexion à la base de données: %s", err)
         return None
+    if has_app_context():
+        g.setdefault('db_connections', []).append(conn)
+    return conn
+
+def run_query(query, params=(), one=False):
+    """Exécute une lecture sur sa propre connexion du pool (utilisable depuis fan_out)"""
+    with db_pool.acquire() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    if one:
+        return rows[0] if rows else None
+    return rows
+
+def count_rows(query, params=()):
+    """Valeur de la colonne total d'une requête COUNT(*)"""
+    return run_query(query, params, one=True)['total']
+
+# Exécuteur partagé des lectures indépendantes lancées en parallèle
+fanout_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('FANOUT_WORKERS', '16')),
+    thread_name_prefix='fanout'
+)
+
+def fan_out(*calls):
+    """Lance des lectures indépendantes en parallèle ; renvoie leurs résultats dans l'ordre
+
+    La première s'exécute dans le thread courant, les autres dans fanout_executor,
+    avec le contexte de la requête (identifiant de corrélation des logs).
+    Chaque appel doit utiliser sa propre connexion (run_query, client Dolibarr).
+    """
+    futures = [fanout_executor.submit(contextvars.copy_context().run, call) for call in calls[1:]]
+    results = [calls[0]()]
+    results.extend(future.result() for future in futures)
+    return results
+
+@app.teardown_appcontext
+def release_db_connections(exc):
+    """Rend au pool les connexions non fermées (ex. handler interrompu par une exception)"""
+    for conn in g.pop('db_connections', []):
+        conn.close()
+
+@app.route('/api/status/db-pool', methods=['GET'])
+def get_db_pool_status():
+    """Statistiques du pool de connexions (en cours d'utilisation, inactives, attente)"""
+    return jsonify(db_pool.stats())
+
+@app.route('/api/status/upstreams', methods=['GET'])
+def get_upstreams_status():
+    """État des disjoncteurs : source active, échecs, dernière sonde"""
+    return jsonify(upstreams.status())
+
+@app.route('/api/status/dolibarr', methods=['GET'])
+def get_dolibarr_status():
+    """Statistiques de la session HTTP vers Dolibarr (connexions nouvelles / réutilisées)"""
+    return jsonify(dolibarr.stats())
+
+def probe_dolibarr(with_key=True):
+    """Sonde légère de l'API Dolibarr (un seul produit)"""
+    response = dolibarr.get('products', endpoint='product', with_key=with_key, params={'limit': 1})
+    if response.status_code != 200:
+        raise UpstreamError(f'Dolibarr a répondu {response.status_code}', response.status_code)
+
+def probe_db():
+    """Sonde de la base de données"""
+    with db_pool.acquire() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+
+# Disjoncteurs des sources du catalogue, par ordre de préférence
+UPSTREAM_FAILURE_THRESHOLD = int(os.getenv('UPSTREAM_FAILURE_THRESHOLD', '3'))
+upstreams = UpstreamSelector([
+    CircuitBreaker('dolibarr', probe_dolibarr, UPSTREAM_FAILURE_THRESHOLD),
+    CircuitBreaker('dolibarr_anonymous', lambda: probe_dolibarr(with_key=False), UPSTREAM_FAILURE_THRESHOLD),
+    CircuitBreaker('mariadb', probe_db, UPSTREAM_FAILURE_THRESHOLD),
+], probe_interval=float(os.getenv('UPSTREAM_PROBE_INTERVAL', '15')))
+
+def fetch_products_from_dolibarr(with_key=True):
+    """Lit le catalogue complet depuis l'API Dolibarr"""
+    response = dolibarr.get('products', endpoint='products', with_key=with_key)
+    if response.status_code != 200:
+        raise UpstreamError(f'Dolibarr a répondu {response.status_code}', response.status_code)
+    return response.json()
+
+def fetch_products_from_db():
+    """Lit le catalogue complet directement depuis la base de données"""
+    conn = get_db_connection()
+    if not conn:
+        raise CatalogUnavailable('Impossible de se connecter à la base de données')
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT rowid as id, ref, label as name, description, price
+            FROM llx_product
+            WHERE entity = 1
+        """)
+        products = cursor.fetchall()
+        cursor.close()
+        return products
+    except mysql.connector.Error as db_error:
+        raise CatalogUnavailable(f'Erreur de base de données: {str(db_error)}')
+    finally:
+        # Rendue au pool même en cas d'erreur
+        conn.close()
+
+def fetch_catalog():
+    """Charge le catalogue brut depuis la première source saine : Dolibarr avec clé API, sans clé API, puis MariaDB"""
+    try:
+        return upstreams.call({
+            'dolibarr': fetch_products_from_dolibarr,
+            'dolibarr_anonymous': lambda: fetch_products_from_dolibarr(with_key=False),
+            'mariadb': fetch_products_from_db,
+        })
+    except (UpstreamError, requests.exceptions.RequestException) as e:
+        raise CatalogUnavailable(f'Erreur de connexion: {str(e)}')
+
+# Catalogue servi depuis la mémoire, rechargé à expiration ou sur purge (DELETE /api/cache/catalog)
+def compact_json(value):
+    """JSON des réponses (clés triées, sans espaces), comme jsonify hors mode debug"""
+    return app.json.dumps(value, separators=(',', ':'))
+
+# Avec CATALOG_SNAPSHOT_PATH (défaut sous gunicorn), instantané binaire partagé par les workers
+catalog_cache = CatalogCache(
+    fetch_catalog,
+    ttl=int(os.getenv('CATALOG_CACHE_TTL', '300')),
+    max_entries=int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', '256')),
+    snapshot_path=os.getenv('CATALOG_SNAPSHOT_PATH') or None,
+    encode=compact_json,
+    check_interval=float(os.getenv('CATALOG_SNAPSHOT_CHECK_INTERVAL', '1'))
+)
+
+metrics.collect('upstream_served_total', 'Appels servis par chaque source du catalogue',
+                lambda: {(name,): count for name, count in upstreams.served.items()}, ('source',), kind='counter')
+metrics.collect('upstream_fallbacks_total', 'Appels servis par une source de repli (Dolibarr sans clé, MariaDB)',
+                lambda: {(name,): count for name, count in upstreams.fallbacks.items()}, ('source',), kind='counter')
+metrics.collect('upstream_available', 'Source du catalogue disponible (disjoncteur fermé)',
+                lambda: {(name,): int(breaker.available) for name, breaker in upstreams.breakers.items()}, ('source',))
+metrics.collect_stats('catalog_cache', 'Cache du catalogue', catalog_cache.stats,
+                      gauges=('products', 'entries'), counters=('hits', 'misses', 'loads', 'invalidations'))
+
+# Caches de pages des frontends à purger quand le catalogue change (URL de DELETE /cache/pages)
+FRONTEND_PURGE_URLS = [url.strip() for url in os.getenv('FRONTEND_PURGE_URLS', '').split(',') if url.strip()]
+CACHE_PURGE_TOKEN = os.getenv('CACHE_PURGE_TOKEN', '')
+
+def observe_frontend_purge(url, elapsed, status, error):
+    outcome = f'{status // 100}xx' if status is not None else 'error'
+    upstream_latency.observe(('frontend', 'DELETE /cache/pages', outcome), elapsed)
+    if tracer.recording():
+        if error is None and status is not None and status >= 500:
+            error = f'HTTP {status}'
+        tracer.record('DELETE /cache/pages', elapsed, remote='ecommerce-frontend', propagated=True,
+                      tags={'http.method': 'DELETE', 'http.url': url, 'http.status_code': status}, error=error)
+
+def purge_frontend_caches():
+    """Purge la grille produits mise en cache par chaque frontend (au mieux)"""
+    for url in FRONTEND_PURGE_URLS:
+        headers = dict(outgoing_headers(), **{'X-Purge-Token': CACHE_PURGE_TOKEN})
+        started = time.perf_counter()
+        try:
+            response = requests.delete(url, params={'route': 'home'}, headers=headers, timeout=2)
+        except requests.exceptions.RequestException as e:
+            observe_frontend_purge(url, time.perf_counter() - started, None, e)
+            log.warning("Purge du cache de pages impossible (%s): %s", url, e)
+        else:
+            observe_frontend_purge(url, time.perf_counter() - started, response.status_code, None)
+
+def invalidate_catalog():
+    """Invalide le cache du catalogue, puis en tâche de fond celui des pages des frontends"""
+    catalog_cache.invalidate()
+    if FRONTEND_PURGE_URLS:
+        # Contexte de la requête : identifiant de corrélation et trace transmis aux frontends
+        fanout_executor.submit(contextvars.copy_context().run, purge_frontend_caches)
 
 @app.route('/api/products', methods=['GET'])
 def get_products():
-    """Récupère les produits depuis Dolibarr ou directement depuis la base de données"""
+    """Récupère les produits depuis le cache du catalogue (Dolibarr ou base de données)
+
+    Avec ?facets=1, renvoie {'products': [...], 'facets': {'season': {...}, 'category': {...}}}
+    Avec ?limit=N, renvoie une page ; la suivante s'obtient avec ?cursor=<X-Next-Cursor>
+    L'ETag dépend de la version du catalogue et des paramètres : If-None-Match donne un 304.
+    """
     try:
+        catalog_etag, modified_at = catalog_cache.validators()
+        etag = f'{catalog_etag}-{args_digest()}'
+        unchanged = not_modified(etag, modified_at)
+        if unchanged is not None:
+            return unchanged
+
         # Récupérer les paramètres de filtre
         search_query = request.args.get('search', '')
         season = request.args.get('season', '')
         category = request.args.get('category', '')
-        
-        # D'abord essayer via l'API Dolibarr
-        url = f"{DOLIBARR_API_URL}/api/index.php/products"
-        headers = get_dolibarr_headers()
-        response = requests.get(url, headers=headers)
-        
-        # Si la réponse est réussie, retourner les données
-        if response.status_code == 200:
-            products = response.json()
-            
-            # Ajouter les champs season et category aux produits
-            for product in products:
-                # Déterminer la saison en fonction du nom du produit
-                if 'Hiver' in product.get('label', ''):
-                    product['season'] = 'Hiver'
-                elif 'Printemps' in product.get('label', ''):
-                    product['season'] = 'Printemps'
-                elif 'Été' in product.get('label', ''):
-                    product['season'] = 'Été'
-                elif 'Automne' in product.get('label', ''):
-                    product['season'] = 'Automne'
-                else:
-                    product['season'] = 'Inconnu'
-                
-                # Déterminer la catégorie en fonction du nom du produit
-                if 'Fruits' in product.get('label', ''):
-                    product['category'] = 'Fruits'
-                elif 'Légumes' in product.get('label', ''):
-                    product['category'] = 'Légumes'
-                elif 'Produits Transformés' in product.get('label', ''):
-                    product['category'] = 'Produits Transformés'
-                else:
-                    product['category'] = 'Inconnu'
-                
-                print(f"Produit: {product.get('label')}, Saison: {product.get('season')}, Catégorie: {product.get('category')}")
-            
-            # Appliquer les filtres si nécessaire
-            if search_query or season or category:
-                filtered_products = []
-                for product in products:
-                    # Filtrer par recherche
-                    if search_query:
-                        search_match = (
-                            search_query.lower() in product.get('label', '').lower() or
-                            search_query.lower() in product.get('description', '').lower() or
-                            search_query.lower() in product.get('ref', '').lower()
-                        )
-                        if not search_match:
-                            continue
-                    
-                    # Filtrer par saison (si disponible dans les données)
-                    if season and product.get('season') != season:
-                        continue
-                    
-                    # Filtrer par catégorie (si disponible dans les données)
-                    if category and product.get('category') != category:
-                        continue
-                    
-                    filtered_products.append(product)
-                
-                return jsonify(filtered_products)
-            else:
-                return jsonify(products)
+
+        limit, after, with_count = page_args(1)
+
+        products, facets = catalog_cache.query_with_facets(search_query, season, category)
+
+        # Catalogue en mémoire : le curseur est la position dans la liste filtrée
+        next_cursor = None
+        total = len(products) if limit and with_count else None
+        if limit:
+            start = after[0] if after else 0
+            if not isinstance(start, int) or start < 0:
+                raise InvalidPageRequest('Curseur invalide')
+            if start + limit < len(products):
+                next_cursor = encode_cursor([start + limit])
+            products = products[start:start + limit]
+
+        if isinstance(products, SnapshotProducts):
+            # Produits de l'instantané : corps assemblé depuis leur JSON stocké, identique à celui de jsonify
+            body = products.json()
+            if request.args.get('facets') == '1':
+                body = b'{"facets":' + compact_json(facets).encode() + b',"products":' + body + b'}'
+            response = page_response(body + b'\n', next_cursor, total)
+        elif request.args.get('facets') == '1':
+            response = page_response({'products': products, 'facets': facets}, next_cursor, total)
         else:
-            # Si l'API Dolibarr nécessite une authentification, essayer sans clé API
-            print(f"Première tentative échouée avec statut {response.status_code}, tentative sans clé API...")
-            headers_no_key = {'Content-Type': 'application/json'}
-            response_no_key = requests.get(url, headers=headers_no_key)
-            
-            if response_no_key.status_code == 200:
-                products = response_no_key.json()
-                
-                # Appliquer les filtres si nécessaire
-                if search_query or season or category:
-                    filtered_products = []
-                    for product in products:
-                        # Filtrer par recherche
-                        if search_query:
-                            search_match = (
-                                search_query.lower() in product.get('label', '').lower() or
-                                search_query.lower() in product.get('description', '').lower() or
-                                search_query.lower() in product.get('ref', '').lower()
-                            )
-                            if not search_match:
-                                continue
-                        
-                        # Filtrer par saison (si disponible dans les données)
-                        if season and product.get('season') != season:
-                            continue
-                        
-                        # Filtrer par catégorie (si disponible dans les données)
-                        if category and product.get('category') != category:
-                            continue
-                        
-                        filtered_products.append(product)
-                    
-                    return jsonify(filtered_products)
-                else:
-                    return jsonify(products)
-            else:
-                print(f"Deuxième tentative échouée avec statut {response_no_key.status_code}")
-                print(f"Erreur API Dolibarr: {response_no_key.text}")
-                
-                # Si l'API Dolibarr échoue, essayer de lire directement depuis la base de données
-                print("Tentative de lecture directe depuis la base de données...")
-                conn = get_db_connection()
-                if conn:
-                    try:
-                        cursor = conn.cursor(dictionary=True)
-                        
-                        # Construire la requête SQL avec les filtres
-                        query = """
-                            SELECT rowid as id, ref, label as name, description, price, 
-                                   CASE 
-                                       WHEN label LIKE '%Hiver%' THEN 'Hiver'
-                                       WHEN label LIKE '%Printemps%' THEN 'Printemps'
-                                       WHEN label LIKE '%Été%' THEN 'Été'
-                                       WHEN label LIKE '%Automne%' THEN 'Automne'
-                                       ELSE 'Inconnu'
-                                   END as season,
-                                   CASE 
-                                       WHEN label LIKE '%Fruits%' THEN 'Fruits'
-                                       WHEN label LIKE '%Légumes%' THEN 'Légumes'
-                                       WHEN label LIKE '%Produits Transformés%' THEN 'Produits Transformés'
-                                       ELSE 'Inconnu'
-                                   END as category
-                            FROM llx_product 
-                            WHERE entity = 1
-                        """
-                        
-                        params = []
-                        conditions = []
-                        
-                        # Ajouter les conditions de filtre
-                        if search_query:
-                            conditions.append("(label LIKE %s OR description LIKE %s OR ref LIKE %s)")
-                            params.extend([f'%{search_query}%', f'%{search_query}%', f'%{search_query}%'])
-                        
-                        if season:
-                            conditions.append("""( 
-                                label LIKE %s OR 
-                                label LIKE %s OR 
-                                label LIKE %s OR 
-                                label LIKE %s 
-                            )""")
-                            params.extend([f'%Hiver%', f'%Printemps%', f'%Été%', f'%Automne%'])
-                        
-                        if category:
-                            conditions.append("""( 
-                                label LIKE %s OR 
-                                label LIKE %s OR 
-                                label LIKE %s 
-                            )""")
-                            params.extend([f'%Fruits%', f'%Légumes%', f'%Produits Transformés%'])
-                        
-                        # Ajouter les conditions à la requête
-                        if conditions:
-                            query += " AND " + " AND ".join(conditions)
-                        
-                        cursor.execute(query, params)
-                        products = cursor.fetchall()
-                        cursor.close()
-                        conn.close()
-                        
-                        if products:
-                            print(f"Succès : {len(products)} produits récupérés depuis la base de données")
-                            return jsonify(products)
-                        else:
-                            print("Aucun produit trouvé dans la base de données")
-                            return jsonify([])
-                    except Exception as db_error:
-                        print(f"Erreur de base de données: {db_error}")
-                        return jsonify({'error': f'Erreur de base de données: {str(db_error)}'}), 500
-                else:
-                    print("Impossible de se connecter à la base de données")
-                    return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
-    except requests.exceptions.RequestException as e:
-        print(f"Erreur lors de la récupération des produits: {e}")
-        return jsonify({'error': f'Erreur de connexion: {str(e)}'}), 500
+            response = page_response(products, next_cursor, total)
+        return conditional(response, etag, modified_at)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except CatalogUnavailable as e:
+        log.error("Erreur lors de la récupération des produits: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cache/catalog', methods=['GET'])
+def get_catalog_cache_status():
+    """Statistiques du cache du catalogue (hits, misses, âge)"""
+    return jsonify(catalog_cache.stats())
+
+@app.route('/api/cache/catalog', methods=['DELETE'])
+def purge_catalog_cache():
+    """Purge manuelle du cache du catalogue"""
+    invalidate_catalog()
+    return jsonify({'success': True, 'message': 'Cache du catalogue purgé'})
 
 @app.route('/api/orders', methods=['POST'])
 def create_order():
     """Crée une commande dans Dolibarr"""
     try:
         order_data = request.json
-        url = f"{DOLIBARR_API_URL}/api/index.php/orders"
-        headers = get_dolibarr_headers()
-        response = requests.post(url, json=order_data, headers=headers)
+        response = dolibarr.post('orders', endpoint='orders', json=order_data)
         response.raise_for_status()
         return jsonify(response.json())
     except requests.exceptions.RequestException as e:
-        print(f"Erreur lors de la création de la commande: {e}")
+        log.error("Erreur lors de la création de la commande: %s", e)
         return jsonify({'error': 'Erreur lors de la création de la commande'}), 500
 
 @app.route('/api/customers', methods=['GET'])
 def get_customers():
-    """Récupère la liste des clients depuis la base de données"""
+    """Récupère la liste des clients depuis la base de données (paginée avec limit/cursor)"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
-        
-        cursor = conn.cursor(dictionary=True)
+        limit, after, with_count = page_args(3)
         
         # Récupérer les clients particuliers
         query = """
@@ -258,22 +425,41 @@ def get_customers():
             CONCAT(u.firstname, ' ', u.lastname) as name, 
             u.email, 
             u.user_mobile as phone, 
-            u.datec as since
+            u.datec as since,
+            COALESCE(u.lastname, '') as sort_lastname,
+            COALESCE(u.firstname, '') as sort_firstname
         FROM llx_user u
         WHERE u.rowid > 1 AND u.fk_soc = 2
-        ORDER BY u.lastname, u.firstname
         """
+        params = []
+        if after:
+            query += " AND (COALESCE(u.lastname, ''), COALESCE(u.firstname, ''), u.rowid) > (%s, %s, %s)"
+            params.extend(after)
+        query += " ORDER BY sort_lastname, sort_firstname, u.rowid"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit + 1)
         
-        cursor.execute(query)
-        customers = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        # La page et le total en parallèle
+        customers, total = fan_out(
+            lambda: run_query(query, params),
+            lambda: count_rows("SELECT COUNT(*) as total FROM llx_user u WHERE u.rowid > 1 AND u.fk_soc = 2") if limit and with_count else None
+        )
+
+        next_cursor = None
+        if limit and len(customers) > limit:
+            customers = customers[:limit]
+            last = customers[-1]
+            next_cursor = encode_cursor([last['sort_lastname'], last['sort_firstname'], last['id']])
+        for customer in customers:
+            del customer['sort_lastname'], customer['sort_firstname']
         
-        return jsonify(customers)
+        return page_response(customers, next_cursor, total)
         
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Erreur lors de la récupération des clients: {e}")
+        log.exception("Erreur lors de la récupération des clients: %s", e)
         return jsonify({'error': f'Erreur lors de la récupération des clients: {str(e)}'}), 500
 
 @app.route('/api/customers', methods=['POST'])
@@ -281,145 +467,654 @@ def create_customer():
     """Crée un client dans Dolibarr"""
     try:
         customer_data = request.json
-        url = f"{DOLIBARR_API_URL}/api/index.php/thirdparties"
-        headers = get_dolibarr_headers()
-        response = requests.post(url, json=customer_data, headers=headers)
+        response = dolibarr.post('thirdparties', endpoint='thirdparties', json=customer_data)
         response.raise_for_status()
         return jsonify(response.json())
     except requests.exceptions.RequestException as e:
-        print(f"Erreur lors de la création du client: {e}")
+        log.error("Erreur lors de la création du client: %s", e)
         return jsonify({'error': 'Erreur lors de la création du client'}), 500
 
+def fetch_product_from_dolibarr(product_id, with_key=True):
+    """Lit un produit depuis l'API Dolibarr ; None s'il n'y existe pas"""
+    response = dolibarr.get(f'products/{product_id}', endpoint='product', with_key=with_key)
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise UpstreamError(f'Dolibarr a répondu {response.status_code}', response.status_code)
+    return response.json()
+
+def fetch_product_from_db(product_id):
+    """Lit un produit directement depuis la base de données ; None s'il n'existe pas"""
+    conn = get_db_connection()
+    if not conn:
+        raise CatalogUnavailable('Impossible de se connecter à la base de données')
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT rowid as id, ref, label as name, description, price FROM llx_product WHERE rowid = %s", (product_id,))
+        product = cursor.fetchone()
+        cursor.close()
+        return product
+    except mysql.connector.Error as db_error:
+        raise CatalogUnavailable(f'Erreur de base de données: {str(db_error)}')
+    finally:
+        conn.close()
+
+# Données liées qu'une fiche produit peut embarquer (?include=stock)
+PRODUCT_INCLUDES = ('stock',)
+
+def fetch_product(product_id):
+    """Fiche d'un produit : instantané partagé du catalogue, sinon première source saine"""
+    try:
+        product = catalog_cache.product(product_id)
+    except CatalogUnavailable:
+        product = None
+    if product is not None:
+        return product
+    return upstreams.call({
+        'dolibarr': lambda: fetch_product_from_dolibarr(product_id),
+        'dolibarr_anonymous': lambda: fetch_product_from_dolibarr(product_id, with_key=False),
+        'mariadb': lambda: fetch_product_from_db(product_id),
+    })
+
+def fetch_product_stock_total(product_id):
+    """Stock total d'un produit (tous entrepôts) ; None si la base ne répond pas"""
+    try:
+        total = stock_totals.get(product_id)
+        return total[0] if total else 0
+    except Exception as e:
+        log.warning("Stock indisponible pour le produit %s: %s", product_id, e)
+        return None
+
 @app.route('/api/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
-    """Récupère un produit spécifique depuis Dolibarr ou la base de données"""
+    """Récupère un produit spécifique depuis la première source saine (Dolibarr ou base de données)
+
+    ?include=stock ajoute le stock total au produit, lu en parallèle de la fiche.
+    """
+    include = {part.strip() for part in request.args.get('include', '').split(',') if part.strip()}
+    unknown = include.difference(PRODUCT_INCLUDES)
+    if unknown:
+        return jsonify({'error': f"Paramètre include invalide: {', '.join(sorted(unknown))}"}), 400
+
     try:
-        # D'abord essayer via l'API Dolibarr
-        url = f"{DOLIBARR_API_URL}/api/index.php/products/{product_id}"
-        headers = get_dolibarr_headers()
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            return jsonify(response.json())
+        if 'stock' in include:
+            product, stock = fan_out(
+                lambda: fetch_product(product_id),
+                lambda: fetch_product_stock_total(product_id)
+            )
         else:
-            # Si l'API Dolibarr échoue, essayer de lire directement depuis la base de données
-            print(f"API Dolibarr échouée pour le produit {product_id}, lecture directe depuis la base de données...")
-            conn = get_db_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor(dictionary=True)
-                    cursor.execute("SELECT rowid as id, ref, label as name, description, price FROM llx_product WHERE rowid = %s", (product_id,))
-                    product = cursor.fetchone()
-                    cursor.close()
-                    conn.close()
-                    
-                    if product:
-                        print(f"Succès : Produit {product_id} récupéré depuis la base de données")
-                        return jsonify(product)
-                    else:
-                        print(f"Produit {product_id} non trouvé dans la base de données")
-                        return jsonify({'error': 'Produit non trouvé'}), 404
-                except Exception as db_error:
-                    print(f"Erreur de base de données pour le produit {product_id}: {db_error}")
-                    return jsonify({'error': f'Erreur de base de données: {str(db_error)}'}), 500
-            else:
-                print(f"Impossible de se connecter à la base de données pour le produit {product_id}")
-                return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
-    except requests.exceptions.RequestException as e:
-        print(f"Erreur lors de la récupération du produit {product_id}: {e}")
+            product, stock = fetch_product(product_id), None
+        if product is None:
+            return jsonify({'error': 'Produit non trouvé'}), 404
+        if 'stock' in include:
+            product['stock'] = stock
+        return conditional(jsonify(product))
+    except CatalogUnavailable as e:
+        log.error("Erreur lors de la récupération du produit %s: %s", product_id, e)
+        return jsonify({'error': str(e)}), 500
+    except (UpstreamError, requests.exceptions.RequestException) as e:
+        log.error("Erreur lors de la récupération du produit %s: %s", product_id, e)
         return jsonify({'error': f'Erreur de connexion: {str(e)}'}), 500
 
 @app.route('/api/stock/<int:product_id>', methods=['GET'])
 def get_product_stock(product_id):
-    """Récupère le stock d'un produit depuis la base de données"""
+    """Récupère le stock d'un produit : fiche lue en base, total lu en mémoire
+
+    ?warehouses=1 ajoute le stock et la version de chaque entrepôt (à renvoyer
+    dans expected_version), lus dans llx_product_stock ; le total est alors
+    la somme de ces lignes.
+    """
     try:
         conn = get_db_connection()
         if not conn:
             return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
-        
+
         cursor = conn.cursor(dictionary=True)
-        query = """
-        SELECT p.rowid, p.ref, p.label, p.price, 
-               SUM(ps.reel) as stock
-        FROM llx_product as p
-        LEFT JOIN llx_product_stock as ps ON p.rowid = ps.fk_product
-        WHERE p.rowid = %s
-        GROUP BY p.rowid, p.ref, p.label, p.price
-        """
-        cursor.execute(query, (product_id,))
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        if result:
-            return jsonify(result)
-        else:
+        try:
+            cursor.execute("SELECT rowid, ref, label, price, tms FROM llx_product WHERE rowid = %s", (product_id,))
+            result = cursor.fetchone()
+            rows = None
+            if result and request.args.get('warehouses') == '1':
+                cursor.execute(
+                    "SELECT fk_entrepot, reel, tms FROM llx_product_stock WHERE fk_product = %s ORDER BY fk_entrepot",
+                    (product_id,)
+                )
+                rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+        if not result:
             return jsonify({'error': 'Produit non trouvé'}), 404
-            
+
+        modified = [result.pop('tms')]
+        if rows is None:
+            total, stock_modified = stock_totals.get(product_id) or (0, None)
+            result['stock'] = total
+            modified.append(stock_modified)
+        else:
+            result['stock'] = sum(row['reel'] or 0 for row in rows)
+            result['warehouses'] = [
+                {'warehouse_id': row['fk_entrepot'], 'stock': row['reel'], 'version': stock_version(row['tms'], row['reel'])}
+                for row in rows
+            ]
+            modified.extend(row['tms'] for row in rows)
+        last_modified = max((value for value in modified if value is not None), default=None)
+        return conditional(jsonify(result), last_modified=last_modified)
+
     except Exception as e:
-        print(f"Erreur lors de la récupération du stock: {e}")
+        log.exception("Erreur lors de la récupération du stock: %s", e)
         return jsonify({'error': 'Erreur lors de la récupération du stock'}), 500
 
 @app.route('/api/stock/<int:product_id>', methods=['PUT'])
 def update_product_stock(product_id):
-    """Met à jour le stock d'un produit dans la base de données"""
+    """Modifie le stock d'un produit dans un entrepôt, en une instruction SQL atomique
+
+    Corps : {"op": "set" | "increment" | "decrement", "quantity": 5, "warehouse_id": 1,
+    "expected_version": "..."} ; {"stock": 10} reste accepté (set).
+    Un decrement ne descend pas sous zéro sauf "allow_negative": true.
+    Renvoie 409 si la version attendue ne correspond plus ou si le stock est insuffisant.
+    """
+    try:
+        op, quantity, warehouse_id, expected, allow_negative = parse_mutation(
+            request.get_json(silent=True), DEFAULT_WAREHOUSE_ID
+        )
+    except InvalidMutation as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
-        data = request.get_json()
-        stock_quantity = data.get('stock')
-        
-        if stock_quantity is None:
-            return jsonify({'error': 'Quantité de stock manquante'}), 400
-        
         conn = get_db_connection()
         if not conn:
             return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
         
         cursor = conn.cursor()
-        
-        # Vérifier si le produit existe
-        cursor.execute("SELECT rowid FROM llx_product WHERE rowid = %s", (product_id,))
-        if not cursor.fetchone():
+        try:
+            status, stock, version = apply_mutation(
+                cursor, product_id, warehouse_id, op, quantity, expected, allow_negative
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
             cursor.close()
             conn.close()
+
+        result = {'product_id': product_id, 'warehouse_id': warehouse_id, 'op': op,
+                  'stock': stock, 'version': version}
+        if status == NOT_FOUND:
             return jsonify({'error': 'Produit non trouvé'}), 404
-        
-        # Vérifier si une entrée de stock existe déjà
-        cursor.execute("SELECT rowid FROM llx_product_stock WHERE fk_product = %s", (product_id,))
-        stock_entry = cursor.fetchone()
-        
-        if stock_entry:
-            # Mettre à jour le stock existant
-            cursor.execute("""
-                UPDATE llx_product_stock 
-                SET reel = %s, tms = NOW()
-                WHERE fk_product = %s
-            """, (stock_quantity, product_id))
-        else:
-            # Créer une nouvelle entrée de stock (utiliser l'entrepôt par défaut avec rowid=1)
-            cursor.execute("""
-                INSERT INTO llx_product_stock (fk_product, fk_entrepot, reel, tms)
-                VALUES (%s, 1, %s, NOW())
-            """, (product_id, stock_quantity))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return jsonify({'success': True, 'message': 'Stock mis à jour avec succès'})
+        if status == CONFLICT:
+            return jsonify(dict(result, error='Le stock a été modifié entre-temps')), 409
+        if status == INSUFFICIENT:
+            return jsonify(dict(result, error='Stock insuffisant')), 409
+
+        # Le stock n'est pas dans le catalogue (lu par /api/stock et include=stock) : rien à invalider
+        refresh_stock_totals([product_id])
+        return jsonify(dict(result, success=True, message='Stock mis à jour avec succès'))
         
     except Exception as e:
-        print(f"Erreur lors de la mise à jour du stock: {e}")
+        log.exception("Erreur lors de la mise à jour du stock: %s", e)
         return jsonify({'error': f'Erreur lors de la mise à jour du stock: {str(e)}'}), 500
 
-@app.route('/api/orders', methods=['GET'])
-def get_orders():
-    """Récupère la liste des commandes depuis la base de données"""
+# Nombre de lignes par INSERT multi-lignes et nombre maximal d'articles par requête groupée
+STOCK_BATCH_SIZE = int(os.getenv('STOCK_BATCH_SIZE', '500'))
+STOCK_BULK_MAX_ITEMS = int(os.getenv('STOCK_BULK_MAX_ITEMS', '10000'))
+
+# Entrepôt utilisé quand une écriture de stock n'en précise pas
+DEFAULT_WAREHOUSE_ID = int(os.getenv('DEFAULT_WAREHOUSE_ID', '1'))
+
+# Stock total par produit en mémoire, tenu à jour par les écritures de l'API et réconcilié périodiquement
+stock_totals = StockTotals(
+    db_pool,
+    use_table=os.getenv('STOCK_TOTALS_TABLE', '0') == '1',
+    reconcile_interval=int(os.getenv('STOCK_TOTALS_RECONCILE', '60')),
+    batch_size=STOCK_BATCH_SIZE,
+    # Partagé entre les workers gunicorn (défini par gunicorn.conf.py) : écritures des autres vues aussitôt
+    shared_dir=os.getenv('STOCK_TOTALS_DIR') or None
+)
+
+metrics.collect_stats('stock_totals', 'Stocks totaux en mémoire', stock_totals.stats,
+                      gauges=('products',), counters=('hits', 'misses', 'fresh_reads', 'refreshes', 'reconciliations',
+                                                      'drift_corrected', 'remote_changes'))
+
+def refresh_stock_totals(product_ids):
+    """Recalcule les totaux des produits écrits, après le commit (au mieux : la réconciliation rattrape un échec)"""
+    try:
+        stock_totals.refresh(product_ids)
+    except Exception as e:
+        log.warning("Mise à jour des stocks totaux impossible: %s", e)
+
+@app.route('/api/status/stock-totals', methods=['GET'])
+def get_stock_totals_status():
+    """Statistiques des stocks totaux en mémoire (lectures, réconciliations, écarts corrigés)"""
+    return jsonify(stock_totals.stats())
+
+def existing_ids(cursor, table, ids):
+    """Identifiants de ids présents dans table (rowid), en une requête"""
+    ids = sorted(set(ids))
+    if not ids:
+        return set()
+    cursor.execute(f"SELECT rowid FROM {table} WHERE rowid IN ({', '.join(['%s'] * len(ids))})", ids)
+    return {row[0] for row in cursor.fetchall()}
+
+def upsert_stock_rows(cursor, rows):
+    """Écrit [(product_id, warehouse_id, stock)] par upserts multi-lignes, dans la transaction en cours
+
+    Renvoie (produits introuvables, entrepôts introuvables) : les lignes qui en
+    référencent un ne sont pas écrites, sans quoi la clé étrangère vers
+    llx_entrepot ferait échouer toute la transaction.
+    """
+    if not rows:
+        return set(), set()
+    # Vérifier l'existence des produits et des entrepôts, une requête chacun
+    products = existing_ids(cursor, 'llx_product', (row[0] for row in rows))
+    warehouses = existing_ids(cursor, 'llx_entrepot', (row[1] for row in rows))
+    missing = ({row[0] for row in rows} - products, {row[1] for row in rows} - warehouses)
+    rows = [row for row in rows if row[0] in products and row[1] in warehouses]
+
+    # Upsert multi-lignes sur uk_product_stock (fk_product, fk_entrepot)
+    for start in range(0, len(rows), STOCK_BATCH_SIZE):
+        batch = rows[start:start + STOCK_BATCH_SIZE]
+        cursor.execute(
+            "INSERT INTO llx_product_stock (fk_product, fk_entrepot, reel, tms) VALUES "
+            + ', '.join(['(%s, %s, %s, NOW())'] * len(batch))
+            + " ON DUPLICATE KEY UPDATE reel = VALUES(reel), tms = NOW()",
+            [value for row in batch for value in row]
+        )
+    return missing
+
+@app.route('/api/stock', methods=['GET'])
+def get_stocks():
+    """Récupère le stock de plusieurs produits (?ids=1,2,3) ou de tous : une requête sur les produits, totaux lus en mémoire"""
     try:
+        raw_ids = request.args.get('ids')
+        product_ids = None
+        if raw_ids is not None:
+            try:
+                product_ids = sorted({int(value) for value in raw_ids.split(',') if value.strip()})
+            except ValueError:
+                return jsonify({'error': 'Paramètre ids invalide'}), 400
+            if not product_ids:
+                return jsonify([])
+            if len(product_ids) > STOCK_BULK_MAX_ITEMS:
+                return jsonify({'error': f'Au plus {STOCK_BULK_MAX_ITEMS} produits par requête'}), 413
+
         conn = get_db_connection()
         if not conn:
             return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
-        
+
         cursor = conn.cursor(dictionary=True)
+        query = "SELECT p.rowid, p.ref, p.label, p.price, p.tms FROM llx_product as p"
+        params = []
+        if product_ids is not None:
+            query += f" WHERE p.rowid IN ({', '.join(['%s'] * len(product_ids))})"
+            params = product_ids
+        query += " ORDER BY p.rowid"
+        cursor.execute(query, params)
+        stocks = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        # Totaux lus en mémoire, sans GROUP BY sur llx_product_stock
+        totals = stock_totals.get_many([row['rowid'] for row in stocks])
+        modified = []
+        for row in stocks:
+            total, stock_modified = totals.get(row['rowid'], (0, None))
+            row['stock'] = total
+            modified.extend((row.pop('tms'), stock_modified))
+
+        # Last-Modified : modification la plus récente des produits ou stocks demandés
+        last_modified = max((value for value in modified if value is not None), default=None)
+        return conditional(jsonify(stocks), last_modified=last_modified)
+
+    except Exception as e:
+        log.exception("Erreur lors de la récupération des stocks: %s", e)
+        return jsonify({'error': 'Erreur lors de la récupération des stocks'}), 500
+
+@app.route('/api/stock/export', methods=['GET'])
+def export_stocks():
+    """Export en flux du stock de tous les produits (CSV par défaut, ou format=ndjson)
+
+    Une seule requête agrégée llx_product LEFT JOIN llx_product_stock, lue par
+    blocs : mémoire constante quel que soit le catalogue.
+    ?warehouses=1 ajoute une colonne de stock par entrepôt, ?gzip=1 compresse le flux.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in STREAM_FORMATS:
+        return jsonify({'error': 'Paramètre format invalide'}), 400
+
+    try:
+        columns = ['id', 'name', 'price', 'stock']
+        labels = ['ID', 'Nom', 'Prix', 'Stock']
+        select = ["p.rowid as id", "p.label as name", "p.price", "COALESCE(SUM(ps.reel), 0) as stock"]
+        params = []
+        if request.args.get('warehouses') == '1':
+            for warehouse in run_query("SELECT rowid, ref FROM llx_entrepot WHERE entity = 1 ORDER BY rowid"):
+                column = f"warehouse_{warehouse['rowid']}"
+                select.append(f"COALESCE(SUM(CASE WHEN ps.fk_entrepot = %s THEN ps.reel END), 0) as {column}")
+                params.append(warehouse['rowid'])
+                columns.append(column)
+                labels.append(f"Stock {warehouse['ref']}")
+
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
+
+        query = f"""
+        SELECT {', '.join(select)}
+        FROM llx_product as p
+        LEFT JOIN llx_product_stock as ps ON p.rowid = ps.fk_product
+        GROUP BY p.rowid, p.label, p.price
+        ORDER BY p.rowid
+        """
+        chunks = stream_rows(conn, query, params, chunk_size=STREAM_CHUNK_SIZE)
+        return stream_response(chunks, fmt, columns, 'stock_export',
+                               labels=labels if fmt == 'csv' else None,
+                               compress=request.args.get('gzip') == '1')
+
+    except Exception as e:
+        log.exception("Erreur lors de l'export des stocks: %s", e)
+        return jsonify({'error': 'Erreur lors de l\'export des stocks'}), 500
+
+@app.route('/api/stock', methods=['PUT'])
+def update_stocks():
+    """Met à jour le stock de plusieurs produits dans une seule transaction
+
+    Corps : [{"product_id": 1, "stock": 10, "warehouse_id": 1}, ...] (ou {"items": [...]}).
+    Renvoie un résultat par article : updated, not_found (produit ou entrepôt
+    inconnu, l'article n'est pas écrit) ou invalid.
+    """
+    try:
+        data = request.get_json(silent=True)
+        items = data.get('items') if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return jsonify({'error': 'Liste d\'articles manquante'}), 400
+        if len(items) > STOCK_BULK_MAX_ITEMS:
+            return jsonify({'error': f'Au plus {STOCK_BULK_MAX_ITEMS} articles par requête'}), 413
+
+        # Valider les articles avant tout accès à la base
+        results = []
+        valid = []
+        for item in items:
+            try:
+                product_id = int(item['product_id'])
+                stock_quantity = float(item['stock'])
+                warehouse_id = int(item.get('warehouse_id') or DEFAULT_WAREHOUSE_ID)
+            except (KeyError, TypeError, ValueError, AttributeError):
+                product_id = item.get('product_id') if isinstance(item, dict) else None
+                results.append({'product_id': product_id, 'status': 'invalid', 'error': 'Article invalide'})
+                continue
+            result = {'product_id': product_id, 'status': 'updated'}
+            results.append(result)
+            valid.append((result, product_id, warehouse_id, stock_quantity))
+
+        if not valid:
+            return jsonify({'success': False, 'updated': 0, 'results': results})
+
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
+
+        cursor = conn.cursor()
+        conn.start_transaction()
+        try:
+            missing_products, missing_warehouses = upsert_stock_rows(cursor, [
+                (product_id, warehouse_id, stock_quantity)
+                for _, product_id, warehouse_id, stock_quantity in valid
+            ])
+            for result, product_id, warehouse_id, _ in valid:
+                if product_id in missing_products:
+                    result['status'] = 'not_found'
+                    result['error'] = 'Produit non trouvé'
+                elif warehouse_id in missing_warehouses:
+                    result.update(status='not_found', warehouse_id=warehouse_id, error='Entrepôt non trouvé')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+        updated = sum(1 for result in results if result['status'] == 'updated')
+        if updated:
+            refresh_stock_totals(result['product_id'] for result in results if result['status'] == 'updated')
+
+        return jsonify({'success': updated == len(results), 'updated': updated, 'results': results})
+
+    except Exception as e:
+        log.exception("Erreur lors de la mise à jour groupée du stock: %s", e)
+        return jsonify({'error': f'Erreur lors de la mise à jour du stock: {str(e)}'}), 500
+
+def apply_stock_batch(rows):
+    """Écrit un lot d'import dans sa propre transaction ; renvoie (produits, entrepôts) introuvables"""
+    with db_pool.acquire() as conn:
+        cursor = conn.cursor()
+        conn.start_transaction()
+        try:
+            missing = upsert_stock_rows(cursor, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    refresh_stock_totals(row[0] for row in rows if row[0] not in missing[0] and row[1] not in missing[1])
+    return missing
+
+# Imports CSV de stock en tâche de fond (fichiers et état partagés entre workers)
+stock_imports = StockImportJobs(
+    os.getenv('STOCK_IMPORT_DIR', os.path.join(tempfile.gettempdir(), 'stock-imports')),
+    apply_stock_batch,
+    batch_size=STOCK_BATCH_SIZE,
+    default_warehouse=DEFAULT_WAREHOUSE_ID,
+    max_errors=int(os.getenv('STOCK_IMPORT_MAX_ERRORS', '100')),
+    stale_after=int(os.getenv('STOCK_IMPORT_STALE_AFTER', '120'))
+)
+
+@app.route('/api/stock/import', methods=['POST'])
+def start_stock_import():
+    """Lance l'import d'un CSV de stock (multipart « file » ou corps text/csv) ; renvoie 202 et l'import"""
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            job = stock_imports.create(upload.stream, upload.filename)
+        else:
+            job = stock_imports.create(request.stream, request.args.get('filename'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log.exception("Erreur lors de la réception de l'import de stock: %s", e)
+        return jsonify({'error': 'Erreur lors de la réception du fichier'}), 500
+    return jsonify(job), 202, {'Location': f"/api/stock/import/{job['id']}"}
+
+@app.route('/api/stock/import/<job_id>', methods=['GET'])
+def get_stock_import(job_id):
+    """Avancement d'un import : lignes traitées, écrites, rejetées et premières erreurs"""
+    try:
+        return jsonify(stock_imports.status(job_id))
+    except ImportNotFound:
+        return jsonify({'error': 'Import non trouvé'}), 404
+
+@app.route('/api/stock/import/<job_id>/errors', methods=['GET'])
+def get_stock_import_errors(job_id):
+    """Rapport d'erreurs complet d'un import (CSV : ligne, product_id, erreur)"""
+    try:
+        path = stock_imports.error_report(job_id)
+    except ImportNotFound:
+        return jsonify({'error': 'Import non trouvé'}), 404
+    if path is None:
+        return Response('ligne,product_id,erreur\r\n', mimetype='text/csv')
+    return send_file(path, mimetype='text/csv', as_attachment=True, download_name=f'import_{job_id}_erreurs.csv')
+
+@app.route('/api/stock/import/<job_id>/resume', methods=['POST'])
+def resume_stock_import(job_id):
+    """Reprend un import échoué ou interrompu après le dernier lot validé"""
+    try:
+        return jsonify(stock_imports.resume(job_id)), 202
+    except ImportNotFound:
+        return jsonify({'error': 'Import non trouvé'}), 404
+    except ImportConflict as e:
+        return jsonify({'error': f"Import non reprenable (statut: {e})"}), 409
+
+# Nombre maximal de lignes d'un panier à chiffrer
+CART_MAX_LINES = int(os.getenv('CART_MAX_LINES', '200'))
+
+@app.route('/api/cart/quote', methods=['POST'])
+def quote_cart():
+    """Chiffre un panier {product_id: quantité} en une requête groupée
+
+    Renvoie les lignes (prix unitaire, sous-total, stock, disponibilité), le
+    total et les produits introuvables.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Panier manquant'}), 400
+    if len(data) > CART_MAX_LINES:
+        return jsonify({'error': f'Au plus {CART_MAX_LINES} lignes par panier'}), 413
+
+    quantities = {}
+    try:
+        for product_id, quantity in data.items():
+            quantity = int(quantity)
+            if quantity < 1:
+                raise ValueError(quantity)
+            quantities[int(product_id)] = quantity
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Panier invalide'}), 400
+
+    if not quantities:
+        return jsonify(price_cart({}, {}))
+
+    try:
+        product_ids = sorted(quantities)
+        rows = run_query(
+            f"SELECT rowid as id, ref, label, price FROM llx_product WHERE rowid IN ({', '.join(['%s'] * len(product_ids))})",
+            product_ids
+        )
+        # Relus en base : la disponibilité décide de la commande, quel que soit le worker qui a écrit le stock
+        totals = stock_totals.get_many([row['id'] for row in rows], fresh=True)
+        for row in rows:
+            row['stock'] = totals.get(row['id'], (0, None))[0]
+    except Exception as e:
+        log.exception("Erreur lors du chiffrage du panier: %s", e)
+        return jsonify({'error': 'Erreur lors du chiffrage du panier'}), 500
+
+    return jsonify(price_cart({row['id']: row for row in rows}, quantities))
+
+# Nombre maximal d'identifiants de commande par requête IN (...)
+ORDER_LINES_BATCH_SIZE = int(os.getenv('ORDER_LINES_BATCH_SIZE', '500'))
+
+ORDER_LINES_QUERY = """
+    SELECT 
+        cd.fk_commande as order_id,
+        cd.fk_product as product_id, 
+        p.label as product_name, 
+        cd.qty as quantity, 
+        cd.total_ttc as total
+    FROM llx_commandedet cd
+    JOIN llx_product p ON cd.fk_product = p.rowid
+"""
+
+def fetch_order_lines(order_ids=None):
+    """Lignes de commande groupées par commande : {order_id: [lignes]}
+
+    Sans order_ids, toutes les lignes sont lues en une seule requête ; sinon une
+    requête IN (...) par lot de ORDER_LINES_BATCH_SIZE commandes.
+    """
+    if order_ids is None:
+        batches = [None]
+    else:
+        batches = [order_ids[start:start + ORDER_LINES_BATCH_SIZE]
+                   for start in range(0, len(order_ids), ORDER_LINES_BATCH_SIZE)]
+
+    lines = {}
+    for batch in batches:
+        if batch is None:
+            rows = run_query(ORDER_LINES_QUERY + " ORDER BY cd.fk_commande, cd.rowid")
+        else:
+            placeholders = ', '.join(['%s'] * len(batch))
+            rows = run_query(
+                ORDER_LINES_QUERY + f" WHERE cd.fk_commande IN ({placeholders}) ORDER BY cd.fk_commande, cd.rowid",
+                batch
+            )
+        for line in rows:
+            lines.setdefault(line.pop('order_id'), []).append(line)
+    return lines
+
+# Taille des blocs lus depuis le curseur côté serveur pour les exports en flux
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', '500'))
+
+ORDER_EXPORT_COLUMNS = ['id', 'ref', 'customer_name', 'date', 'status', 'total',
+                        'product_id', 'product_name', 'quantity', 'line_total']
+
+def group_order_rows(chunks):
+    """Regroupe les lignes de la jointure commandes / lignes en commandes avec leurs items"""
+    current = None
+    for rows in chunks:
+        orders = []
+        for row in rows:
+            if current is None or current['id'] != row['id']:
+                if current is not None:
+                    orders.append(current)
+                current = {key: row[key] for key in ORDER_EXPORT_COLUMNS[:6]}
+                current['items'] = []
+            if row['product_id'] is not None:
+                current['items'].append({
+                    'product_id': row['product_id'],
+                    'product_name': row['product_name'],
+                    'quantity': row['quantity'],
+                    'total': row['line_total']
+                })
+        if orders:
+            yield orders
+    if current is not None:
+        yield [current]
+
+def stream_orders(fmt):
+    """Export en flux de toutes les commandes : une commande par ligne (NDJSON) ou une ligne de commande par ligne (CSV)"""
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
+
+    query = """
+    SELECT 
+        c.rowid as id, 
+        c.ref, 
+        s.nom as customer_name, 
+        c.date_commande as date, 
+        c.fk_statut as status, 
+        c.total_ttc as total,
+        cd.fk_product as product_id,
+        p.label as product_name,
+        cd.qty as quantity,
+        cd.total_ttc as line_total
+    FROM llx_commande c
+    JOIN llx_societe s ON c.fk_soc = s.rowid
+    LEFT JOIN (llx_commandedet cd JOIN llx_product p ON cd.fk_product = p.rowid)
+        ON cd.fk_commande = c.rowid
+    ORDER BY c.date_commande DESC, c.rowid DESC, cd.rowid
+    """
+    chunks = stream_rows(conn, query, chunk_size=STREAM_CHUNK_SIZE)
+    if fmt == 'ndjson':
+        chunks = group_order_rows(chunks)
+    return stream_response(chunks, fmt, ORDER_EXPORT_COLUMNS, 'orders')
+
+@app.route('/api/orders', methods=['GET'])
+def get_orders():
+    """Récupère la liste des commandes depuis la base de données (paginée avec limit/cursor)
+
+    Avec ?format=ndjson ou ?format=csv, exporte toutes les commandes en flux.
+    """
+    try:
+        fmt = request.args.get('format', 'json')
+        if fmt in STREAM_FORMATS:
+            return stream_orders(fmt)
+        if fmt != 'json':
+            return jsonify({'error': f'Format non supporté: {fmt}'}), 400
+
+        limit, after, with_count = page_args(2)
         
         # Récupérer les commandes avec les détails des clients
         query = """
@@ -432,45 +1127,55 @@ def get_orders():
             c.total_ttc as total
         FROM llx_commande c
         JOIN llx_societe s ON c.fk_soc = s.rowid
-        ORDER BY c.date_commande DESC
         """
-        
-        cursor.execute(query)
-        orders = cursor.fetchall()
-        
-        # Pour chaque commande, récupérer les détails
+        params = []
+        if after:
+            condition, params = keyset_after_desc('c.date_commande', 'c.rowid', *after)
+            query += " WHERE " + condition
+        query += " ORDER BY c.date_commande DESC, c.rowid DESC"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit + 1)
+
+        if limit:
+            # Page : les en-têtes et le total en parallèle, puis les lignes de la page (IN)
+            orders, total = fan_out(
+                lambda: run_query(query, params),
+                lambda: count_rows("SELECT COUNT(*) as total FROM llx_commande c JOIN llx_societe s ON c.fk_soc = s.rowid") if with_count else None
+            )
+            next_cursor = None
+            if len(orders) > limit:
+                orders = orders[:limit]
+                next_cursor = encode_cursor([orders[-1]['date'], orders[-1]['id']])
+            lines = fetch_order_lines([order['id'] for order in orders])
+        else:
+            # Liste complète : les en-têtes et toutes les lignes en parallèle
+            orders, lines = fan_out(lambda: run_query(query, params), fetch_order_lines)
+            next_cursor, total = None, None
+
         for order in orders:
-            cursor.execute("""
-                SELECT 
-                    cd.fk_product as product_id, 
-                    p.label as product_name, 
-                    cd.qty as quantity, 
-                    cd.total_ttc as total
-                FROM llx_commandedet cd
-                JOIN llx_product p ON cd.fk_product = p.rowid
-                WHERE cd.fk_commande = %s
-            """, (order['id'],))
-            
-            order['items'] = cursor.fetchall()
+            order['items'] = lines.get(order['id'], [])
         
-        cursor.close()
-        conn.close()
-        
-        return jsonify(orders)
+        return page_response(orders, next_cursor, total)
         
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Erreur lors de la récupération des commandes: {e}")
+        log.exception("Erreur lors de la récupération des commandes: %s", e)
         return jsonify({'error': f'Erreur lors de la récupération des commandes: {str(e)}'}), 500
 
 @app.route('/api/financial', methods=['GET'])
 def get_financial():
-    """Récupère les données financières depuis la base de données"""
+    """Récupère les données financières depuis la base de données (paginées avec limit/cursor)
+
+    Avec ?format=ndjson ou ?format=csv, exporte toutes les écritures en flux.
+    """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
-        
-        cursor = conn.cursor(dictionary=True)
+        fmt = request.args.get('format', 'json')
+        if fmt not in STREAM_FORMATS and fmt != 'json':
+            return jsonify({'error': f'Format non supporté: {fmt}'}), 400
+
+        limit, after, with_count = page_args(2)
         
         # Récupérer les transactions financières
         query = """
@@ -481,31 +1186,48 @@ def get_financial():
             datev as date,
             CASE WHEN amount > 0 THEN 'revenue' ELSE 'expense' END as type
         FROM llx_bank
-        ORDER BY datev DESC
         """
+
+        if fmt in STREAM_FORMATS:
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
+            chunks = stream_rows(conn, query + " ORDER BY datev DESC, rowid DESC", chunk_size=STREAM_CHUNK_SIZE)
+            return stream_response(chunks, fmt, ['id', 'label', 'amount', 'date', 'type'], 'financial')
+
+        params = []
+        if after:
+            # Parcours de idx_bank_datev à partir de la dernière ligne servie
+            condition, params = keyset_after_desc('datev', 'rowid', *after)
+            query += " WHERE " + condition
+        query += " ORDER BY datev DESC, rowid DESC"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit + 1)
         
-        cursor.execute(query)
-        transactions = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        # La page et le total en parallèle
+        transactions, total = fan_out(
+            lambda: run_query(query, params),
+            lambda: count_rows("SELECT COUNT(*) as total FROM llx_bank") if limit and with_count else None
+        )
+
+        next_cursor = None
+        if limit and len(transactions) > limit:
+            transactions = transactions[:limit]
+            next_cursor = encode_cursor([transactions[-1]['date'], transactions[-1]['id']])
         
-        return jsonify(transactions)
+        return page_response(transactions, next_cursor, total)
         
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Erreur lors de la récupération des données financières: {e}")
+        log.exception("Erreur lors de la récupération des données financières: %s", e)
         return jsonify({'error': f'Erreur lors de la récupération des données financières: {str(e)}'}), 500
 
 @app.route('/api/orders/<int:order_id>', methods=['GET'])
 def get_order(order_id):
     """Récupère les détails d'une commande spécifique"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Impossible de se connecter à la base de données'}), 500
-        
-        cursor = conn.cursor(dictionary=True)
-        
         # Récupérer la commande
         query = """
         SELECT 
@@ -520,37 +1242,45 @@ def get_order(order_id):
         WHERE c.rowid = %s
         """
         
-        cursor.execute(query, (order_id,))
-        order = cursor.fetchone()
+        # La commande et ses lignes en parallèle
+        order, lines = fan_out(
+            lambda: run_query(query, (order_id,), one=True),
+            lambda: fetch_order_lines([order_id])
+        )
         
         if not order:
-            cursor.close()
-            conn.close()
             return jsonify({'error': 'Commande non trouvée'}), 404
         
-        # Récupérer les détails de la commande
-        query = """
-        SELECT 
-            cd.fk_product as product_id, 
-            p.label as product_name, 
-            cd.qty as quantity, 
-            cd.total_ttc as total
-        FROM llx_commandedet cd
-        JOIN llx_product p ON cd.fk_product = p.rowid
-        WHERE cd.fk_commande = %s
-        """
-        
-        cursor.execute(query, (order_id,))
-        order['items'] = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        order['items'] = lines.get(order_id, [])
         
         return jsonify(order)
         
     except Exception as e:
-        print(f"Erreur lors de la récupération de la commande {order_id}: {e}")
+        log.exception("Erreur lors de la récupération de la commande %s: %s", order_id, e)
         return jsonify({'error': f'Erreur lors de la récupération de la commande: {str(e)}'}), 500
 
+# Préchauffage avant la première requête : connexions MariaDB et Dolibarr, catalogue, stocks totaux (GET /ready)
+def warm_db_pool():
+    """Connexions du pool ouvertes jusqu'à DB_POOL_MIN_SIZE (au mieux), puis une vérifiée"""
+    db_pool.fill()
+    probe_db()
+
+warmup = Warmup()
+warmup.step('mariadb', warm_db_pool)
+warmup.step('dolibarr', probe_dolibarr)
+warmup.step('catalog', catalog_cache.products)
+warmup.step('stock_totals', stock_totals.load)
+warmup.init_app(app)
+
+metrics.collect('warmup_ready', 'Préchauffage du worker terminé', lambda: {(): int(warmup.ready)})
+metrics.collect('warmup_duration_seconds', 'Durée du préchauffage du worker',
+                lambda: {(): warmup.stats()['duration_seconds'] or 0})
+metrics.collect('warmup_step_duration_seconds', 'Durée de chaque étape du préchauffage',
+                lambda: {(result['step'],): result['seconds'] for result in warmup.stats()['steps']}, ('step',))
+
 if __name__ == '__main__':
+    # En tâche de fond : /live répond aussitôt, /ready une fois le préchauffage terminé ; seulement dans le
+    # processus qui sert les requêtes, pas dans celui qui surveille les fichiers pour le rechargement (debug)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warmup.start()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,39 @@
+"""Chiffrage d'un panier : lignes, total et disponibilité, en décimal exact"""
+from decimal import Decimal
+
+CENT = Decimal('0.01')
+
+
+def to_decimal(value):
+    """Montant lu en base (DOUBLE : float, DECIMAL : Decimal) ou reçu en texte ; None vaut 0"""
+    if value is None:
+        return Decimal('0')
+    if isinstance(value, Decimal):
+        return value
+    # Par le texte : Decimal(0.1) garderait l'erreur de représentation du float
+    return Decimal(str(value))
+
+
+def price_cart(products, quantities):
+    """Chiffre le panier {product_id: quantité} avec les produits {product_id: ligne lue en base}.
+
+    Chaque ligne lue porte price et stock ; les lignes suivent l'ordre du
+    panier. Le total est arrondi au centime une seule fois, à la fin.
+    """
+    lines = []
+    total = Decimal('0')
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        price = to_decimal(product['price'])
+        subtotal = price * quantity
+        total += subtotal
+        lines.append(dict(product, price=price, quantity=quantity, subtotal=subtotal,
+                          available=product['stock'] >= quantity))
+    return {
+        'lines': lines,
+        'not_found': [product_id for product_id in quantities if product_id not in products],
+        'total': total.quantize(CENT),
+        'available': all(line['available'] for line in lines),
+    }
@@ -0,0 +1,407 @@
+"""Cache en mémoire du catalogue produits de l'API"""
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from catalog_snapshot import CatalogSnapshot, SnapshotProducts, write_snapshot
+from search_index import SearchIndex, product_key
+
+SEASONS = ('Hiver', 'Printemps', 'Été', 'Automne')
+CATEGORIES = ('Fruits', 'Légumes', 'Produits Transformés')
+UNKNOWN = 'Inconnu'
+
+
+class CatalogUnavailable(Exception):
+    """Le catalogue n'a pu être chargé depuis aucune source"""
+
+
+# Champs ajoutés par classify_product, absents des fiches lues à la source
+CLASSIFICATION_FIELDS = ('season', 'category')
+
+
+def classify_product(product):
+    """Ajoute les champs season et category déduits du libellé du produit"""
+    label = product.get('label') or product.get('name') or ''
+    product['season'] = next((season for season in SEASONS if season in label), UNKNOWN)
+    product['category'] = next((category for category in CATEGORIES if category in label), UNKNOWN)
+    return product
+
+
+def catalog_digest(products):
+    """Empreinte du contenu du catalogue, identique tant qu'aucun produit ne change"""
+    raw = json.dumps(products, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+class CatalogIndex:
+    """Catalogue classé une seule fois et indexé par saison et par catégorie.
+
+    Les filtres season/category sont des intersections d'ensembles de
+    positions ; l'ordre du catalogue est conservé dans les résultats, sauf
+    pour une recherche dont les résultats sont triés par pertinence.
+    """
+
+    def __init__(self, products, search_index=None):
+        self.products = products
+        self.etag = catalog_digest(products)
+        self.search_index = search_index if search_index is not None else SearchIndex()
+        self.search_index.sync(products)
+        self.positions = {product_key(product): position for position, product in enumerate(products)}
+        self.all = frozenset(range(len(products)))
+        self.by_season = {name: set() for name in SEASONS + (UNKNOWN,)}
+        self.by_category = {name: set() for name in CATEGORIES + (UNKNOWN,)}
+        for position, product in enumerate(products):
+            classify_product(product)
+            self.by_season.setdefault(product['season'], set()).add(position)
+            self.by_category.setdefault(product['category'], set()).add(position)
+
+    def __len__(self):
+        return len(self.products)
+
+    def _select(self, positions):
+        """Produits aux positions données, dans cet ordre (None : tout le catalogue)"""
+        if positions is None:
+            return self.products
+        return [self.products[position] for position in positions]
+
+    def _ranked_search(self, search):
+        """Positions correspondant à la recherche, par score décroissant puis ordre du catalogue"""
+        ranked = []
+        for key, score in self.search_index.search(search):
+            position = self.positions.get(key)
+            if position is not None:
+                ranked.append((-score, position))
+        ranked.sort()
+        return [position for _, position in ranked]
+
+    def query(self, search='', season='', category=''):
+        """Renvoie (produits filtrés, comptes par saison et par catégorie).
+
+        Les comptes d'une facette appliquent tous les autres filtres, pour
+        afficher combien de produits chaque choix donnerait.
+        """
+        ranked = self._ranked_search(search) if search else None
+        base = set(ranked) if search else self.all
+        season_set = self.by_season.get(season, set()) if season else self.all
+        category_set = self.by_category.get(category, set()) if category else self.all
+
+        positions = base & season_set & category_set
+        if ranked is not None:
+            products = self._select([position for position in ranked if position in positions])
+        elif positions == self.all:
+            products = self._select(None)
+        else:
+            products = self._select(sorted(positions))
+
+        in_category = base & category_set
+        in_season = base & season_set
+        facets = {
+            'season': {name: len(ids & in_category) for name, ids in self.by_season.items()},
+            'category': {name: len(ids & in_season) for name, ids in self.by_category.items()},
+        }
+        return products, facets
+
+
+class SnapshotIndex(CatalogIndex):
+    """Index d'un instantané partagé : mêmes filtres, produits laissés dans le fichier projeté.
+
+    Seuls les champs indexés (libellé, référence, description, saison,
+    catégorie) sont décodés, le temps de construire les ensembles et l'index
+    de recherche du worker.
+    """
+
+    def __init__(self, snapshot, search_index=None):
+        self.snapshot = snapshot
+        self.etag = snapshot.etag
+        self.search_index = search_index if search_index is not None else SearchIndex()
+        self.search_index.sync(
+            {
+                'id': snapshot.value(position, 'key'),
+                'label': snapshot.value(position, 'label'),
+                'ref': snapshot.value(position, 'ref'),
+                'description': snapshot.value(position, 'description'),
+            }
+            for position in range(len(snapshot))
+        )
+        self.positions = {snapshot.value(position, 'key'): position for position in range(len(snapshot))}
+        self.all = frozenset(range(len(snapshot)))
+        self.by_season = {name: set() for name in SEASONS + (UNKNOWN,)}
+        self.by_category = {name: set() for name in CATEGORIES + (UNKNOWN,)}
+        for position in range(len(snapshot)):
+            self.by_season.setdefault(snapshot.value(position, 'season'), set()).add(position)
+            self.by_category.setdefault(snapshot.value(position, 'category'), set()).add(position)
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def _select(self, positions):
+        return SnapshotProducts(self.snapshot, range(len(self.snapshot)) if positions is None else positions)
+
+    def product(self, product_id):
+        """Fiche du produit telle que sa source la renvoie (sans les champs de classement), None s'il est absent"""
+        position = self.snapshot.position_of(product_id)
+        if position is None:
+            return None
+        product = self.snapshot.product(position)
+        for field in CLASSIFICATION_FIELDS:
+            product.pop(field, None)
+        return product
+
+
+class CatalogCache:
+    """Catalogue complet chargé une fois puis servi depuis la mémoire.
+
+    - loader : fonction sans argument qui renvoie la liste complète des produits
+    - ttl : durée de vie (secondes) du catalogue avant rechargement
+    - max_entries : nombre maximal de résultats filtrés conservés (LRU)
+    - snapshot_path : instantané binaire partagé par les processus (voir
+      catalog_snapshot) ; un seul processus à la fois le recharge et le
+      réécrit (verrou <snapshot_path>.lock), les autres le projettent en
+      mémoire, vérifient toutes les check_interval secondes s'il a été
+      remplacé et servent l'ancien pendant qu'un autre le réécrit après
+      expiration. invalidate() touche <snapshot_path>.invalidated : tous les
+      processus écartent alors l'instantané antérieur.
+    - encode : fonction produit -> JSON des réponses, appliquée une fois à
+      l'écriture de l'instantané
+    """
+
+    def __init__(self, loader, ttl=300, max_entries=256, snapshot_path=None, encode=json.dumps, check_interval=1.0):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.snapshot_path = snapshot_path
+        self.encode = encode
+        self.check_interval = check_interval
+        self._mapped = None
+        self._checked_at = None
+        self._invalidated_at = 0.0
+
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._index = None
+        self._loaded_at = None
+        self._results = OrderedDict()
+        self._generation = 0
+        self._search_index = SearchIndex()
+        self._etag = None
+        self._modified_at = None
+
+        self._hits = 0
+        self._misses = 0
+        self._loads = 0
+        self._invalidations = 0
+        self._last_load_ms = None
+
+    def _fresh(self):
+        if self._index is None:
+            return False
+        if self.snapshot_path:
+            # Instantané partagé : remplacement et expiration vérifiés par _shared_snapshot()
+            return time.monotonic() - self._checked_at < self.check_interval
+        return time.monotonic() - self._loaded_at < self.ttl
+
+    def _snapshot(self):
+        """Renvoie l'index du catalogue courant, en le rechargeant s'il a expiré"""
+        with self._lock:
+            if self._fresh():
+                return self._index
+
+        # Un seul rechargement à la fois : les autres requêtes attendent son résultat
+        with self._load_lock:
+            with self._lock:
+                if self._fresh():
+                    return self._index
+                generation = self._generation
+
+            if self.snapshot_path:
+                return self._shared_snapshot(generation)
+
+            start = time.monotonic()
+            index = CatalogIndex(self.loader(), self._search_index)
+            elapsed = time.monotonic() - start
+
+            with self._lock:
+                self._loads += 1
+                self._last_load_ms = round(elapsed * 1000, 3)
+                # Invalidé pendant le chargement : ne pas conserver un catalogue déjà périmé
+                if generation == self._generation:
+                    self._index = index
+                    self._loaded_at = time.monotonic()
+                    self._results.clear()
+                    # Date de modification : premier chargement d'un contenu différent
+                    if index.etag != self._etag:
+                        self._etag = index.etag
+                        self._modified_at = datetime.now(timezone.utc)
+                return index
+
+    def _invalidated_since(self):
+        """Date (epoch) de la dernière invalidation, dans ce processus ou dans un autre"""
+        try:
+            shared = os.stat(self.snapshot_path + '.invalidated').st_mtime
+        except FileNotFoundError:
+            shared = 0.0
+        return max(self._invalidated_at, shared)
+
+    def _usable(self, snapshot):
+        return snapshot.created >= self._invalidated_since() and time.time() - snapshot.created < self.ttl
+
+    def _current_file(self):
+        """Instantané présent au chemin partagé, reprojeté seulement s'il a été remplacé ; None s'il n'existe pas"""
+        try:
+            inode = os.stat(self.snapshot_path).st_ino
+        except FileNotFoundError:
+            return None
+        if self._mapped is not None and self._mapped.inode == inode:
+            return self._mapped
+        try:
+            return CatalogSnapshot(self.snapshot_path)
+        except (OSError, ValueError):
+            # Remplacé entre-temps ou illisible : à réécrire
+            return None
+
+    def _rewrite(self, wait):
+        """Recharge le catalogue et réécrit l'instantané sous verrou ; None si un autre processus s'en charge et wait est faux"""
+        with open(self.snapshot_path + '.lock', 'a') as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if not wait:
+                        return None
+                    # Attente coopérative (workers gevent) plutôt qu'un flock bloquant
+                    time.sleep(0.05)
+
+            # Réécrit par un autre processus pendant l'attente du verrou
+            current = self._current_file()
+            if current is not None and self._usable(current):
+                return current
+
+            created = time.time()
+            start = time.monotonic()
+            products = self.loader()
+            etag = catalog_digest(products)
+            for product in products:
+                classify_product(product)
+            modified = current.modified if current is not None and current.etag == etag else created
+            write_snapshot(self.snapshot_path, products, etag, created, modified, self.encode)
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._loads += 1
+                self._last_load_ms = round(elapsed * 1000, 3)
+            return CatalogSnapshot(self.snapshot_path)
+
+    def _shared_snapshot(self, generation):
+        """Index de l'instantané partagé (appelé sous _load_lock)"""
+        snapshot = self._current_file()
+        if snapshot is None or not self._usable(snapshot):
+            # Simplement expiré : l'ancien reste servi si un autre processus le réécrit déjà
+            wait = snapshot is None or snapshot.created < self._invalidated_since()
+            snapshot = self._rewrite(wait) or snapshot
+        return self._publish(snapshot, generation)
+
+    def _publish(self, snapshot, generation):
+        with self._lock:
+            index = self._index
+        if index is None or snapshot is not self._mapped:
+            index = SnapshotIndex(snapshot, self._search_index)
+        with self._lock:
+            # Invalidé pendant le chargement : ne pas conserver un catalogue déjà périmé
+            if generation == self._generation:
+                if index is not self._index:
+                    self._results.clear()
+                self._mapped = snapshot
+                self._index = index
+                self._loaded_at = self._checked_at = time.monotonic()
+                self._etag = snapshot.etag
+                self._modified_at = datetime.fromtimestamp(snapshot.modified, timezone.utc)
+        return index
+
+    def product(self, product_id):
+        """Produit servi par l'instantané partagé ; None sans instantané ou si le produit n'y figure pas"""
+        if not self.snapshot_path:
+            return None
+        return self._snapshot().product(product_id)
+
+    def products(self):
+        """Catalogue complet"""
+        return self.query()
+
+    def query(self, search='', season='', category=''):
+        """Produits filtrés, servis depuis la mémoire sans appel à Dolibarr"""
+        return self.query_with_facets(search, season, category)[0]
+
+    def query_with_facets(self, search='', season='', category=''):
+        """Produits filtrés et comptes par saison / catégorie"""
+        key = (search.strip().lower(), season, category)
+        index = self._snapshot()
+        with self._lock:
+            if self._index is index and key in self._results:
+                self._results.move_to_end(key)
+                self._hits += 1
+                return self._results[key]
+            self._misses += 1
+
+        result = index.query(*key)
+
+        with self._lock:
+            if self._index is index:
+                self._results[key] = result
+                self._results.move_to_end(key)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        return result
+
+    def validators(self):
+        """(ETag, date de dernière modification) du catalogue courant"""
+        index = self._snapshot()
+        with self._lock:
+            if index.etag == self._etag:
+                return self._etag, self._modified_at
+        # Chargement invalidé en cours de route : pas de date fiable
+        return index.etag, None
+
+    def invalidate(self):
+        """Vide le cache : le prochain accès recharge le catalogue"""
+        with self._lock:
+            self._index = None
+            self._loaded_at = None
+            self._results.clear()
+            self._generation += 1
+            self._invalidations += 1
+            self._invalidated_at = time.time()
+        if self.snapshot_path:
+            # Signale l'invalidation aux autres processus
+            marker = self.snapshot_path + '.invalidated'
+            with open(marker, 'a'):
+                os.utime(marker)
+
+    def stats(self):
+        with self._lock:
+            age = time.monotonic() - self._loaded_at if self._loaded_at is not None else None
+            return {
+                'ttl': self.ttl,
+                'max_entries': self.max_entries,
+                'loaded': self._index is not None,
+                'products': len(self._index) if self._index is not None else 0,
+                'entries': len(self._results),
+                'age_seconds': round(age, 3) if age is not None else None,
+                'hits': self._hits,
+                'misses': self._misses,
+                'loads': self._loads,
+                'invalidations': self._invalidations,
+                'last_load_ms': self._last_load_ms,
+                'etag': self._etag,
+                'modified_at': self._modified_at.isoformat() if self._modified_at else None,
+                'search_index': self._search_index.stats(),
+                'snapshot': {
+                    'path': self.snapshot_path,
+                    'bytes': self._mapped.size,
+                    'age_seconds': round(time.time() - self._mapped.created, 3),
+                } if self._mapped is not None else None,
+            }
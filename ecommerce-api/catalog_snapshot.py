@@ -0,0 +1,161 @@
+"""Instantané binaire du catalogue, projeté en mémoire (mmap) par tous les workers de l'API
+
+Un seul processus écrit l'instantané ; les autres projettent le fichier en
+lecture seule : ses pages sont partagées par le noyau entre les workers, et
+un worker qui démarre sert aussitôt le catalogue déjà écrit. Un nouvel
+instantané est écrit à côté puis renommé par-dessus (os.replace, atomique) :
+un worker garde sa projection de l'ancien tant qu'il ne l'a pas remplacée.
+
+Format (little-endian) :
+- en-tête HEADER : nombre de produits, dates de création et de modification, ETag
+- un enregistrement de taille fixe par produit : pour chaque champ de FIELDS,
+  (position, longueur) de sa valeur UTF-8 dans la table des chaînes
+- index des identifiants numériques, trié : (id, numéro d'enregistrement)
+- table des chaînes, chaque valeur distincte n'y figurant qu'une fois
+
+Le champ json est le produit tel que le renvoie /api/products, encodé une
+seule fois à l'écriture : les réponses sont assemblées par concaténation
+d'octets, sans désérialisation.
+"""
+import json
+import mmap
+import os
+import struct
+
+MAGIC = b'VCCATSN1'
+FIELDS = ('key', 'ref', 'label', 'description', 'price', 'season', 'category', 'json')
+FIELD_INDEX = {name: index for index, name in enumerate(FIELDS)}
+
+# magic, produits, identifiants indexés, création, modification (epoch), ETag, début de l'index, début des chaînes
+HEADER = struct.Struct('<8sIIdd16sQQ')
+SPAN = struct.Struct('<II')
+RECORD_SIZE = SPAN.size * len(FIELDS)
+ID_ENTRY = struct.Struct('<qI')
+
+
+def _text(value):
+    return '' if value is None else str(value)
+
+
+def write_snapshot(path, products, etag, created, modified, encode):
+    """Écrit les produits (déjà classés) dans un fichier temporaire puis le renomme en `path`.
+
+    encode : fonction produit -> texte JSON (celle des réponses de l'application).
+    """
+    strings = bytearray()
+    spans = {}
+    records = bytearray()
+    ids = []
+
+    def intern(text):
+        span = spans.get(text)
+        if span is None:
+            data = text.encode('utf-8')
+            span = spans[text] = (len(strings), len(data))
+            strings.extend(data)
+        return span
+
+    for position, product in enumerate(products):
+        key = product.get('id') if product.get('id') is not None else product.get('ref')
+        values = {
+            'key': _text(key),
+            'ref': _text(product.get('ref')),
+            'label': _text(product.get('label') or product.get('name')),
+            'description': _text(product.get('description')),
+            'price': _text(product.get('price')),
+            'season': _text(product.get('season')),
+            'category': _text(product.get('category')),
+        }
+        for name in FIELDS[:-1]:
+            records.extend(SPAN.pack(*intern(values[name])))
+        # Propre à chaque produit : pas de recherche de doublon
+        data = encode(product).encode('utf-8')
+        records.extend(SPAN.pack(len(strings), len(data)))
+        strings.extend(data)
+        if values['key'].isdigit():
+            ids.append((int(values['key']), position))
+
+    ids.sort()
+    ids_offset = HEADER.size + len(records)
+    strings_offset = ids_offset + ID_ENTRY.size * len(ids)
+    header = HEADER.pack(MAGIC, len(products), len(ids), created, modified,
+                         etag.encode('ascii')[:16].ljust(16), ids_offset, strings_offset)
+
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as output:
+        output.write(header)
+        output.write(records)
+        output.write(b''.join(ID_ENTRY.pack(*entry) for entry in ids))
+        output.write(strings)
+    os.replace(temporary, path)
+
+
+class CatalogSnapshot:
+    """Instantané projeté en lecture seule ; les valeurs ne sont décodées qu'à la demande"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as source:
+            stat = os.fstat(source.fileno())
+            self.inode = stat.st_ino
+            self.size = stat.st_size
+            self._map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.size < HEADER.size:
+            raise ValueError('Instantané du catalogue tronqué')
+        magic, self.count, self._id_count, self.created, self.modified, etag, self._ids_offset, self._strings_offset = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError('Instantané du catalogue invalide')
+        self.etag = etag.rstrip(b' ').decode('ascii')
+
+    def __len__(self):
+        return self.count
+
+    def raw(self, position, field):
+        """Octets UTF-8 du champ d'un produit"""
+        offset, length = SPAN.unpack_from(self._map, HEADER.size + position * RECORD_SIZE + FIELD_INDEX[field] * SPAN.size)
+        start = self._strings_offset + offset
+        return self._map[start:start + length]
+
+    def value(self, position, field):
+        return self.raw(position, field).decode('utf-8')
+
+    def product(self, position):
+        """Produit complet (dictionnaire), pour la fiche d'un seul produit"""
+        return json.loads(self.raw(position, 'json'))
+
+    def position_of(self, product_id):
+        """Numéro d'enregistrement d'un identifiant numérique (recherche dichotomique dans l'index), None s'il est absent"""
+        low, high = 0, self._id_count
+        while low < high:
+            middle = (low + high) // 2
+            key, position = ID_ENTRY.unpack_from(self._map, self._ids_offset + middle * ID_ENTRY.size)
+            if key == product_id:
+                return position
+            if key < product_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+
+class SnapshotProducts:
+    """Liste de produits d'un instantané (positions), découpable comme une liste"""
+
+    def __init__(self, snapshot, positions):
+        self.snapshot = snapshot
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return SnapshotProducts(self.snapshot, self.positions[item])
+        return self.snapshot.product(self.positions[item])
+
+    def __iter__(self):
+        return (self.snapshot.product(position) for position in self.positions)
+
+    def json(self):
+        """Tableau JSON des produits, assemblé depuis leurs encodages stockés"""
+        return b'[' + b','.join(self.snapshot.raw(position, 'json') for position in self.positions) + b']'
@@ -0,0 +1,194 @@
+"""Disjoncteurs par source amont (Dolibarr, MariaDB) et sélection de la source saine"""
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+# Statuts HTTP d'une source qui répond mais refuse la demande (accès, ressource
+# absente) : ils ne comptent pas comme des pannes
+CLIENT_ERROR_STATUSES = (401, 403, 404)
+
+
+class UpstreamError(Exception):
+    """Réponse inutilisable d'une source amont (statut HTTP inattendu, etc.)"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_client_error(error):
+    """Vrai si la source a répondu en refusant la demande : elle n'est pas en panne"""
+    return getattr(error, 'status_code', None) in CLIENT_ERROR_STATUSES
+
+
+class CircuitBreaker:
+    """Disjoncteur d'une source : s'ouvre après `failure_threshold` échecs consécutifs.
+
+    Une source ouverte ne reçoit plus de trafic ; `probe` (fonction sans
+    argument qui lève une exception en cas d'échec) est appelée en tâche de
+    fond pour la refermer dès qu'elle répond de nouveau.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+
+    def __init__(self, name, probe=None, failure_threshold=3):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.successes = 0
+        self.last_error = None
+        self.opened_at = None
+        self.last_probe_at = None
+
+    @property
+    def available(self):
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            was_open = self.state == self.OPEN
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+            self.opened_at = None
+        if was_open:
+            log.info("Source %s rétablie", self.name)
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            tripped = self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+            if tripped:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+        if tripped:
+            log.warning("Source %s désactivée après %s échecs: %s", self.name, self.consecutive_failures, error)
+        return tripped
+
+    def run_probe(self):
+        """Teste la source ouverte ; la referme si la sonde réussit"""
+        if self.probe is None:
+            return
+        self.last_probe_at = time.time()
+        try:
+            self.probe()
+        except Exception as e:
+            with self._lock:
+                self.last_error = str(e)
+            if not is_client_error(e):
+                return
+        self.record_success()
+
+    def status(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'failures': self.failures,
+                'successes': self.successes,
+                'last_error': self.last_error,
+                'opened_at': self.opened_at,
+                'last_probe_at': self.last_probe_at,
+            }
+
+
+class UpstreamSelector:
+    """Envoie chaque appel à la première source saine, dans l'ordre de préférence.
+
+    Les sources ouvertes sont sautées (sauf si toutes le sont : on les essaie
+    alors toutes en dernier recours) et sondées toutes les `probe_interval` secondes.
+    """
+
+    def __init__(self, breakers, probe_interval=15):
+        self.breakers = {breaker.name: breaker for breaker in breakers}
+        self.order = [breaker.name for breaker in breakers]
+        self.probe_interval = probe_interval
+        self._prober = None
+        self._prober_lock = threading.Lock()
+        # Appels servis par chaque source, et parmi eux ceux servis par une source de repli
+        self._stats_lock = threading.Lock()
+        self.served = {name: 0 for name in self.order}
+        self.fallbacks = {name: 0 for name in self.order}
+
+    def candidates(self, names):
+        breakers = [self.breakers[name] for name in self.order if name in names]
+        healthy = [breaker for breaker in breakers if breaker.available]
+        return healthy or breakers
+
+    def call(self, sources):
+        """Appelle les sources {nom: fonction} dans l'ordre jusqu'à obtenir une réponse.
+
+        Une fonction qui renvoie None signale une source saine sans résultat
+        (ex. produit absent) : c'est une réponse définitive, les autres
+        sources ne sont pas interrogées. Une source qui refuse la demande
+        (401, 403, 404 : voir is_client_error) est sautée sans compter
+        d'échec. Si aucune ne répond, la dernière erreur est relevée.
+        """
+        last_error = None
+        for breaker in self.candidates(sources):
+            try:
+                result = sources[breaker.name]()
+            except Exception as e:
+                last_error = e
+                if not is_client_error(e) and breaker.record_failure(e):
+                    self._ensure_prober()
+                continue
+            breaker.record_success()
+            self._record_served(breaker.name, sources)
+            return result
+        if last_error is None:
+            return None
+        raise last_error
+
+    def _record_served(self, name, sources):
+        preferred = next(source for source in self.order if source in sources)
+        with self._stats_lock:
+            self.served[name] += 1
+            if name != preferred:
+                self.fallbacks[name] += 1
+
+    def _ensure_prober(self):
+        with self._prober_lock:
+            if self._prober is None or not self._prober.is_alive():
+                self._prober = threading.Thread(target=self._probe_loop, name='upstream-prober', daemon=True)
+                self._prober.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+            for breaker in self.breakers.values():
+                if not breaker.available:
+                    breaker.run_probe()
+            with self._prober_lock:
+                if all(breaker.available for breaker in self.breakers.values()):
+                    self._prober = None
+                    return
+
+    def active(self):
+        """Source actuellement utilisée en priorité"""
+        for name in self.order:
+            if self.breakers[name].available:
+                return name
+        return None
+
+    def status(self):
+        return {
+            'active': self.active(),
+            'probe_interval': self.probe_interval,
+            'sources': [self.breakers[name].status() for name in self.order],
+            'served': dict(self.served),
+            'fallbacks': dict(self.fallbacks),
+        }
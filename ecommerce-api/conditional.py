@@ -0,0 +1,50 @@
+"""Réponses conditionnelles (ETag / Last-Modified, 304 Not Modified) de l'API"""
+import hashlib
+from urllib.parse import urlencode
+
+from flask import Response, request
+
+
+def args_digest():
+    """Empreinte des paramètres de la requête, indépendante de leur ordre"""
+    query = urlencode(sorted(request.args.items(multi=True)))
+    return hashlib.md5(query.encode()).hexdigest()[:12]
+
+
+def _matches(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def not_modified(etag, last_modified=None):
+    """Réponse 304 si le client a déjà cette version, sinon None.
+
+    À appeler avant de construire la réponse quand l'ETag est connu à
+    l'avance (version du catalogue), pour éviter requête et sérialisation.
+    """
+    if not _matches(etag, last_modified):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def conditional(response, etag=None, last_modified=None):
+    """Ajoute les validateurs à une réponse et la transforme en 304 si le client est à jour.
+
+    Sans `etag`, il est calculé à partir du corps de la réponse.
+    """
+    if response.status_code != 200:
+        return response
+    if etag is None:
+        response.add_etag()
+    else:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response.make_conditional(request)
@@ -0,0 +1,264 @@
+"""Pool de connexions MariaDB partagé par les handlers de l'API"""
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+
+
+class PoolTimeoutError(Exception):
+    """Aucune connexion disponible dans le délai d'attente"""
+
+
+class ObservedCursor:
+    """Curseur dont chaque execute est signalé aux observateurs du pool : (requête, durée, erreur)"""
+
+    def __init__(self, raw, observers):
+        self._raw = raw
+        self._observers = observers
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def _observed(self, method, operation, *args, **kwargs):
+        start = time.perf_counter()
+        error = None
+        try:
+            return method(operation, *args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            for observer in self._observers:
+                observer(operation, elapsed, error)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._observed(self._raw.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._observed(self._raw.executemany, operation, *args, **kwargs)
+
+
+class PooledConnection:
+    """Connexion empruntée au pool : close() la rend au pool au lieu de la fermer"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError("Connexion déjà rendue au pool")
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.__getattr__('cursor')(*args, **kwargs)
+        if self._pool.observers:
+            return ObservedCursor(cursor, self._pool.observers)
+        return cursor
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._release(raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Pool borné de connexions mysql.connector.
+
+    - min_size : connexions ouvertes à l'avance par fill()
+    - max_size : nombre maximal de connexions ouvertes simultanément
+    - timeout : attente maximale (secondes) pour emprunter une connexion
+    - ping_on_borrow : vérifie la connexion avant de la prêter
+    - recycle : âge maximal (secondes) d'une connexion avant réouverture
+
+    observers : fonctions (requête, durée, erreur) appelées après chaque
+    execute des curseurs des connexions prêtées (métriques, traces).
+    """
+
+    def __init__(self, db_config, min_size=1, max_size=10, timeout=5.0,
+                 ping_on_borrow=True, recycle=3600):
+        self.db_config = dict(db_config)
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.ping_on_borrow = ping_on_borrow
+        self.recycle = recycle
+        self.observers = []
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+
+        self._borrows = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._discarded = 0
+
+    def _connect(self):
+        raw = mysql.connector.connect(**self.db_config)
+        with self._cond:
+            self._created += 1
+        return raw, time.monotonic()
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def fill(self):
+        """Ouvre les connexions jusqu'à min_size (au mieux, sans lever d'erreur)"""
+        opened = 0
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    break
+                self._size += 1
+            try:
+                raw, created_at = self._connect()
+            except mysql.connector.Error:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                break
+            with self._cond:
+                self._idle.append((raw, created_at))
+                self._cond.notify()
+            opened += 1
+        return opened
+
+    def acquire(self, timeout=None):
+        """Emprunte une connexion, en attendant au plus `timeout` secondes"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+        entry = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Aucune connexion disponible après {timeout}s "
+                        f"({self._size}/{self.max_size} en cours d'utilisation)"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            wait = time.monotonic() - start
+            self._borrows += 1
+            if waited:
+                self._waits += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+        try:
+            if entry is None:
+                raw, created_at = self._connect()
+            else:
+                raw, created_at = self._validate(*entry)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def _validate(self, raw, created_at):
+        """Recycle les connexions trop anciennes et remplace les connexions mortes"""
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            self._close_quietly(raw)
+            with self._cond:
+                self._recycled += 1
+            return self._connect()
+
+        if self.ping_on_borrow:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                self._close_quietly(raw)
+                with self._cond:
+                    self._discarded += 1
+                return self._connect()
+
+        return raw, created_at
+
+    def _release(self, raw, created_at):
+        """Rend une connexion au pool, en annulant toute transaction restée ouverte"""
+        healthy = True
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((raw, created_at))
+            else:
+                self._size -= 1
+                self._discarded += 1
+            self._cond.notify()
+
+        if not healthy:
+            self._close_quietly(raw)
+
+    def close_all(self):
+        """Ferme toutes les connexions inactives"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for raw, _ in idle:
+            self._close_quietly(raw)
+
+    def stats(self):
+        """Statistiques du pool, pour le dimensionner"""
+        with self._cond:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'borrows': self._borrows,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_time_total_ms': round(self._wait_total * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_total * 1000 / self._borrows, 3) if self._borrows else 0.0,
+                'wait_time_max_ms': round(self._wait_max * 1000, 3),
+                'created': self._created,
+                'recycled': self._recycled,
+                'discarded': self._discarded,
+            }
@@ -0,0 +1,206 @@
+"""Client HTTP partagé vers l'API REST Dolibarr (keep-alive, timeouts, retries, revalidation)"""
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+
+class _ConnectionCounters:
+    """Compteurs de connexions TCP ouvertes et de requêtes émises"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.new_connections = 0
+        self.requests = 0
+
+    def connection_opened(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def request_sent(self):
+        with self._lock:
+            self.requests += 1
+
+    def snapshot(self):
+        with self._lock:
+            return self.new_connections, self.requests
+
+
+class _CountingAdapter(HTTPAdapter):
+    """HTTPAdapter dont les pools urllib3 comptent les connexions nouvelles / réutilisées"""
+
+    def __init__(self, counters, **kwargs):
+        self._counters = counters
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        counters = self._counters
+
+        def counting(base):
+            class CountingPool(base):
+                def _new_conn(self):
+                    counters.connection_opened()
+                    return super()._new_conn()
+
+                def _make_request(self, *a, **kw):
+                    counters.request_sent()
+                    return super()._make_request(*a, **kw)
+            return CountingPool
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': counting(HTTPConnectionPool),
+            'https': counting(HTTPSConnectionPool),
+        }
+
+
+class _ValidatorCache:
+    """Dernière réponse 200 de chaque GET portant un ETag ou un Last-Modified (LRU).
+
+    Permet de redemander la ressource en conditionnel : sur 304, la réponse
+    conservée est renvoyée sans retransférer le corps.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.not_modified = 0
+
+    def conditional_headers(self, key):
+        with self._lock:
+            response = self._entries.get(key)
+        headers = {}
+        if response is not None:
+            if response.headers.get('ETag'):
+                headers['If-None-Match'] = response.headers['ETag']
+            if response.headers.get('Last-Modified'):
+                headers['If-Modified-Since'] = response.headers['Last-Modified']
+        return headers
+
+    def resolve(self, key, response):
+        """Réponse à renvoyer à l'appelant : la réponse conservée si Dolibarr a répondu 304"""
+        with self._lock:
+            if response.status_code == 304 and key in self._entries:
+                self._entries.move_to_end(key)
+                self.not_modified += 1
+                return self._entries[key]
+            if response.status_code == 200 and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+                self._entries[key] = response
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return response
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'not_modified': self.not_modified}
+
+
+class DolibarrClient:
+    """Session keep-alive unique vers DOLIBARR_API_URL.
+
+    - pool_size : nombre maximal de connexions ouvertes (les appels au-delà attendent)
+    - timeouts : {endpoint: (connect, read)} ; la clé 'default' sert de repli
+    - retries / backoff : nouvelles tentatives des GET (idempotents) uniquement
+    - revalidate_entries : nombre de réponses GET conservées pour la revalidation
+      conditionnelle (If-None-Match / If-Modified-Since), 0 pour la désactiver
+    - context_headers : fonction renvoyant les en-têtes propres à la requête en
+      cours (identifiant de corrélation), ajoutés à chaque appel
+
+    observers : fonctions (méthode, endpoint, durée, statut ou None, erreur)
+    appelées après chaque appel (métriques, traces).
+    """
+
+    def __init__(self, base_url, api_key=None, pool_size=10, retries=2, backoff=0.3,
+                 timeouts=None, revalidate_entries=256, context_headers=None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.context_headers = context_headers
+        self.observers = []
+        self.timeouts = {'default': (3.0, 10.0)}
+        self.timeouts.update(timeouts or {})
+        self._counters = _ConnectionCounters()
+        self._validators = _ValidatorCache(revalidate_entries) if revalidate_entries else None
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+        )
+        adapter = _CountingAdapter(
+            self._counters,
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=True,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool_size = pool_size
+
+    def headers(self, with_key=True):
+        headers = {'Content-Type': 'application/json'}
+        if self.context_headers is not None:
+            headers.update(self.context_headers())
+        if with_key and self.api_key and self.api_key != 'your_dolibarr_api_key':
+            headers['DOLAPIKEY'] = self.api_key
+        return headers
+
+    def timeout_for(self, endpoint):
+        return self.timeouts.get(endpoint, self.timeouts['default'])
+
+    def url(self, path):
+        return f"{self.base_url}/api/index.php/{path.lstrip('/')}"
+
+    def _send(self, method, path, endpoint, headers, **kwargs):
+        start = time.perf_counter()
+        response = error = None
+        try:
+            response = self.session.request(method, self.url(path), headers=headers, **kwargs)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            for observer in self.observers:
+                observer(method, endpoint, elapsed, response.status_code if response is not None else None, error)
+
+    def get(self, path, endpoint='default', with_key=True, **kwargs):
+        kwargs.setdefault('timeout', self.timeout_for(endpoint))
+        headers = self.headers(with_key)
+        if self._validators is None:
+            return self._send('GET', path, endpoint, headers, **kwargs)
+
+        params = kwargs.get('params')
+        key = (path, with_key, tuple(sorted(params.items())) if isinstance(params, dict) else params)
+        headers.update(self._validators.conditional_headers(key))
+        response = self._send('GET', path, endpoint, headers, **kwargs)
+        return self._validators.resolve(key, response)
+
+    def post(self, path, endpoint='default', with_key=True, **kwargs):
+        kwargs.setdefault('timeout', self.timeout_for(endpoint))
+        return self._send('POST', path, endpoint, self.headers(with_key), **kwargs)
+
+    def stats(self):
+        new_connections, sent = self._counters.snapshot()
+        return {
+            'base_url': self.base_url,
+            'pool_size': self.pool_size,
+            'requests': sent,
+            'new_connections': new_connections,
+            'reused_connections': max(0, sent - new_connections),
+            'timeouts': {name: {'connect': c, 'read': r} for name, (c, r) in self.timeouts.items()},
+            'revalidation': self._validators.stats() if self._validators is not None else None,
+        }
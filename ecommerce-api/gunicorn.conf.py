@@ -0,0 +1,46 @@
+"""Configuration gunicorn de l'API (production)
+
+Par défaut, workers gevent : chaque worker sert des centaines de requêtes
+simultanées sur une boucle d'événements, les appels à Dolibarr (requests) et
+à MariaDB (connecteur en Python pur) cédant la main pendant les attentes réseau.
+"""
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = os.getenv('API_WORKER_CLASS', 'gevent')
+workers = int(os.getenv('API_WORKERS', '2'))
+worker_connections = int(os.getenv('API_WORKER_CONNECTIONS', '500'))
+threads = int(os.getenv('API_THREADS', '1'))
+timeout = int(os.getenv('API_WORKER_TIMEOUT', '60'))
+accesslog = os.getenv('API_ACCESS_LOG') or None
+
+# Mesures de chaque worker déposées dans ce répertoire, sommées par GET /metrics
+os.environ['METRICS_DIR'] = os.getenv('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'ecommerce-api-metrics')
+# Journal des stocks écrits par chaque worker, suivi par les autres ; verrou du worker qui réconcilie
+os.environ['STOCK_TOTALS_DIR'] = os.getenv('STOCK_TOTALS_DIR') or os.path.join(tempfile.gettempdir(), 'ecommerce-api-stock-totals')
+# Instantané du catalogue écrit par un seul worker et projeté en mémoire par tous
+os.environ['CATALOG_SNAPSHOT_PATH'] = os.getenv('CATALOG_SNAPSHOT_PATH') or os.path.join(tempfile.gettempdir(), 'ecommerce-api-catalog.snap')
+
+if worker_class == 'gevent':
+    # Le connecteur C bloquerait toute la boucle d'événements du worker
+    os.environ.setdefault('DB_USE_PURE', '1')
+
+
+def on_starting(server):
+    # Compteurs repartant de zéro à chaque démarrage du serveur
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+    shutil.rmtree(os.environ['STOCK_TOTALS_DIR'], ignore_errors=True)
+    # Catalogue rechargé depuis Dolibarr au démarrage du serveur
+    for suffix in ('', '.invalidated'):
+        try:
+            os.remove(os.environ['CATALOG_SNAPSHOT_PATH'] + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def post_worker_init(worker):
+    # Connexions ouvertes, catalogue et stocks totaux chargés avant la première requête du worker
+    from app import warmup
+    warmup.run(notify=worker.notify)
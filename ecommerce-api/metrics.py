@@ -0,0 +1,256 @@
+"""Métriques au format texte Prometheus : compteurs, histogrammes et valeurs lues à la demande
+
+Une copie identique de ce module se trouve dans l'API et le frontend (chacun
+est construit depuis son propre répertoire) : les modifier ensemble.
+
+Enregistrer une mesure coûte un verrou et quelques additions ; les jauges
+(pool, caches) ne sont lues que lorsque /metrics est demandé.
+
+Avec plusieurs workers, snapshot_dir (répertoire partagé) reçoit toutes les
+flush_interval secondes les mesures de chaque worker : /metrics renvoie la
+somme des compteurs et histogrammes de tous les workers, et les jauges de
+chacun avec un label worker.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Response, g, request
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Secondes ; adaptées aux pages web et aux appels HTTP / SQL
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Compteur par combinaison de labels (tuple de valeurs, dans l'ordre de labelnames)"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram:
+    """Histogramme par combinaison de labels : effectifs par intervalle, somme"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Effectif de chaque intervalle (dernier : au-delà du plus grand seuil), puis somme
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def samples(self):
+        with self._lock:
+            return {labels: list(entry) for labels, entry in self._values.items()}
+
+
+class Collected:
+    """Valeurs lues à la demande : read() renvoie {tuple de labels: valeur}"""
+
+    def __init__(self, name, help_text, labelnames, read, kind='gauge'):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.read = read
+        self.kind = kind
+
+    def samples(self):
+        return self.read()
+
+
+class Metrics:
+    """Registre des métriques d'une application, exposé par init_app() sur /metrics"""
+
+    def __init__(self, prefix, snapshot_dir=None, flush_interval=10):
+        self.prefix = prefix
+        self.snapshot_dir = snapshot_dir
+        self.flush_interval = flush_interval
+        self._metrics = []
+        self._flusher = None
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+
+    def _register(self, metric):
+        metric.name = f'{self.prefix}_{metric.name}'
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def collect(self, name, help_text, read, labelnames=(), kind='gauge'):
+        """Métrique lue à chaque export ; kind='counter' pour une valeur cumulée (ex. hits d'un cache)"""
+        return self._register(Collected(name, help_text, labelnames, read, kind))
+
+    def collect_stats(self, name, help_text, stats, gauges=(), counters=()):
+        """Champs numériques d'une méthode stats() existante, une métrique par champ"""
+        for key in gauges:
+            self.collect(f'{name}_{key}', f'{help_text} : {key}', lambda key=key: {(): stats()[key] or 0})
+        for key in counters:
+            self.collect(f'{name}_{key}_total', f'{help_text} : {key} (cumulé)',
+                         lambda key=key: {(): stats()[key] or 0}, kind='counter')
+
+    def snapshot(self):
+        """{nom: famille} des mesures de ce processus, sérialisable en JSON"""
+        families = {}
+        for metric in self._metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                # Source indisponible (ex. base arrêtée) : la métrique est omise
+                continue
+            families[metric.name] = {
+                'kind': metric.kind,
+                'help': metric.help,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'samples': [[list(labels), value] for labels, value in samples.items()],
+            }
+        return families
+
+    def _write_snapshot(self):
+        path = os.path.join(self.snapshot_dir, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as output:
+            json.dump({'written_at': time.time(), 'families': self.snapshot()}, output)
+        os.replace(path + '.tmp', path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self._write_snapshot()
+            except OSError:
+                pass
+
+    def _merged(self):
+        """Mesures de tous les workers : compteurs et histogrammes sommés, jauges par worker"""
+        self._write_snapshot()
+        merged = {}
+        for path in glob.glob(os.path.join(self.snapshot_dir, '*.json')):
+            try:
+                with open(path, encoding='utf-8') as source:
+                    snapshot = json.load(source)
+            except (OSError, ValueError):
+                continue
+            worker = os.path.basename(path)[:-len('.json')]
+            # Jauges d'un worker arrêté : ignorées ; ses compteurs restent acquis
+            alive = time.time() - snapshot['written_at'] < 3 * self.flush_interval
+            for name, family in snapshot['families'].items():
+                target = merged.setdefault(name, dict(family, samples={}))
+                for labels, value in family['samples']:
+                    if family['kind'] == 'gauge':
+                        if alive:
+                            target['samples'][tuple(labels) + (worker,)] = value
+                        continue
+                    key = tuple(labels)
+                    current = target['samples'].get(key)
+                    if current is None:
+                        target['samples'][key] = value
+                    elif isinstance(value, list):
+                        target['samples'][key] = [a + b for a, b in zip(current, value)]
+                    else:
+                        target['samples'][key] = current + value
+        for family in merged.values():
+            if family['kind'] == 'gauge':
+                family['labelnames'] = family['labelnames'] + ['worker']
+            family['samples'] = list(family['samples'].items())
+        return merged
+
+    def render(self):
+        """Texte d'exposition Prometheus (version 0.0.4)"""
+        families = self._merged() if self.snapshot_dir else self.snapshot()
+        lines = []
+        for name, family in sorted(families.items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            labelnames = family['labelnames']
+            for labels, value in sorted(family['samples'], key=lambda sample: [str(v) for v in sample[0]]):
+                pairs = list(zip(labelnames, labels))
+                if family['kind'] != 'histogram':
+                    lines.append(f'{name}{_format_labels(pairs)} {_format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(family['buckets'] + [float('inf')], value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(pairs + [('le', _format_value(float(bound)))])} {cumulative}")
+                lines.append(f'{name}_sum{_format_labels(pairs)} {_format_value(value[-1])}')
+                lines.append(f'{name}_count{_format_labels(pairs)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def init_app(self, app, path='/metrics'):
+        """Durée des requêtes par route, méthode et statut, et route d'export"""
+        requests_histogram = self.histogram(
+            'http_request_duration_seconds', 'Durée de traitement des requêtes HTTP',
+            ('method', 'route', 'status')
+        )
+
+        @app.before_request
+        def _start_timer():
+            g.metrics_started = time.perf_counter()
+
+        @app.after_request
+        def _record_request(response):
+            started = g.pop('metrics_started', None)
+            if started is not None:
+                route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                requests_histogram.observe((request.method, route, str(response.status_code)),
+                                           time.perf_counter() - started)
+            return response
+
+        app.add_url_rule(path, 'metrics', lambda: Response(self.render(), content_type=CONTENT_TYPE))
+
+        if self.snapshot_dir and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._flusher.start()
@@ -0,0 +1,92 @@
+"""Pagination par curseur (keyset) des endpoints de liste de l'API"""
+import base64
+import json
+from urllib.parse import urlencode
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, jsonify, request
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class InvalidPageRequest(ValueError):
+    """Paramètres limit / cursor invalides"""
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type non sérialisable dans un curseur: {type(value)}")
+
+
+def encode_cursor(values):
+    """Curseur opaque à partir des valeurs de clé de la dernière ligne servie"""
+    raw = json.dumps(list(values), default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidPageRequest('Curseur invalide')
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidPageRequest('Curseur invalide')
+    return values
+
+
+def page_args(cursor_size):
+    """Lit limit / cursor / count dans la requête.
+
+    Renvoie (limit, valeurs du curseur, avec total) ; limit vaut None si la
+    requête ne demande pas de pagination (liste complète, comme avant).
+    """
+    raw_limit = request.args.get('limit')
+    raw_cursor = request.args.get('cursor')
+    with_count = request.args.get('count', '1') != '0'
+
+    if raw_limit is None and raw_cursor is None:
+        return None, None, with_count
+
+    try:
+        limit = int(raw_limit) if raw_limit is not None else DEFAULT_LIMIT
+    except ValueError:
+        raise InvalidPageRequest('Paramètre limit invalide')
+    if limit < 1:
+        raise InvalidPageRequest('Paramètre limit invalide')
+    limit = min(limit, MAX_LIMIT)
+
+    cursor = decode_cursor(raw_cursor, cursor_size) if raw_cursor else None
+    return limit, cursor, with_count
+
+
+def page_response(items, next_cursor=None, total=None):
+    """Réponse JSON (liste) avec les métadonnées de pagination dans les en-têtes ; items peut être un corps JSON déjà encodé (bytes)"""
+    response = Response(items, mimetype='application/json') if isinstance(items, bytes) else jsonify(items)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    if total is not None:
+        response.headers['X-Total-Count'] = str(total)
+    return response
+
+
+def keyset_after_desc(column, id_column, key, id_value):
+    """Condition SQL « après (key, id) » pour ORDER BY column DESC, id DESC.
+
+    MariaDB place les NULL en dernier en ordre décroissant ; la condition en
+    tient compte et reste utilisable par un index sur `column`.
+    """
+    if key is None:
+        return f"({column} IS NULL AND {id_column} < %s)", [id_value]
+    return (
+        f"({column} < %s OR {column} IS NULL OR ({column} = %s AND {id_column} < %s))",
+        [key, key, id_value]
+    )
@@ -0,0 +1,151 @@
+"""Index inversé pour la recherche plein texte dans le catalogue"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Poids des champs indexés : un terme trouvé dans le libellé compte plus que dans la description
+FIELD_WEIGHTS = (
+    (('label', 'name'), 3.0),
+    (('ref',), 2.0),
+    (('description',), 1.0),
+)
+
+# Un terme qui n'est qu'un préfixe du mot indexé compte moitié moins
+PREFIX_FACTOR = 0.5
+
+
+def fold(text):
+    """Minuscules sans accents : « Été » -> « ete », « Légumes » -> « legumes »"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(fold(text or ''))
+
+
+def product_key(product):
+    return product.get('id') if product.get('id') is not None else product.get('ref')
+
+
+class SearchIndex:
+    """Index inversé terme -> {produit: poids}, avec vocabulaire trié pour les préfixes.
+
+    sync() ne retokenise que les produits ajoutés, modifiés ou supprimés
+    depuis le chargement précédent.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._vocabulary = []
+        self._documents = {}
+
+    @staticmethod
+    def _signature(product):
+        return tuple(
+            next((product.get(field) for field in fields if product.get(field)), '') or ''
+            for fields, _ in FIELD_WEIGHTS
+        )
+
+    @staticmethod
+    def _weights(signature):
+        weights = {}
+        for text, (_, weight) in zip(signature, FIELD_WEIGHTS):
+            for token in tokenize(text):
+                weights[token] = weights.get(token, 0.0) + weight
+        return weights
+
+    def _remove(self, key):
+        signature = self._documents.pop(key)
+        for token in self._weights(signature):
+            docs = self._postings.get(token)
+            if docs is None:
+                continue
+            docs.pop(key, None)
+            if not docs:
+                del self._postings[token]
+                position = bisect_left(self._vocabulary, token)
+                if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                    del self._vocabulary[position]
+
+    def _add(self, key, signature, sort_later=False):
+        self._documents[key] = signature
+        for token, weight in self._weights(signature).items():
+            docs = self._postings.get(token)
+            if docs is None:
+                docs = self._postings[token] = {}
+                if not sort_later:
+                    insort(self._vocabulary, token)
+                else:
+                    self._vocabulary.append(token)
+            docs[key] = weight
+
+    def sync(self, products):
+        """Aligne l'index sur le catalogue ; renvoie le nombre de produits retokenisés"""
+        with self._lock:
+            bulk = not self._documents
+            current = {}
+            for product in products:
+                key = product_key(product)
+                if key is not None:
+                    current[key] = self._signature(product)
+
+            changed = 0
+            for key in [key for key in self._documents if key not in current]:
+                self._remove(key)
+                changed += 1
+            for key, signature in current.items():
+                previous = self._documents.get(key)
+                if previous == signature:
+                    continue
+                if previous is not None:
+                    self._remove(key)
+                self._add(key, signature, sort_later=bulk)
+                changed += 1
+
+            if bulk:
+                self._vocabulary.sort()
+            return changed
+
+    def _expand(self, term):
+        """Mots du vocabulaire commençant par `term`"""
+        position = bisect_left(self._vocabulary, term)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(term):
+            yield self._vocabulary[position]
+            position += 1
+
+    def search(self, query):
+        """Renvoie [(clé produit, score)] par score décroissant ; tous les termes doivent correspondre"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for token in self._expand(term):
+                    factor = 1.0 if token == term else PREFIX_FACTOR
+                    for key, weight in self._postings[token].items():
+                        score = weight * factor
+                        if score > term_scores.get(key, 0.0):
+                            term_scores[key] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {key: scores[key] + score for key, score in term_scores.items() if key in scores}
+                if not scores:
+                    return []
+
+        return sorted(scores.items(), key=lambda item: -item[1])
+
+    def __len__(self):
+        return len(self._documents)
+
+    def stats(self):
+        with self._lock:
+            return {'documents': len(self._documents), 'terms': len(self._vocabulary)}
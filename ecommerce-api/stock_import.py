@@ -0,0 +1,260 @@
+"""Import de stock CSV en tâche de fond : lecture en flux, lots transactionnels, reprise"""
+import csv
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+log = logging.getLogger(__name__)
+
+JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# Noms de colonnes reconnus dans l'en-tête (insensibles à la casse) ; à défaut,
+# les positions de l'export : ID, Nom, Prix, Stock
+ID_COLUMNS = ('id', 'product_id', 'rowid')
+STOCK_COLUMNS = ('stock', 'reel', 'quantity')
+WAREHOUSE_COLUMNS = ('warehouse_id', 'fk_entrepot', 'entrepot')
+
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class ImportNotFound(Exception):
+    """Aucun import avec cet identifiant"""
+
+
+class ImportConflict(Exception):
+    """L'import est en cours ou terminé : il ne peut pas être repris"""
+
+
+def _column(header, names, default):
+    normalized = [name.strip().lower() for name in header]
+    for name in names:
+        if name in normalized:
+            return normalized.index(name)
+    return default
+
+
+class StockImportJobs:
+    """Imports de stock exécutés en tâche de fond, un fichier CSV par import.
+
+    - spool_dir : répertoire du fichier reçu, de l'état (JSON) et du rapport
+      d'erreurs de chaque import ; partagé entre les workers, il permet de
+      suivre et de reprendre un import depuis n'importe lequel. Le worker qui
+      exécute un import tient un verrou sur <id>.lock : deux workers ne
+      peuvent pas reprendre le même import
+    - apply_batch : fonction [(product_id, warehouse_id, stock)] ->
+      (produits introuvables, entrepôts introuvables), qui écrit un lot dans
+      une transaction sans les lignes qui en référencent un
+    - batch_size : lignes par lot (une transaction et un point de reprise par lot)
+    - stale_after : secondes sans progression au-delà desquelles un import
+      « en cours » dont aucun worker ne tient le verrou est signalé interrompu
+    """
+
+    def __init__(self, spool_dir, apply_batch, batch_size=500, default_warehouse=1,
+                 max_errors=100, stale_after=120):
+        self.spool_dir = spool_dir
+        self.apply_batch = apply_batch
+        self.batch_size = batch_size
+        self.default_warehouse = default_warehouse
+        self.max_errors = max_errors
+        self.stale_after = stale_after
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def _path(self, job_id, suffix):
+        if not JOB_ID_RE.match(job_id or ''):
+            raise ImportNotFound(job_id)
+        return os.path.join(self.spool_dir, f'{job_id}{suffix}')
+
+    def _load(self, job_id):
+        try:
+            with open(self._path(job_id, '.json'), encoding='utf-8') as state:
+                return json.load(state)
+        except FileNotFoundError:
+            raise ImportNotFound(job_id)
+
+    def _save(self, job):
+        job['updated_at'] = time.time()
+        path = self._path(job['id'], '.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as state:
+            json.dump(job, state)
+        os.replace(path + '.tmp', path)
+
+    def _claim(self, job_id):
+        """Verrou d'exécution de l'import (fichier ouvert, à fermer pour le rendre) ; None s'il est déjà tenu.
+
+        flock porte sur le fichier ouvert : le verrou exclut aussi un autre
+        thread du même worker, et le système le rend si le worker s'arrête.
+        """
+        handle = open(self._path(job_id, '.lock'), 'a')
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return None
+        return handle
+
+    def create(self, source, filename=None):
+        """Copie le flux CSV reçu sur disque par blocs, puis lance l'import"""
+        job_id = uuid.uuid4().hex
+        lines = 0
+        size = 0
+        with open(self._path(job_id, '.csv'), 'wb') as spool:
+            while True:
+                chunk = source.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                spool.write(chunk)
+                lines += chunk.count(b'\n')
+                size += len(chunk)
+        if size == 0:
+            os.remove(self._path(job_id, '.csv'))
+            raise ValueError('Fichier vide')
+
+        job = {
+            'id': job_id,
+            'filename': filename,
+            'status': 'queued',
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'bytes': size,
+            # En-tête exclu ; approximatif si des champs contiennent des retours à la ligne
+            'total_rows': max(0, lines - 1),
+            'rows': 0,
+            'applied': 0,
+            'invalid': 0,
+            'not_found': 0,
+            'checkpoint': 1,
+            'attempts': 0,
+            'error': None,
+            'errors': [],
+        }
+        claim = self._claim(job_id)
+        self._save(job)
+        self._start(job, claim)
+        return job
+
+    def status(self, job_id):
+        job = self._load(job_id)
+        if job['status'] in ('queued', 'running') and time.time() - job['updated_at'] > self.stale_after:
+            # Sans progression : interrompu si aucun worker ne tient son verrou
+            claim = self._claim(job_id)
+            if claim is not None:
+                claim.close()
+                job['status'] = 'interrupted'
+        return job
+
+    def resume(self, job_id):
+        """Relance un import échoué ou interrompu à partir du dernier lot validé"""
+        self._load(job_id)
+        claim = self._claim(job_id)
+        if claim is None:
+            raise ImportConflict('running')
+        try:
+            # Relu sous verrou : un autre worker a pu le reprendre et le terminer entre-temps
+            job = self._load(job_id)
+            if job['status'] in ('queued', 'running'):
+                job['status'] = 'interrupted'
+            if job['status'] not in ('failed', 'interrupted'):
+                raise ImportConflict(job['status'])
+            job['status'] = 'queued'
+            job['error'] = None
+            self._save(job)
+        except Exception:
+            claim.close()
+            raise
+        self._start(job, claim)
+        return job
+
+    def error_report(self, job_id):
+        """Chemin du rapport d'erreurs CSV (ligne, product_id, erreur), None s'il est vide"""
+        self._load(job_id)
+        path = self._path(job_id, '.errors.csv')
+        return path if os.path.exists(path) else None
+
+    def _start(self, job, claim):
+        """Exécute l'import dans un thread, qui rend le verrou claim à la fin"""
+        threading.Thread(target=self._run, args=(job, claim), name=f"stock-import-{job['id'][:8]}", daemon=True).start()
+
+    def _run(self, job, claim):
+        job['status'] = 'running'
+        job['attempts'] += 1
+        job['started_at'] = job['started_at'] or time.time()
+        self._save(job)
+        try:
+            with open(self._path(job['id'], '.csv'), newline='', encoding='utf-8-sig') as source:
+                reader = csv.reader(source)
+                header = next(reader, None) or []
+                id_index = _column(header, ID_COLUMNS, 0)
+                stock_index = _column(header, STOCK_COLUMNS, 3)
+                warehouse_index = _column(header, WAREHOUSE_COLUMNS, None)
+
+                batch, errors = [], []
+                line = job['checkpoint']
+                for line, row in enumerate(reader, start=2):
+                    # Lignes déjà validées lors d'une exécution précédente
+                    if line <= job['checkpoint']:
+                        continue
+                    try:
+                        product_id = int(row[id_index])
+                        stock = float(row[stock_index].replace(',', '.'))
+                        warehouse = self.default_warehouse
+                        if warehouse_index is not None and warehouse_index < len(row) and row[warehouse_index].strip():
+                            warehouse = int(row[warehouse_index])
+                    except (IndexError, ValueError):
+                        if any(value.strip() for value in row):
+                            errors.append((line, row[id_index] if id_index < len(row) else '', 'Ligne invalide'))
+                        continue
+                    batch.append((line, product_id, warehouse, stock))
+                    if len(batch) >= self.batch_size:
+                        self._commit(job, batch, errors, line)
+                        batch, errors = [], []
+                self._commit(job, batch, errors, line)
+            job['status'] = 'done'
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            log.error("Import de stock %s interrompu à la ligne %s: %s", job['id'], job['checkpoint'], e)
+        finally:
+            job['finished_at'] = time.time() if job['status'] == 'done' else None
+            self._save(job)
+            claim.close()
+
+    def _commit(self, job, batch, errors, line):
+        """Écrit un lot puis avance le point de reprise ; rien n'est compté si le lot échoue"""
+        missing_products, missing_warehouses = self.apply_batch(
+            [(product_id, warehouse, stock) for _, product_id, warehouse, stock in batch]
+        ) if batch else (set(), set())
+        invalid = len(errors)
+        errors = list(errors)
+        applied = 0
+        for line_number, product_id, warehouse, _ in batch:
+            if product_id in missing_products:
+                errors.append((line_number, product_id, 'Produit non trouvé'))
+            elif warehouse in missing_warehouses:
+                errors.append((line_number, product_id, f'Entrepôt non trouvé ({warehouse})'))
+            else:
+                applied += 1
+        errors.sort()
+
+        if errors:
+            report = self._path(job['id'], '.errors.csv')
+            new_report = not os.path.exists(report)
+            with open(report, 'a', newline='', encoding='utf-8') as output:
+                writer = csv.writer(output)
+                if new_report:
+                    writer.writerow(['ligne', 'product_id', 'erreur'])
+                writer.writerows(errors)
+            room = self.max_errors - len(job['errors'])
+            job['errors'].extend({'line': l, 'product_id': p, 'error': e} for l, p, e in errors[:max(0, room)])
+
+        job['rows'] += len(batch) + invalid
+        job['applied'] += applied
+        job['invalid'] += invalid
+        job['not_found'] += len(batch) - applied
+        job['checkpoint'] = line
+        self._save(job)
@@ -0,0 +1,118 @@
+"""Mutations atomiques du stock d'un produit dans un entrepôt (set / increment / decrement)"""
+from datetime import datetime
+
+OPERATIONS = ('set', 'increment', 'decrement')
+
+APPLIED = 'applied'
+CONFLICT = 'conflict'
+INSUFFICIENT = 'insufficient'
+NOT_FOUND = 'not_found'
+
+
+class InvalidMutation(ValueError):
+    """Mutation de stock mal formée"""
+
+
+def stock_version(tms, reel):
+    """Version opaque d'une ligne de stock.
+
+    tms n'a qu'une précision à la seconde : la quantité y est ajoutée pour
+    qu'une modification dans la même seconde change aussi la version.
+    """
+    if tms is None:
+        return None
+    return f"{tms:%Y%m%d%H%M%S}-{float(reel or 0)!r}"
+
+
+def parse_version(version):
+    try:
+        tms, reel = str(version).split('-', 1)
+        return datetime.strptime(tms, '%Y%m%d%H%M%S'), float(reel)
+    except ValueError:
+        raise InvalidMutation('Version invalide')
+
+
+def parse_mutation(data, default_warehouse):
+    """(op, quantité, entrepôt, version attendue, stock négatif permis) depuis le corps JSON.
+
+    {"stock": 10} reste accepté et vaut {"op": "set", "quantity": 10}.
+    """
+    if not isinstance(data, dict):
+        raise InvalidMutation('Corps JSON manquant')
+    op = data.get('op', 'set')
+    if op not in OPERATIONS:
+        raise InvalidMutation(f"Opération inconnue: {op}")
+    quantity = data.get('quantity', data.get('stock'))
+    try:
+        quantity = float(quantity)
+        warehouse_id = int(data.get('warehouse_id') or default_warehouse)
+    except (TypeError, ValueError):
+        raise InvalidMutation('Quantité de stock manquante ou invalide')
+    if op != 'set' and quantity < 0:
+        raise InvalidMutation('La quantité d\'un increment / decrement doit être positive')
+    expected = data.get('expected_version')
+    return op, quantity, warehouse_id, parse_version(expected) if expected else None, bool(data.get('allow_negative'))
+
+
+def _current(cursor, product_id, warehouse_id):
+    cursor.execute(
+        "SELECT reel, tms FROM llx_product_stock WHERE fk_product = %s AND fk_entrepot = %s",
+        (product_id, warehouse_id)
+    )
+    return cursor.fetchone()
+
+
+def _product_exists(cursor, product_id):
+    cursor.execute("SELECT rowid FROM llx_product WHERE rowid = %s", (product_id,))
+    return cursor.fetchone() is not None
+
+
+def apply_mutation(cursor, product_id, warehouse_id, op, quantity, expected=None, allow_negative=False):
+    """Applique la mutation en une seule instruction SQL atomique, sans lecture préalable.
+
+    Renvoie (statut, stock, version) ; la ligne n'est relue qu'après
+    l'écriture, ou pour expliquer un refus.
+    """
+    if expected is None and (op != 'decrement' or allow_negative):
+        # Upsert : crée la ligne de l'entrepôt si besoin, le produit doit exister
+        delta = -quantity if op == 'decrement' else quantity
+        new_value = "VALUES(reel)" if op == 'set' else "reel + VALUES(reel)"
+        cursor.execute(f"""
+            INSERT INTO llx_product_stock (fk_product, fk_entrepot, reel, tms)
+            SELECT p.rowid, %s, %s, NOW() FROM llx_product as p WHERE p.rowid = %s
+            ON DUPLICATE KEY UPDATE reel = {new_value}, tms = NOW()
+        """, (warehouse_id, delta, product_id))
+        if cursor.rowcount == 0 and not _product_exists(cursor, product_id):
+            # Sans CLIENT_FOUND_ROWS, une réécriture de la même valeur compte 0 ligne : seule l'absence du produit est un refus
+            return NOT_FOUND, None, None
+    else:
+        # Mise à jour conditionnelle de la ligne existante (version attendue, stock suffisant)
+        assignments = {'set': "%s", 'increment': "reel + %s", 'decrement': "reel - %s"}
+        conditions = ["fk_product = %s", "fk_entrepot = %s"]
+        params = [quantity, product_id, warehouse_id]
+        if expected is not None:
+            conditions.append("tms = %s AND reel = %s")
+            params.extend(expected)
+        if op == 'decrement' and not allow_negative:
+            conditions.append("reel >= %s")
+            params.append(quantity)
+        cursor.execute(
+            f"UPDATE llx_product_stock SET reel = {assignments[op]}, tms = NOW() WHERE {' AND '.join(conditions)}",
+            params
+        )
+        if cursor.rowcount == 0:
+            row = _current(cursor, product_id, warehouse_id)
+            if row is None:
+                if not _product_exists(cursor, product_id):
+                    return NOT_FOUND, None, None
+                return (CONFLICT if expected is not None else INSUFFICIENT), 0, None
+            reel, tms = row
+            if expected is not None and (tms, float(reel or 0)) != expected:
+                return CONFLICT, reel, stock_version(tms, reel)
+            if op == 'decrement' and not allow_negative and float(reel or 0) < quantity:
+                return INSUFFICIENT, reel, stock_version(tms, reel)
+            # Conditions remplies : la mise à jour n'a rien changé (même valeur dans la même seconde)
+            return APPLIED, reel, stock_version(tms, reel)
+
+    reel, tms = _current(cursor, product_id, warehouse_id)
+    return APPLIED, reel, stock_version(tms, reel)
@@ -0,0 +1,362 @@
+"""Stock total de chaque produit (tous entrepôts), maintenu en mémoire et en option dans une table annexe"""
+import fcntl
+import itertools
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+TOTALS_TABLE = 'llx_product_stock_total'
+
+TOTALS_QUERY = """
+    SELECT p.rowid, COALESCE(SUM(ps.reel), 0), MAX(ps.tms)
+    FROM llx_product as p
+    LEFT JOIN llx_product_stock as ps ON p.rowid = ps.fk_product
+"""
+
+CREATE_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {TOTALS_TABLE} (
+        fk_product int(11) NOT NULL,
+        reel double NOT NULL DEFAULT 0,
+        stock_tms timestamp NULL DEFAULT NULL,
+        tms timestamp NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+        PRIMARY KEY (fk_product)
+    ) ENGINE=InnoDB
+"""
+
+# Dans shared_dir : journal des produits écrits, verrou du worker qui réconcilie
+JOURNAL_FILE = 'changes'
+LEADER_LOCK_FILE = 'reconcile.lock'
+
+
+class StockTotals:
+    """Stock total de chaque produit, lu en O(1) depuis la mémoire du worker.
+
+    - chargé une fois par une requête agrégée sur llx_product_stock
+    - refresh(product_ids) après chaque écriture validée : seuls les produits
+      touchés sont recalculés (une requête groupée indexée)
+    - reconcile() toutes les reconcile_interval secondes recalcule tout depuis
+      les lignes sources et rattrape les écritures des autres processus
+      (autres workers, admin, Dolibarr)
+    - use_table : tient aussi à jour llx_product_stock_total, une ligne par
+      produit, que les autres applications peuvent joindre
+    - shared_dir : répertoire partagé par les workers d'un même serveur.
+      refresh() ajoute les produits écrits au journal JOURNAL_FILE ; chaque
+      worker le suit à chaque lecture et relit en base les produits écrits par
+      les autres, sans attendre la réconciliation. Avec use_table, seul le
+      worker qui tient LEADER_LOCK_FILE recalcule la table annexe, au
+      chargement comme à chaque réconciliation ; les autres la relisent.
+
+    Chaque valeur porte le numéro de la lecture qui l'a produite : une lecture
+    commencée plus tôt n'écrase jamais une valeur plus récente.
+    """
+
+    def __init__(self, pool, use_table=False, reconcile_interval=60, batch_size=500,
+                 shared_dir=None, journal_max_bytes=1 << 20):
+        self.pool = pool
+        self.use_table = use_table
+        self.reconcile_interval = reconcile_interval
+        self.batch_size = batch_size
+        self.shared_dir = shared_dir
+        self.journal_max_bytes = journal_max_bytes
+        self._journal_lock = threading.Lock()
+        self._journal_fd = None
+        self._journal_offset = 0
+        self._leader = None
+        self._remote_changes = 0
+        if shared_dir:
+            os.makedirs(shared_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._sequence = itertools.count(1)
+        self._totals = None
+        self._reconciled_at = None
+        self._thread = None
+        self._table_ready = False
+        self._hits = 0
+        self._misses = 0
+        self._fresh_reads = 0
+        self._refreshes = 0
+        self._reconciliations = 0
+        self._drift = 0
+
+    def _read(self, product_ids=None, update_table=True):
+        """(numéro de lecture, {product_id: (total, dernière modification)}) depuis les lignes sources
+
+        update_table=False : simple lecture des lignes sources, même avec use_table.
+        """
+        with self.pool.acquire() as conn:
+            cursor = conn.cursor()
+            try:
+                where = ''
+                params = []
+                if product_ids is not None:
+                    where = f" WHERE p.rowid IN ({', '.join(['%s'] * len(product_ids))})"
+                    params = list(product_ids)
+                if self.use_table and update_table:
+                    if not self._table_ready:
+                        cursor.execute(CREATE_TABLE)
+                        self._table_ready = True
+                    # Une seule instruction : lecture verrouillante des lignes sources, donc à jour
+                    sequence = next(self._sequence)
+                    cursor.execute(
+                        f"INSERT INTO {TOTALS_TABLE} (fk_product, reel, stock_tms) " + TOTALS_QUERY + where
+                        + " GROUP BY p.rowid ON DUPLICATE KEY UPDATE reel = VALUES(reel), stock_tms = VALUES(stock_tms)",
+                        params
+                    )
+                    if product_ids is None:
+                        cursor.execute(f"DELETE FROM {TOTALS_TABLE} WHERE fk_product NOT IN (SELECT rowid FROM llx_product)")
+                    conn.commit()
+                    cursor.execute(
+                        f"SELECT fk_product, reel, stock_tms FROM {TOTALS_TABLE}"
+                        + (where.replace('p.rowid', 'fk_product') if where else ''),
+                        params
+                    )
+                else:
+                    sequence = next(self._sequence)
+                    cursor.execute(TOTALS_QUERY + where + " GROUP BY p.rowid", params)
+                return sequence, {row[0]: (float(row[1]), row[2]) for row in cursor.fetchall()}
+            finally:
+                cursor.close()
+
+    def _read_table(self):
+        """Comme _read(), depuis la table annexe tenue à jour par un autre worker"""
+        with self.pool.acquire() as conn:
+            cursor = conn.cursor()
+            try:
+                sequence = next(self._sequence)
+                cursor.execute(f"SELECT fk_product, reel, stock_tms FROM {TOTALS_TABLE}")
+                return sequence, {row[0]: (float(row[1]), row[2]) for row in cursor.fetchall()}
+            finally:
+                cursor.close()
+
+    def _publish(self, totals, sequence):
+        """Enregistre les totaux lus par la lecture n° sequence ; renvoie le nombre de valeurs corrigées"""
+        changed = 0
+        for product_id, (total, modified) in totals.items():
+            current = self._totals.get(product_id)
+            if current is None or current[2] < sequence:
+                if current is not None and current[0] is not None and current[0] != total:
+                    changed += 1
+                self._totals[product_id] = (total, modified, sequence)
+        return changed
+
+    def load(self):
+        """Premier chargement (une seule fois), puis réconciliation périodique en tâche de fond"""
+        if self._totals is not None:
+            return
+        with self._load_lock:
+            if self._totals is None:
+                # Journal suivi à partir d'ici : les écritures plus anciennes sont lues par le chargement
+                self._follow_journal()
+                if self.use_table and not self._elected():
+                    self._load_follower()
+                else:
+                    self.reconcile()
+                if self.reconcile_interval and self._thread is None:
+                    self._thread = threading.Thread(target=self._reconcile_loop, name='stock-totals', daemon=True)
+                    self._thread.start()
+
+    def _load_follower(self):
+        """Premier chargement d'un worker non élu : la table annexe est recalculée par le worker élu"""
+        try:
+            self.reload()
+        except Exception as e:
+            # Table pas encore créée par le worker élu : lecture des lignes sources, sans la recalculer
+            log.info("Table %s illisible (%s) : stocks totaux lus dans les lignes sources", TOTALS_TABLE, e)
+            self._replace_all(*self._read(update_table=False))
+
+    def reconcile(self):
+        """Recalcule tous les totaux depuis les lignes sources ; renvoie le nombre d'écarts corrigés"""
+        return self._replace_all(*self._read())
+
+    def reload(self):
+        """Relit tous les totaux depuis la table annexe (worker qui ne réconcilie pas)"""
+        return self._replace_all(*self._read_table())
+
+    def _replace_all(self, sequence, totals):
+        with self._lock:
+            first = self._totals is None
+            if first:
+                self._totals = {}
+            drift = self._publish(totals, sequence)
+            # Produits supprimés depuis la dernière réconciliation
+            for product_id in [key for key, value in self._totals.items() if key not in totals and value[2] < sequence]:
+                del self._totals[product_id]
+            self._reconciliations += 1
+            self._reconciled_at = time.time()
+            if not first:
+                self._drift += drift
+        return drift
+
+    def _reconcile_loop(self):
+        while True:
+            time.sleep(self.reconcile_interval)
+            try:
+                if self.use_table and not self._elected():
+                    # Table recalculée par le worker élu : la relire suffit
+                    self.reload()
+                    continue
+                drift = self.reconcile()
+                if drift:
+                    log.warning("Stocks totaux : %s écart(s) corrigé(s) par la réconciliation", drift)
+                if self.shared_dir and self._elected():
+                    self._rotate_journal()
+            except Exception as e:
+                log.error("Réconciliation des stocks totaux impossible: %s", e)
+
+    def _elected(self):
+        """Vrai si ce worker tient le verrou de réconciliation, gardé jusqu'à sa fin (repris alors par un autre)"""
+        if not self.shared_dir:
+            return True
+        if self._leader is None:
+            handle = open(os.path.join(self.shared_dir, LEADER_LOCK_FILE), 'a')
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                return False
+            self._leader = handle
+        return True
+
+    def _journal_path(self):
+        return os.path.join(self.shared_dir, JOURNAL_FILE)
+
+    def _append_journal(self, product_ids):
+        """Ajoute au journal partagé les produits écrits par ce worker (une écriture en ajout : lignes jamais mêlées)"""
+        line = ' '.join(str(value) for value in [os.getpid(), *product_ids]) + '\n'
+        fd = os.open(self._journal_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode('ascii'))
+        finally:
+            os.close(fd)
+
+    def _follow_journal(self):
+        """Marque à relire les produits écrits par les autres workers depuis le dernier passage"""
+        if not self.shared_dir:
+            return
+        path = self._journal_path()
+        changed = set()
+        with self._journal_lock:
+            while True:
+                if self._journal_fd is None:
+                    try:
+                        self._journal_fd = os.open(path, os.O_RDONLY)
+                    except FileNotFoundError:
+                        break
+                    # Premier passage : l'historique est couvert par le chargement ; après rotation : tout est à lire
+                    self._journal_offset = os.fstat(self._journal_fd).st_size if self._totals is None else 0
+                size = os.fstat(self._journal_fd).st_size
+                if size > self._journal_offset:
+                    data = os.pread(self._journal_fd, size - self._journal_offset, self._journal_offset)
+                    end = data.rfind(b'\n') + 1
+                    for line in data[:end].splitlines():
+                        pid, *product_ids = line.split()
+                        if int(pid) != os.getpid():
+                            changed.update(int(product_id) for product_id in product_ids)
+                    self._journal_offset += end
+                try:
+                    rotated = os.stat(path).st_ino != os.fstat(self._journal_fd).st_ino
+                except FileNotFoundError:
+                    rotated = False
+                if not rotated:
+                    break
+                # Fin de l'ancien journal lue : passage au nouveau
+                os.close(self._journal_fd)
+                self._journal_fd = None
+        if changed and self._totals is not None:
+            # Marque numérotée : une lecture commencée avant ne la remplace pas
+            sequence = next(self._sequence)
+            with self._lock:
+                for product_id in changed:
+                    self._totals[product_id] = (None, None, sequence)
+                self._remote_changes += len(changed)
+
+    def _rotate_journal(self):
+        """Remplace le journal devenu trop long (worker élu seulement) ; les lecteurs finissent l'ancien"""
+        path = self._journal_path()
+        try:
+            if os.stat(path).st_size > self.journal_max_bytes:
+                os.replace(path, path + '.old')
+        except FileNotFoundError:
+            pass
+
+    def refresh(self, product_ids):
+        """Recalcule les produits touchés par une écriture validée (à appeler après le commit)"""
+        product_ids = sorted(set(product_ids))
+        if not product_ids:
+            return
+        if self.shared_dir:
+            for start in range(0, len(product_ids), self.batch_size):
+                self._append_journal(product_ids[start:start + self.batch_size])
+        # Avant le premier chargement, seule la table annexe est à tenir à jour
+        if self._totals is None and not self.use_table:
+            return
+        for start in range(0, len(product_ids), self.batch_size):
+            sequence, totals = self._read(product_ids[start:start + self.batch_size])
+            with self._lock:
+                if self._totals is not None:
+                    self._publish(totals, sequence)
+                self._refreshes += 1
+
+    def get_many(self, product_ids, fresh=False):
+        """{product_id: (total, dernière modification)} ; les produits inconnus de la base sont absents
+
+        fresh : relus dans les lignes sources plutôt qu'en mémoire (décision
+        qui ne doit pas dépendre d'un autre processus, ex. disponibilité d'un panier).
+        """
+        self.load()
+        if fresh:
+            product_ids = sorted(set(product_ids))
+            if not product_ids:
+                return {}
+            sequence, totals = self._read(product_ids, update_table=False)
+            with self._lock:
+                self._publish(totals, sequence)
+                self._fresh_reads += len(product_ids)
+            return totals
+        self._follow_journal()
+        found = {}
+        missing = []
+        with self._lock:
+            for product_id in product_ids:
+                value = self._totals.get(product_id)
+                if value is None or value[0] is None:
+                    missing.append(product_id)
+                else:
+                    found[product_id] = value[:2]
+            self._hits += len(found)
+            self._misses += len(missing)
+        if missing:
+            # Produit créé depuis le dernier chargement, écrit par un autre worker (ou inexistant) ;
+            # la table annexe est tenue par les écritures et la réconciliation, pas par les lectures
+            sequence, totals = self._read(sorted(missing), update_table=False)
+            with self._lock:
+                self._publish(totals, sequence)
+            found.update(totals)
+        return found
+
+    def get(self, product_id):
+        """(total, dernière modification) d'un produit, None s'il n'existe pas"""
+        return self.get_many([product_id]).get(product_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self._totals is not None,
+                'products': len(self._totals or {}),
+                'use_table': self.use_table,
+                'shared': bool(self.shared_dir),
+                'elected': self._leader is not None,
+                'remote_changes': self._remote_changes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'fresh_reads': self._fresh_reads,
+                'refreshes': self._refreshes,
+                'reconciliations': self._reconciliations,
+                'reconcile_interval': self.reconcile_interval,
+                'reconciled_age': round(time.time() - self._reconciled_at, 1) if self._reconciled_at else None,
+                'drift_corrected': self._drift,
+            }
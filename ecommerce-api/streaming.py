@@ -0,0 +1,83 @@
+"""Export en flux (NDJSON / CSV) des grandes listes de l'API"""
+import csv
+import io
+import zlib
+
+from flask import Response, current_app, stream_with_context
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def stream_rows(conn, query, params=(), chunk_size=500):
+    """Lit le résultat par blocs depuis un curseur non bufferisé (côté serveur).
+
+    Rend la connexion au pool à la fin du flux, y compris si le client se déconnecte.
+    """
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        conn.close()
+
+
+def _ndjson_chunks(chunks):
+    dumps = current_app.json.dumps
+    for records in chunks:
+        yield ''.join(dumps(record, separators=(',', ':')) + '\n' for record in records)
+
+
+def _csv_chunks(chunks, columns, labels=None):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    if labels:
+        writer.writer.writerow(labels)
+    else:
+        writer.writeheader()
+    yield buffer.getvalue()
+    for records in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(records)
+        yield buffer.getvalue()
+
+
+def _gzip_chunks(body):
+    """Compresse le flux au fil de l'eau (un bloc compressé par bloc de lignes)"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for text in body:
+        data = compressor.compress(text.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_response(chunks, fmt, columns, filename, labels=None, compress=False):
+    """Réponse HTTP en transfert par blocs : chaque bloc de lignes est envoyé dès qu'il est sérialisé
+
+    - labels : libellés de l'en-tête CSV (par défaut, les noms de colonnes)
+    - compress : corps compressé en gzip (Content-Encoding: gzip)
+    """
+    if fmt == 'csv':
+        body = _csv_chunks(chunks, columns, labels)
+    else:
+        body = _ndjson_chunks(chunks)
+    if compress:
+        body = _gzip_chunks(body)
+    response = Response(stream_with_context(body), mimetype=STREAM_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment;filename={filename}.{fmt}'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,57 @@
+"""Chiffrage des paniers : prix DOUBLE de MariaDB (float) additionnés en décimal"""
+from decimal import Decimal
+
+import pytest
+
+from cart_quote import price_cart, to_decimal
+
+
+def test_float_prices_are_summed_exactly():
+    products = {
+        1: {'id': 1, 'label': 'Pommes', 'price': 2.1, 'stock': 10.0},
+        2: {'id': 2, 'label': 'Poires', 'price': 0.7, 'stock': 1.0},
+    }
+    quote = price_cart(products, {2: 3, 1: 1})
+    assert quote['total'] == Decimal('4.20')
+    assert [line['id'] for line in quote['lines']] == [2, 1]
+    assert quote['lines'][0]['subtotal'] == Decimal('2.1')
+    assert quote['available'] is False
+    assert [line['available'] for line in quote['lines']] == [False, True]
+
+
+def test_unknown_products_and_missing_price():
+    quote = price_cart({1: {'id': 1, 'price': None, 'stock': 5}}, {1: 2, 9: 1})
+    assert quote['not_found'] == [9]
+    assert quote['total'] == Decimal('0.00')
+    assert quote['available'] is True
+
+
+def test_to_decimal_keeps_decimal_and_parses_text():
+    assert to_decimal(Decimal('1.005')) == Decimal('1.005')
+    assert to_decimal('3.30') == Decimal('3.30')
+    assert to_decimal(0.1) == Decimal('0.1')
+
+
+@pytest.fixture
+def api(monkeypatch):
+    import app as api_app
+    rows = [{'id': 3, 'ref': 'P3', 'label': 'Confiture', 'price': 4.35},
+            {'id': 5, 'ref': 'P5', 'label': 'Miel', 'price': 12.0}]
+    monkeypatch.setattr(api_app, 'run_query', lambda query, params=(), one=False: [dict(row) for row in rows])
+    monkeypatch.setattr(api_app.stock_totals, 'get_many', lambda ids, fresh=False: {3: (10.0, None), 5: (1.0, None)})
+    return api_app.app.test_client()
+
+
+def test_quote_endpoint_with_float_prices(api):
+    response = api.post('/api/cart/quote', json={'3': 2, '5': 1, '7': 1})
+    assert response.status_code == 200
+    quote = response.get_json()
+    assert Decimal(quote['total']) == Decimal('20.70')
+    assert quote['not_found'] == [7]
+    assert quote['available'] is True
+    assert [(line['id'], Decimal(line['subtotal'])) for line in quote['lines']] == [(3, Decimal('8.70')), (5, Decimal('12.0'))]
+
+
+def test_quote_endpoint_rejects_invalid_quantities(api):
+    assert api.post('/api/cart/quote', json={'3': 0}).status_code == 400
+    assert api.post('/api/cart/quote', json=[1]).status_code == 400
@@ -0,0 +1,54 @@
+"""Instantané partagé du catalogue : format, et remplacement vu par tous les processus"""
+import json
+
+from catalog import CatalogCache
+from catalog_snapshot import CatalogSnapshot, write_snapshot
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'catalog.bin')
+    products = [{'id': 7, 'ref': 'P7', 'label': 'Pommes Été', 'price': 2.5},
+                {'id': 3, 'ref': 'P3', 'name': 'Miel', 'price': None},
+                {'ref': 'SANS-ID', 'label': 'Pommes'}]
+    write_snapshot(path, products, 'abc', 10.0, 5.0, json.dumps)
+    snapshot = CatalogSnapshot(path)
+    assert (len(snapshot), snapshot.etag, snapshot.created, snapshot.modified) == (3, 'abc', 10.0, 5.0)
+    assert snapshot.position_of(3) == 1 and snapshot.position_of(4) is None
+    assert snapshot.value(1, 'label') == 'Miel'
+    assert snapshot.value(2, 'key') == 'SANS-ID' and snapshot.value(1, 'price') == ''
+    assert snapshot.product(0) == products[0]
+
+
+class Source:
+    """Catalogue de la base, modifiable ; compte les chargements"""
+
+    def __init__(self, products):
+        self.products = products
+        self.loads = 0
+
+    def __call__(self):
+        self.loads += 1
+        return [dict(product) for product in self.products]
+
+
+def test_snapshot_is_shared_and_swapped_after_invalidation(tmp_path):
+    path = str(tmp_path / 'catalog.bin')
+    source = Source([{'id': 1, 'ref': 'P1', 'label': 'Pommes Automne', 'price': '2.00'}])
+    # Deux workers sur le même instantané
+    first = CatalogCache(source, snapshot_path=path, check_interval=0)
+    second = CatalogCache(source, snapshot_path=path, check_interval=0)
+
+    assert [product['label'] for product in first.products()] == ['Pommes Automne']
+    assert [product['label'] for product in second.products()] == ['Pommes Automne']
+    assert source.loads == 1
+    assert second.product(1) == {'id': 1, 'ref': 'P1', 'label': 'Pommes Automne', 'price': '2.00'}
+    etag = second.validators()[0]
+
+    # Écriture en base puis invalidation par un worker : l'autre sert le nouvel instantané
+    source.products.append({'id': 2, 'ref': 'P2', 'label': 'Poires Automne', 'price': '3.00'})
+    second.invalidate()
+    assert [product['id'] for product in first.query(season='Automne')] == [1, 2]
+    assert [product['id'] for product in second.products()] == [1, 2]
+    assert source.loads == 2
+    assert second.validators()[0] != etag
+    assert first.product(2)['label'] == 'Poires Automne'
@@ -0,0 +1,89 @@
+"""Disjoncteurs et sélection de la source saine"""
+import pytest
+
+from circuit_breaker import CircuitBreaker, UpstreamError, UpstreamSelector
+
+
+def selector(threshold=2):
+    return UpstreamSelector([CircuitBreaker('dolibarr', failure_threshold=threshold),
+                             CircuitBreaker('dolibarr_anonymous', failure_threshold=threshold),
+                             CircuitBreaker('mariadb', failure_threshold=threshold)])
+
+
+def fail(status_code=None):
+    def source():
+        raise UpstreamError(f'Dolibarr a répondu {status_code}', status_code)
+    return source
+
+
+def never_called():
+    raise AssertionError('source interrogée après une réponse définitive')
+
+
+def test_not_found_from_a_healthy_source_is_final():
+    upstreams = selector()
+    assert upstreams.call({'dolibarr': lambda: None, 'dolibarr_anonymous': never_called, 'mariadb': never_called}) is None
+    assert upstreams.breakers['dolibarr'].consecutive_failures == 0
+
+
+def test_refused_requests_are_skipped_without_failures():
+    upstreams = selector(threshold=1)
+    for _ in range(3):
+        assert upstreams.call({'dolibarr': fail(404), 'dolibarr_anonymous': fail(401), 'mariadb': lambda: {'id': 1}}) == {'id': 1}
+    assert all(breaker.available for breaker in upstreams.breakers.values())
+    assert upstreams.breakers['dolibarr_anonymous'].failures == 0
+    assert upstreams.fallbacks['mariadb'] == 3
+
+
+def test_last_error_is_raised_when_no_source_answers():
+    upstreams = selector()
+    with pytest.raises(UpstreamError, match='503'):
+        upstreams.call({'dolibarr': fail(500), 'mariadb': fail(503)})
+
+
+def test_breaker_opens_after_threshold_and_closes_on_probe():
+    probe_ok = []
+
+    def probe():
+        if not probe_ok:
+            raise UpstreamError('toujours en panne', 503)
+
+    breaker = CircuitBreaker('dolibarr', probe, failure_threshold=2)
+    assert breaker.record_failure('délai dépassé') is False
+    assert breaker.available
+    assert breaker.record_failure('délai dépassé') is True
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opened_at is not None
+
+    # Sonde en échec : reste ouvert
+    breaker.run_probe()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.last_error == 'toujours en panne'
+
+    # Sonde réussie : refermé, compteur d'échecs consécutifs remis à zéro
+    probe_ok.append(True)
+    breaker.run_probe()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 0 and breaker.opened_at is None
+
+
+def test_probe_refused_by_a_responding_source_closes_the_breaker():
+    breaker = CircuitBreaker('dolibarr_anonymous', fail(401), failure_threshold=1)
+    breaker.record_failure('connexion refusée')
+    breaker.run_probe()
+    assert breaker.available
+
+
+def test_open_sources_are_skipped_then_tried_when_all_are_open(monkeypatch):
+    upstreams = selector(threshold=1)
+    monkeypatch.setattr(upstreams, '_ensure_prober', lambda: None)
+    upstreams.call({'dolibarr': fail(502), 'mariadb': lambda: 'db'})
+    assert upstreams.active() == 'dolibarr_anonymous'
+    assert upstreams.call({'dolibarr': never_called, 'mariadb': lambda: 'db'}) == 'db'
+
+    for name in ('mariadb', 'dolibarr_anonymous'):
+        with pytest.raises(UpstreamError):
+            upstreams.call({name: fail(500)})
+    assert upstreams.active() is None
+    # Toutes ouvertes : essayées en dernier recours, la première qui répond referme son disjoncteur
+    assert upstreams.call({'dolibarr': lambda: 'api', 'mariadb': never_called}) == 'api'
+    assert upstreams.active() == 'dolibarr'
@@ -0,0 +1,31 @@
+"""Lectures du catalogue en base : la connexion revient au pool même en cas d'erreur"""
+import mysql.connector
+import pytest
+
+import app as api_app
+from catalog import CatalogUnavailable
+
+
+class BrokenConnection:
+    def __init__(self, error):
+        self.error = error
+        self.closed = 0
+
+    def cursor(self, dictionary=False):
+        return self
+
+    def execute(self, sql, params=()):
+        raise self.error
+
+    def close(self):
+        self.closed += 1
+
+
+@pytest.mark.parametrize('fetch', [api_app.fetch_products_from_db, lambda: api_app.fetch_product_from_db(1)])
+@pytest.mark.parametrize('error', [mysql.connector.Error('perdue'), RuntimeError('inattendue')])
+def test_connection_is_released_on_error(monkeypatch, fetch, error):
+    conn = BrokenConnection(error)
+    monkeypatch.setattr(api_app, 'get_db_connection', lambda: conn)
+    with pytest.raises((CatalogUnavailable, RuntimeError)):
+        fetch()
+    assert conn.closed == 1
@@ -0,0 +1,66 @@
+"""Curseurs de pagination : aller-retour et parcours complet par keyset (ORDER BY date DESC, id DESC)"""
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+
+from pagination import (MAX_LIMIT, InvalidPageRequest, decode_cursor, encode_cursor, keyset_after_desc,
+                        page_args)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([datetime(2026, 3, 1, 9, 30), Decimal('12.50'), 42])
+    assert '=' not in cursor
+    assert decode_cursor(cursor, 3) == ['2026-03-01T09:30:00', '12.50', 42]
+
+
+@pytest.mark.parametrize('cursor', ['pas-un-curseur', encode_cursor([1, 2]), 'eyJhIjoxfQ'])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidPageRequest):
+        decode_cursor(cursor, 3)
+
+
+def test_page_args():
+    app = Flask(__name__)
+    with app.test_request_context('/'):
+        assert page_args(2) == (None, None, True)
+    with app.test_request_context('/?limit=100000&count=0'):
+        assert page_args(2) == (MAX_LIMIT, None, False)
+    with app.test_request_context(f"/?cursor={encode_cursor(['2026-01-01', 3])}"):
+        assert page_args(2)[1] == ['2026-01-01', 3]
+    with app.test_request_context('/?limit=0'):
+        with pytest.raises(InvalidPageRequest):
+            page_args(2)
+
+
+@pytest.fixture
+def orders():
+    # SQLite place aussi les NULL en dernier en ordre décroissant, comme MariaDB
+    db = sqlite3.connect(':memory:')
+    db.execute('CREATE TABLE orders (rowid_ INTEGER, date_commande TEXT)')
+    dates = ['2026-01-02', '2026-01-01', None, '2026-01-02', None, '2026-01-03', '2026-01-01']
+    db.executemany('INSERT INTO orders VALUES (?, ?)', list(enumerate(dates, start=1)))
+    yield db
+    db.close()
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 10])
+def test_keyset_pages_cover_every_row_once(orders, limit):
+    query = 'SELECT date_commande, rowid_ FROM orders'
+    order_by = ' ORDER BY date_commande DESC, rowid_ DESC LIMIT ?'
+    expected = orders.execute(query + order_by, [100]).fetchall()
+
+    served, cursor = [], None
+    while True:
+        sql, params = query, []
+        if cursor:
+            condition, params = keyset_after_desc('date_commande', 'rowid_', *decode_cursor(cursor, 2))
+            sql += ' WHERE ' + condition.replace('%s', '?')
+        rows = orders.execute(sql + order_by, params + [limit + 1]).fetchall()
+        served.extend(rows[:limit])
+        if len(rows) <= limit:
+            break
+        cursor = encode_cursor(rows[limit - 1])
+    assert served == expected
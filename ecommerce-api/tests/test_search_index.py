@@ -0,0 +1,44 @@
+"""Index de recherche : pondération des champs, préfixes, accents et synchronisation incrémentale"""
+from search_index import SearchIndex, fold
+
+PRODUCTS = [
+    {'id': 1, 'label': 'Pommes Golden', 'ref': 'POM-01', 'description': 'Fruits du verger'},
+    {'id': 2, 'label': 'Compote de pommes', 'ref': 'CMP-02', 'description': 'Produits Transformés'},
+    {'id': 3, 'label': 'Poireaux', 'ref': 'LEG-03', 'description': 'Légumes d\'hiver, bottes de pommes de terre'},
+]
+
+
+def index_of(products):
+    index = SearchIndex()
+    index.sync(products)
+    return index
+
+
+def test_fold_removes_case_and_accents():
+    assert fold('Été Légumes') == 'ete legumes'
+
+
+def test_label_outweighs_description_and_prefix_counts_half():
+    index = index_of(PRODUCTS)
+    assert [key for key, _ in index.search('pommes')] == [1, 2, 3]
+    # « pom » : mot exact de la référence de 1 (2.0), préfixe du libellé de 2 (3.0 / 2)
+    assert dict(index.search('pom')) == {1: 2.0, 2: 1.5, 3: 0.5}
+    assert [key for key, _ in index.search('LEGUMES')] == [3]
+
+
+def test_every_term_must_match():
+    index = index_of(PRODUCTS)
+    assert [key for key, _ in index.search('compote pommes')] == [2]
+    assert index.search('pommes cerises') == []
+    assert index.search('  ') == []
+
+
+def test_sync_only_retokenizes_changed_products():
+    index = index_of(PRODUCTS)
+    renamed = [dict(PRODUCTS[0], label='Poires Williams'), PRODUCTS[1]]
+    assert index.sync(renamed) == 2
+    assert index.sync(renamed) == 0
+    assert len(index) == 2
+    assert [key for key, _ in index.search('poi')] == [1]
+    assert index.search('golden') == []
+    assert index.stats()['documents'] == 2
@@ -0,0 +1,89 @@
+"""Mise à jour groupée du stock : produits et entrepôts inconnus rejetés ligne par ligne"""
+import pytest
+
+import app as api_app
+
+
+class FakeCursor:
+    """llx_product, llx_entrepot et llx_product_stock en mémoire"""
+
+    def __init__(self, products, warehouses):
+        self.tables = {'llx_product': set(products), 'llx_entrepot': set(warehouses)}
+        self.stock = {}
+        self._result = []
+
+    def execute(self, sql, params=()):
+        if sql.startswith('SELECT rowid FROM'):
+            table = sql.split()[3]
+            self._result = [(rowid,) for rowid in params if rowid in self.tables[table]]
+        elif sql.startswith('INSERT INTO llx_product_stock'):
+            values = list(params)
+            for start in range(0, len(values), 3):
+                product_id, warehouse_id, reel = values[start:start + 3]
+                # Clés étrangères, comme InnoDB
+                assert product_id in self.tables['llx_product']
+                assert warehouse_id in self.tables['llx_entrepot']
+                self.stock[(product_id, warehouse_id)] = reel
+        else:
+            raise AssertionError(sql)
+
+    def fetchall(self):
+        return self._result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.committed = False
+
+    def cursor(self):
+        return self._cursor
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_upsert_skips_unknown_products_and_warehouses():
+    cursor = FakeCursor(products={1, 2}, warehouses={1})
+    missing = api_app.upsert_stock_rows(cursor, [(1, 1, 5.0), (2, 9, 3.0), (7, 1, 1.0)])
+    assert missing == ({7}, {9})
+    assert cursor.stock == {(1, 1): 5.0}
+
+
+@pytest.fixture
+def bulk(monkeypatch):
+    cursor = FakeCursor(products={1, 2}, warehouses={1, 2})
+    monkeypatch.setattr(api_app, 'get_db_connection', lambda: FakeConnection(cursor))
+    refreshed = []
+    monkeypatch.setattr(api_app, 'refresh_stock_totals', lambda ids: refreshed.extend(ids))
+    return api_app.app.test_client(), cursor, refreshed
+
+
+def test_unknown_warehouse_is_reported_and_the_rest_applied(bulk):
+    client, cursor, refreshed = bulk
+    response = client.put('/api/stock', json=[
+        {'product_id': 1, 'stock': 4, 'warehouse_id': 2},
+        {'product_id': 2, 'stock': 6, 'warehouse_id': 99},
+        {'product_id': 3, 'stock': 1, 'warehouse_id': 1},
+        {'product_id': 'x', 'stock': 1},
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['updated'] == 1
+    assert [result['status'] for result in body['results']] == ['updated', 'not_found', 'not_found', 'invalid']
+    assert body['results'][1]['error'] == 'Entrepôt non trouvé'
+    assert body['results'][2]['error'] == 'Produit non trouvé'
+    assert cursor.stock == {(1, 2): 4.0}
+    assert refreshed == [1]
@@ -0,0 +1,99 @@
+"""Imports de stock CSV : erreurs par ligne et reprise exclusive entre workers"""
+import io
+import threading
+import time
+
+import pytest
+
+from stock_import import ImportConflict, StockImportJobs
+
+
+def wait_for(jobs, job_id, statuses=('done', 'failed')):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        job = jobs.status(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(job)
+
+
+class FakeStock:
+    """apply_batch sur llx_product {1, 2} et llx_entrepot {1}"""
+
+    def __init__(self, fail_once=False):
+        self.written = {}
+        self.fail_once = fail_once
+
+    def __call__(self, rows):
+        if self.fail_once:
+            self.fail_once = False
+            raise RuntimeError('connexion perdue')
+        missing = ({row[0] for row in rows} - {1, 2}, {row[1] for row in rows} - {1})
+        for product_id, warehouse, stock in rows:
+            if product_id not in missing[0] and warehouse not in missing[1]:
+                self.written[(product_id, warehouse)] = stock
+        return missing
+
+
+CSV = b'id,stock,warehouse_id\n1,5,1\n2,3,7\n9,1,1\nx,2,1\n'
+
+
+def test_unknown_warehouse_is_a_row_error(tmp_path):
+    stock = FakeStock()
+    jobs = StockImportJobs(str(tmp_path), stock, batch_size=2)
+    job = wait_for(jobs, jobs.create(io.BytesIO(CSV))['id'])
+    assert job['status'] == 'done'
+    assert (job['applied'], job['not_found'], job['invalid']) == (1, 2, 1)
+    assert [(error['line'], error['error']) for error in job['errors']] == [
+        (3, 'Entrepôt non trouvé (7)'), (4, 'Produit non trouvé'), (5, 'Ligne invalide')]
+    assert stock.written == {(1, 1): 5.0}
+
+
+def test_resume_is_claimed_by_a_single_worker(tmp_path):
+    stock = FakeStock(fail_once=True)
+    jobs = StockImportJobs(str(tmp_path), stock, batch_size=2)
+    job_id = wait_for(jobs, jobs.create(io.BytesIO(CSV))['id'])['id']
+    assert jobs.status(job_id)['status'] == 'failed'
+
+    # Deux workers (deux instances sur le même répertoire) reprennent en même temps
+    other = StockImportJobs(str(tmp_path), stock, batch_size=2)
+    claim = other._claim(job_id)
+    with pytest.raises(ImportConflict):
+        jobs.resume(job_id)
+    claim.close()
+
+    outcomes = []
+    barrier = threading.Barrier(2)
+
+    def resume(instance):
+        barrier.wait()
+        try:
+            outcomes.append(instance.resume(job_id)['status'])
+        except ImportConflict as e:
+            outcomes.append(f'conflict: {e}')
+
+    threads = [threading.Thread(target=resume, args=(instance,)) for instance in (jobs, other)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    job = wait_for(jobs, job_id)
+    # L'un reprend l'import, l'autre est refusé (en cours, ou déjà terminé)
+    assert len(outcomes) == 2
+    assert sum(not outcome.startswith('conflict') for outcome in outcomes) == 1
+    assert job['status'] == 'done'
+    assert job['attempts'] == 2
+    assert job['applied'] == 1
+
+
+def test_stale_running_job_without_claim_is_interrupted(tmp_path):
+    jobs = StockImportJobs(str(tmp_path), FakeStock(), stale_after=0)
+    job = wait_for(jobs, jobs.create(io.BytesIO(CSV))['id'])
+    # État laissé « en cours » par un worker arrêté
+    job['status'] = 'running'
+    jobs._save(job)
+    assert jobs.status(job['id'])['status'] == 'interrupted'
+    claim = jobs._claim(job['id'])
+    assert jobs.status(job['id'])['status'] == 'running'
+    claim.close()
@@ -0,0 +1,103 @@
+"""Mutations de stock sur un curseur simulé, avec la sémantique de rowcount de MariaDB"""
+from datetime import datetime
+
+from stock_mutations import APPLIED, CONFLICT, INSUFFICIENT, NOT_FOUND, apply_mutation, parse_version, stock_version
+
+NOW = datetime(2026, 10, 18, 12, 0, 0)
+
+
+class FakeCursor:
+    """llx_product / llx_product_stock en mémoire ; tms = NOW() vaut toujours NOW (même seconde).
+
+    found_rows=False : rowcount compte les lignes modifiées, comme une connexion sans CLIENT_FOUND_ROWS.
+    """
+
+    def __init__(self, products, stock, found_rows=False):
+        self.products = set(products)
+        self.stock = {key: list(value) for key, value in stock.items()}
+        self.found_rows = found_rows
+        self.rowcount = -1
+        self._result = None
+
+    def _written(self, key, reel):
+        changed = self.stock.get(key) != [reel, NOW]
+        self.stock[key] = [reel, NOW]
+        return 1 if changed or self.found_rows else 0
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        if sql.startswith('INSERT INTO llx_product_stock'):
+            warehouse_id, delta, product_id = params
+            key = (product_id, warehouse_id)
+            if product_id not in self.products:
+                self.rowcount = 0
+            elif key not in self.stock:
+                self.stock[key] = [delta, NOW]
+                self.rowcount = 1
+            else:
+                reel = delta if 'reel = VALUES(reel)' in sql else self.stock[key][0] + delta
+                self.rowcount = self._written(key, reel)
+        elif sql.startswith('UPDATE llx_product_stock'):
+            params = list(params)
+            quantity, product_id, warehouse_id = params[:3]
+            rest = params[3:]
+            key = (product_id, warehouse_id)
+            row = self.stock.get(key)
+            matched = row is not None
+            if matched and 'tms = %s AND reel = %s' in sql:
+                tms, reel = rest[:2]
+                rest = rest[2:]
+                matched = (row[1], row[0]) == (tms, reel)
+            if matched and 'reel >= %s' in sql:
+                matched = row[0] >= rest[0]
+            if not matched:
+                self.rowcount = 0
+            elif 'SET reel = reel + %s' in sql:
+                self.rowcount = self._written(key, row[0] + quantity)
+            elif 'SET reel = reel - %s' in sql:
+                self.rowcount = self._written(key, row[0] - quantity)
+            else:
+                self.rowcount = self._written(key, quantity)
+        elif sql.startswith('SELECT reel, tms FROM llx_product_stock'):
+            row = self.stock.get(tuple(params))
+            self._result = tuple(row) if row else None
+        elif sql.startswith('SELECT rowid FROM llx_product'):
+            self._result = (params[0],) if params[0] in self.products else None
+        else:
+            raise AssertionError(f'Instruction inattendue : {sql}')
+
+    def fetchone(self):
+        return self._result
+
+
+def test_set_same_value_same_second_is_applied():
+    cursor = FakeCursor({1}, {(1, 1): [5.0, NOW]})
+    assert apply_mutation(cursor, 1, 1, 'set', 5.0) == (APPLIED, 5.0, stock_version(NOW, 5.0))
+
+
+def test_set_same_value_with_matching_version_is_applied():
+    cursor = FakeCursor({1}, {(1, 1): [5.0, NOW]})
+    expected = parse_version(stock_version(NOW, 5.0))
+    assert apply_mutation(cursor, 1, 1, 'set', 5.0, expected=expected)[0] == APPLIED
+
+
+def test_set_unknown_product_is_not_found():
+    cursor = FakeCursor({1}, {})
+    assert apply_mutation(cursor, 2, 1, 'set', 5.0)[0] == NOT_FOUND
+
+
+def test_set_with_stale_version_is_a_conflict():
+    cursor = FakeCursor({1}, {(1, 1): [7.0, NOW]})
+    expected = parse_version(stock_version(NOW, 5.0))
+    assert apply_mutation(cursor, 1, 1, 'set', 5.0, expected=expected) == (CONFLICT, 7.0, stock_version(NOW, 7.0))
+
+
+def test_decrement_below_zero_is_insufficient():
+    cursor = FakeCursor({1}, {(1, 1): [2.0, NOW]})
+    assert apply_mutation(cursor, 1, 1, 'decrement', 3.0)[0] == INSUFFICIENT
+    assert cursor.stock[(1, 1)][0] == 2.0
+
+
+def test_found_rows_connection_behaves_the_same():
+    cursor = FakeCursor({1}, {(1, 1): [5.0, NOW]}, found_rows=True)
+    assert apply_mutation(cursor, 1, 1, 'set', 5.0)[0] == APPLIED
@@ -0,0 +1,112 @@
+"""Stocks totaux : chargement par le worker élu ou par relecture de la table annexe"""
+from contextlib import contextmanager
+
+import app as api_app
+from stock_totals import TOTALS_TABLE, StockTotals
+
+
+class FakePool:
+    """Enregistre les requêtes ; la table annexe et les lignes sources ont des totaux différents"""
+
+    def __init__(self, table=((1, 5.0, None),), source=((1, 7.0, None), (2, 0, None))):
+        self.table = list(table)
+        self.source = list(source)
+        self.statements = []
+
+    @contextmanager
+    def acquire(self):
+        yield self
+
+    def cursor(self):
+        return self
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        self.statements.append(sql)
+        if sql.startswith(f'SELECT fk_product, reel, stock_tms FROM {TOTALS_TABLE}'):
+            self._result = self.table
+        elif sql.startswith('SELECT p.rowid'):
+            self._result = self.source
+        else:
+            self._result = []
+
+    def fetchall(self):
+        return self._result
+
+    def writes(self):
+        return [sql for sql in self.statements if sql.startswith(('CREATE', 'INSERT', 'DELETE'))]
+
+
+def test_only_the_elected_worker_rebuilds_the_table(tmp_path):
+    leader_pool, follower_pool = FakePool(), FakePool()
+    leader = StockTotals(leader_pool, use_table=True, reconcile_interval=0, shared_dir=str(tmp_path))
+    follower = StockTotals(follower_pool, use_table=True, reconcile_interval=0, shared_dir=str(tmp_path))
+
+    leader.load()
+    follower.load()
+    assert leader_pool.writes()
+    assert follower_pool.writes() == []
+    assert follower.get(1) == (5.0, None)
+    assert follower.stats()['elected'] is False
+
+
+def test_follower_reads_source_rows_until_the_table_exists(tmp_path):
+    # Le worker élu garde son verrou tant qu'il vit
+    leader = StockTotals(FakePool(), use_table=True, reconcile_interval=0, shared_dir=str(tmp_path))
+    leader.load()
+    pool = FakePool()
+
+    def missing_table(sql, params=(), execute=pool.execute):
+        if TOTALS_TABLE in sql:
+            raise RuntimeError(f"Table '{TOTALS_TABLE}' doesn't exist")
+        execute(sql, params)
+
+    pool.execute = missing_table
+    follower = StockTotals(pool, use_table=True, reconcile_interval=0, shared_dir=str(tmp_path))
+    follower.load()
+    assert follower.get(1) == (7.0, None)
+    assert pool.writes() == []
+    assert leader.stats()['elected'] is True
+
+
+class FakeConnection:
+    def __init__(self, queries):
+        self.queries = queries
+
+    def cursor(self, dictionary=False):
+        return self
+
+    def execute(self, sql, params=()):
+        self.queries.append(sql)
+        self._rows = [{'fk_entrepot': 1, 'reel': 2.0, 'tms': None}, {'fk_entrepot': 2, 'reel': 3.0, 'tms': None}]
+
+    def fetchone(self):
+        return {'rowid': 4, 'ref': 'P4', 'label': 'Farine', 'price': 1.5, 'tms': None}
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+def test_product_stock_total_is_read_from_memory(monkeypatch):
+    queries = []
+    monkeypatch.setattr(api_app, 'get_db_connection', lambda: FakeConnection(queries))
+    monkeypatch.setattr(api_app.stock_totals, 'get', lambda product_id: (9.0, None))
+    client = api_app.app.test_client()
+
+    body = client.get('/api/stock/4').get_json()
+    assert body['stock'] == 9.0 and 'warehouses' not in body
+    assert not any('llx_product_stock' in sql for sql in queries)
+
+    body = client.get('/api/stock/4?warehouses=1').get_json()
+    assert body['stock'] == 5.0
+    assert [warehouse['warehouse_id'] for warehouse in body['warehouses']] == [1, 2]
+    assert any('llx_product_stock' in sql for sql in queries)
@@ -0,0 +1,238 @@
+"""Traces distribuées : propagation W3C traceparent, spans exportés au format Zipkin v2
+
+Une copie identique de ce module se trouve dans l'API et le frontend (chacun
+est construit depuis son propre répertoire) : les modifier ensemble.
+
+- chaque requête entrante ouvre un span SERVER, rattaché au traceparent reçu
+  s'il y en a un (même trace, même décision d'échantillonnage)
+- trace_headers() donne le traceparent à joindre à un appel sortant ; le span
+  CLIENT de l'appel est enregistré ensuite par record(propagated=True), avec
+  la durée mesurée par les observers (pool MariaDB, client Dolibarr, session
+  vers l'API)
+- sample_rate : proportion des traces démarrées ici qui sont enregistrées
+- export : fichier (une ligne JSON par span) ou URL d'un collecteur Zipkin
+  (http://zipkin:9411/api/v2/spans, format accepté aussi par Jaeger et
+  l'OpenTelemetry Collector) ; vide : traces désactivées, aucun coût
+- les spans partent par une file bornée vidée par un thread dédié : une
+  requête n'attend jamais l'export ; si la file est pleine, le span est perdu
+  et compté
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+
+from flask import g, request
+
+from structured_log import current_request_id
+
+log = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = 'traceparent'
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+# (trace_id, span_id, échantillonné) du span en cours
+_current = contextvars.ContextVar('trace_span', default=None)
+# Identifiant annoncé dans le dernier traceparent envoyé, repris par le span CLIENT de l'appel
+_outgoing = contextvars.ContextVar('trace_outgoing', default=None)
+
+
+def _span_id():
+    return f'{random.getrandbits(64):016x}'
+
+
+def trace_headers():
+    """traceparent à joindre à un appel sortant (vide hors requête ou si les traces sont désactivées)"""
+    current = _current.get()
+    if current is None:
+        return {}
+    trace_id, parent_id, sampled = current
+    if not sampled:
+        # Décision transmise : les services appelés n'enregistrent pas non plus
+        return {TRACEPARENT_HEADER: f'00-{trace_id}-{parent_id}-00'}
+    span_id = _span_id()
+    _outgoing.set(span_id)
+    return {TRACEPARENT_HEADER: f'00-{trace_id}-{span_id}-01'}
+
+
+class _Exporter:
+    """File bornée de spans, écrits par lots dans un fichier ou envoyés à un collecteur"""
+
+    def __init__(self, target, queue_size=10000, batch_size=200):
+        self.target = target
+        self.batch_size = batch_size
+        self.queue = queue.Queue(queue_size)
+        self.exported = 0
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, span):
+        if self._thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        # Démarré au premier span : après le fork des workers gunicorn
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _batch(self, first=None):
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            self._write(self._batch(self.queue.get()))
+
+    def flush(self):
+        """Écrit les spans encore en file (arrêt du processus)"""
+        batch = self._batch()
+        while batch:
+            self._write(batch)
+            batch = self._batch()
+
+    def _write(self, batch):
+        try:
+            if self.target.startswith(('http://', 'https://')):
+                req = urllib.request.Request(
+                    self.target, data=json.dumps(batch).encode('utf-8'),
+                    headers={'Content-Type': 'application/json'}, method='POST'
+                )
+                urllib.request.urlopen(req, timeout=5).close()
+            else:
+                # Une seule écriture en ajout par lot : les workers peuvent partager le fichier
+                with open(self.target, 'a', encoding='utf-8') as output:
+                    output.write(''.join(json.dumps(span, ensure_ascii=False) + '\n' for span in batch))
+            self.exported += len(batch)
+        except (OSError, ValueError) as e:
+            self.dropped += len(batch)
+            log.warning("Export de %s span(s) impossible: %s", len(batch), e)
+
+
+class Tracer:
+    """Spans d'une application : SERVER par requête (init_app), CLIENT par appel sortant (record)"""
+
+    def __init__(self, service, export=None, sample_rate=1.0):
+        self.service = service
+        self.sample_rate = sample_rate
+        self._exporter = _Exporter(export) if export else None
+
+    @property
+    def enabled(self):
+        return self._exporter is not None
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._reset)
+
+    def _start_request(self):
+        match = TRACEPARENT_RE.match(request.headers.get(TRACEPARENT_HEADER, ''))
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            sampled = bool(int(flags, 16) & 1)
+        else:
+            trace_id, parent_id = f'{random.getrandbits(128):032x}', None
+            sampled = random.random() < self.sample_rate
+        span_id = _span_id()
+        g.trace_parent_id = parent_id
+        g.trace_started = time.time()
+        g.trace_token = _current.set((trace_id, span_id, sampled))
+
+    def _finish_request(self, response):
+        current = _current.get()
+        if current is not None and current[2] and 'trace_started' in g:
+            route = request.url_rule.rule if request.url_rule is not None else request.path
+            self._export(
+                f'{request.method} {route}', 'SERVER', current[0], current[1], g.trace_parent_id,
+                g.trace_started, time.time() - g.trace_started, None,
+                {
+                    'http.method': request.method,
+                    'http.path': request.path,
+                    'http.route': route,
+                    'http.status_code': response.status_code,
+                    'request_id': current_request_id(),
+                },
+                f'HTTP {response.status_code}' if response.status_code >= 500 else None
+            )
+        return response
+
+    def _reset(self, exc):
+        token = g.pop('trace_token', None)
+        if token is not None:
+            _current.reset(token)
+            _outgoing.set(None)
+
+    def recording(self):
+        """Vrai si la requête en cours est échantillonnée (les observers sautent sinon la préparation du span)"""
+        current = _current.get()
+        return current is not None and current[2]
+
+    def record(self, name, elapsed, remote=None, tags=None, error=None, propagated=False):
+        """Span CLIENT enfant du span en cours, qui vient de se terminer après elapsed secondes.
+
+        propagated : l'appel portait le traceparent de trace_headers(), dont le
+        span reprend l'identifiant pour que le service appelé s'y rattache.
+        """
+        current = _current.get()
+        if current is None or not current[2]:
+            return
+        span_id = None
+        if propagated:
+            span_id = _outgoing.get()
+            _outgoing.set(None)
+        now = time.time()
+        self._export(name, 'CLIENT', current[0], span_id or _span_id(), current[1],
+                     now - elapsed, elapsed, remote, tags, error)
+
+    def _export(self, name, kind, trace_id, span_id, parent_id, started, elapsed, remote, tags, error):
+        span = {
+            'traceId': trace_id,
+            'id': span_id,
+            'name': name,
+            'kind': kind,
+            # Microsecondes
+            'timestamp': int(started * 1e6),
+            'duration': max(1, int(elapsed * 1e6)),
+            'localEndpoint': {'serviceName': self.service},
+        }
+        if parent_id:
+            span['parentId'] = parent_id
+        if remote:
+            span['remoteEndpoint'] = {'serviceName': remote}
+        tags = {key: str(value) for key, value in (tags or {}).items() if value is not None}
+        if error is not None:
+            tags['error'] = str(error) or type(error).__name__
+        if tags:
+            span['tags'] = tags
+        self._exporter.put(span)
+
+    def stats(self):
+        exporter = self._exporter
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'exported': exporter.exported if exporter else 0,
+            'dropped': exporter.dropped if exporter else 0,
+            'queued': exporter.queue.qsize() if exporter else 0,
+        }
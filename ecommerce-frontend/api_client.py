@@ -0,0 +1,95 @@
+"""Appels vers l'API backend : session keep-alive, lectures conditionnelles (ETag / Last-Modified)"""
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+
+class ApiSession(requests.Session):
+    """Session keep-alive vers l'API ; context_headers() donne les en-têtes propres
+    à la requête en cours (identifiant de corrélation), ajoutés à chaque appel.
+
+    Chaque observer(method, url, secondes, statut ou None, erreur ou None) est
+    appelé après chaque appel (jusqu'à réception des en-têtes pour stream=True).
+    """
+
+    def __init__(self, context_headers=None):
+        super().__init__()
+        self.context_headers = context_headers
+        self.observers = []
+
+    def request(self, method, url, **kwargs):
+        if self.context_headers is not None:
+            kwargs['headers'] = dict(self.context_headers(), **(kwargs.get('headers') or {}))
+        if not self.observers:
+            return super().request(method, url, **kwargs)
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except requests.RequestException as e:
+            for observer in self.observers:
+                observer(method, url, time.perf_counter() - started, None, e)
+            raise
+        for observer in self.observers:
+            observer(method, url, time.perf_counter() - started, response.status_code, None)
+        return response
+
+
+class RevalidatingClient:
+    """Conserve la dernière réponse 200 de chaque GET et la redemande en conditionnel.
+
+    Si l'API répond 304 Not Modified, la réponse conservée est renvoyée : le
+    rafraîchissement ne coûte qu'un aller-retour d'en-têtes.
+    """
+
+    def __init__(self, max_entries=256, session=None):
+        self.max_entries = max_entries
+        self.session = session if session is not None else requests.Session()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._requests = 0
+        self._not_modified = 0
+
+    def get(self, url, params=None, **kwargs):
+        key = (url, tuple(sorted((params or {}).items())))
+        headers = dict(kwargs.pop('headers', None) or {})
+        with self._lock:
+            self._requests += 1
+            cached = self._entries.get(key)
+        if cached is not None:
+            if cached.headers.get('ETag'):
+                headers['If-None-Match'] = cached.headers['ETag']
+            if cached.headers.get('Last-Modified'):
+                headers['If-Modified-Since'] = cached.headers['Last-Modified']
+
+        response = self.session.get(url, params=params, headers=headers, **kwargs)
+
+        with self._lock:
+            if response.status_code == 304 and cached is not None:
+                self._not_modified += 1
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                else:
+                    # Évincée par un autre thread pendant l'appel : toujours valide, conservée de nouveau
+                    self._store(key, cached)
+                return cached
+            if response.status_code == 200 and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+                self._store(key, response)
+        return response
+
+    def _store(self, key, response):
+        # Appelée sous self._lock
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_entries': self.max_entries,
+                'entries': len(self._entries),
+                'requests': self._requests,
+                'not_modified': self._not_modified,
+            }
@@ -1,87 +1,222 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response
 import requests
 import os
+import re
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 
+from api_client import ApiSession, RevalidatingClient
+from metrics import Metrics
+from page_cache import FragmentCache, render_blocks
+from structured_log import correlation_headers, dropped_messages, setup_logging
+from tracing import Tracer, trace_headers
+from warmup import Warmup
+
 # Charger les variables d'environnement
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = 'votre_cle_secrete_ici'
+log = setup_logging(app, 'ecommerce-frontend')
 
 # Configuration de l'API backend
 API_URL = os.getenv('API_URL', 'http://ecommerce_api:5000')
 
+def outgoing_headers():
+    """Identifiant de corrélation et contexte de trace de la requête en cours"""
+    return dict(correlation_headers(), **trace_headers())
+
+# Session partagée vers l'API, qui transmet l'identifiant de corrélation et le contexte de trace
+api_session = ApiSession(outgoing_headers)
+
+# Lectures du catalogue revalidées auprès de l'API (If-None-Match / If-Modified-Since)
+api_client = RevalidatingClient(int(os.getenv('API_REVALIDATE_ENTRIES', '256')), session=api_session)
+
+# Métriques Prometheus (GET /metrics)
+metrics = Metrics('ecommerce_frontend')
+metrics.init_app(app)
+upstream_latency = metrics.histogram(
+    'upstream_request_duration_seconds', "Durée des appels à l'API backend",
+    ('target', 'operation', 'outcome')
+)
+
+# Identifiants (produit, import) remplacés dans les chemins pour borner le nombre de séries
+ID_SEGMENT_RE = re.compile(r'/(?:\d+|[0-9a-f]{32})(?=/|$)')
+
+def observe_api(method, url, elapsed, status, error):
+    path = ID_SEGMENT_RE.sub('/<id>', urlsplit(url).path)
+    outcome = f'{status // 100}xx' if status is not None else 'error'
+    upstream_latency.observe(('api', f'{method.upper()} {path}', outcome), elapsed)
+
+api_session.observers.append(observe_api)
+
+# Traces distribuées (TRACE_EXPORT : fichier ou collecteur Zipkin, vide : désactivées)
+tracer = Tracer(
+    'ecommerce-frontend',
+    export=os.getenv('TRACE_EXPORT') or None,
+    sample_rate=float(os.getenv('TRACE_SAMPLE', '0.1'))
+)
+tracer.init_app(app)
+
+def trace_api(method, url, elapsed, status, error):
+    if tracer.recording():
+        path = ID_SEGMENT_RE.sub('/<id>', urlsplit(url).path)
+        if error is None and status is not None and status >= 500:
+            error = f'HTTP {status}'
+        tracer.record(f'{method.upper()} {path}', elapsed, remote='ecommerce-api', propagated=True,
+                      tags={'http.method': method.upper(), 'http.url': url, 'http.status_code': status}, error=error)
+
+if tracer.enabled:
+    api_session.observers.append(trace_api)
+
+metrics.collect('trace_spans_exported_total', 'Spans exportés', lambda: {(): tracer.stats()['exported']}, kind='counter')
+metrics.collect('trace_spans_dropped_total', 'Spans perdus (file pleine, export en échec)',
+                lambda: {(): tracer.stats()['dropped']}, kind='counter')
+
+metrics.collect_stats('api_revalidation', "Lectures conditionnelles auprès de l'API", api_client.stats,
+                      gauges=('entries',), counters=('requests', 'not_modified'))
+metrics.collect('log_dropped_messages_total', 'Messages de log perdus (file pleine)',
+                lambda: {(): dropped_messages()}, kind='counter')
+
+# Taille des pages demandées à l'API pour les listes de l'administration
+ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', '50'))
+
+def fetch_page(path, cursor=None, limit=ADMIN_PAGE_SIZE, **params):
+    """Récupère une page d'un endpoint de liste de l'API (pagination par curseur)"""
+    params['limit'] = limit
+    if cursor:
+        params['cursor'] = cursor
+    return api_session.get(f'{API_URL}{path}', params=params)
+
+def page_meta(response):
+    """Curseur de la page suivante et total annoncés par l'API"""
+    total = response.headers.get('X-Total-Count')
+    return response.headers.get('X-Next-Cursor'), int(total) if total is not None else None
+
+# Taille des blocs relayés lors de l'export des stocks (octets)
+STOCK_EXPORT_CHUNK_SIZE = int(os.getenv('STOCK_EXPORT_CHUNK_SIZE', '65536'))
+
+def fetch_stocks(product_ids):
+    """Stock de plusieurs produits en un appel : {product_id: stock}"""
+    if not product_ids:
+        return {}
+    response = api_session.get(f'{API_URL}/api/stock', params={'ids': ','.join(str(pid) for pid in product_ids)})
+    response.raise_for_status()
+    return {str(row['rowid']): row.get('stock') or 0 for row in response.json()}
+
+def quote_cart(cart):
+    """Lignes chiffrées, total et disponibilité du panier en un appel à l'API"""
+    response = api_session.post(f'{API_URL}/api/cart/quote', json=cart)
+    response.raise_for_status()
+    quote = response.json()
+    for line in quote['lines']:
+        # Identifiant en chaîne, comme les clés du panier en session
+        line['id'] = str(line['id'])
+    return quote
+
+# Cache des fragments de pages (grille produits, pages statiques)
+page_cache = FragmentCache(
+    ttl=float(os.getenv('PAGE_CACHE_TTL', '60')),
+    max_entries=int(os.getenv('PAGE_CACHE_MAX_ENTRIES', '512'))
+)
+
+metrics.collect_stats('page_cache', 'Cache des fragments de pages', page_cache.stats,
+                      gauges=('entries',), counters=('hits', 'misses', 'purges'))
+
+# Jeton attendu par la purge du cache (en-tête X-Purge-Token), vide : pas de contrôle
+CACHE_PURGE_TOKEN = os.getenv('CACHE_PURGE_TOKEN', '')
+
+def render_cached(key, template_name, **context):
+    """Rend la page avec ses blocs en cache ; le gabarit commun (panier, messages) reste rendu à chaque requête"""
+    blocks = page_cache.get_or_render(key, lambda: render_blocks(app, template_name, **context))
+    return render_template('_cached_page.html', blocks=blocks)
+
+@app.route('/cache/pages', methods=['GET'])
+def get_page_cache_status():
+    """Statistiques du cache des pages et des revalidations auprès de l'API"""
+    return jsonify(dict(page_cache.stats(), api_revalidation=api_client.stats()))
+
+@app.route('/cache/pages', methods=['DELETE'])
+def purge_page_cache():
+    """Purge le cache des pages (?route=home pour une seule route), appelé par l'API quand le catalogue change"""
+    if CACHE_PURGE_TOKEN and request.headers.get('X-Purge-Token') != CACHE_PURGE_TOKEN:
+        return jsonify({'error': 'Jeton de purge invalide'}), 403
+    removed = page_cache.purge(request.args.get('route') or None)
+    return jsonify({'success': True, 'removed': removed})
+
+def render_home(search_query, season, category):
+    """Blocs de la page d'accueil pour des filtres donnés ; None si l'API refuse la requête"""
+    # Construire l'URL de l'API avec les paramètres de filtre
+    api_url = f'{API_URL}/api/products'
+    params = {'facets': '1'}
+    if search_query:
+        params['search'] = search_query
+    if season:
+        params['season'] = season
+    if category:
+        params['category'] = category
+    
+    response = api_client.get(api_url, params=params)
+    if response.status_code != 200:
+        log.warning("Statut de la réponse: %s", response.status_code)
+        return None
+    
+    data = response.json()
+    return render_blocks(app, 'home.html', products=data['products'], facets=data['facets'])
+
 # Route pour la page d'accueil
 @app.route('/')
 def home():
     """Page d'accueil avec la liste des produits"""
     try:
-        # Récupérer les paramètres de filtre
-        search_query = request.args.get('search', '')
+        # Récupérer les paramètres de filtre (normalisés pour la clé du cache)
+        search_query = ' '.join(request.args.get('search', '').split())
         season = request.args.get('season', '')
         category = request.args.get('category', '')
         
-        print(f"Paramètres de filtre - Recherche: {search_query}, Saison: {season}, Catégorie: {category}")
-        
-        # Construire l'URL de l'API avec les paramètres de filtre
-        api_url = f'{API_URL}/api/products'
-        params = {}
-        if search_query:
-            params['search'] = search_query
-        if season:
-            params['season'] = season
-        if category:
-            params['category'] = category
-        
-        print(f"URL de l'API: {api_url}")
-        print(f"Paramètres: {params}")
-        
-        response = requests.get(api_url, params=params)
-        print(f"Statut de la réponse: {response.status_code}")
-        print(f"Contenu de la réponse: {response.text[:200]}")
-        
-        if response.status_code == 200:
-            products = response.json()
-            print(f"Nombre de produits retournés: {len(products)}")
-            return render_template('home.html', products=products)
-        else:
+        blocks = page_cache.get_or_render(
+            ('home', search_query, season, category),
+            lambda: render_home(search_query, season, category)
+        )
+        if blocks is None:
+            # Erreur non mise en cache : la prochaine requête réessaie l'API
             return render_template('home.html', products=[], error='Impossible de charger les produits')
+        return render_template('_cached_page.html', blocks=blocks)
     except Exception as e:
-        print(f"Erreur lors de la récupération des produits: {e}")
+        log.exception("Erreur lors de la récupération des produits: %s", e)
         return render_template('home.html', products=[], error='Erreur de connexion au serveur')
 
 # Route pour la page "Notre Histoire"
 @app.route('/about')
 def about():
-    return render_template('about.html')
+    return render_cached(('about',), 'about.html')
 
 # Route pour la page "Nos Marchés"
 @app.route('/markets')
 def markets():
-    return render_template('markets.html')
+    return render_cached(('markets',), 'markets.html')
 
 # Route pour la page "Produits de Saison"
 @app.route('/seasonal')
 def seasonal():
-    return render_template('seasonal.html')
+    return render_cached(('seasonal',), 'seasonal.html')
 
 # Route pour la page produit
 @app.route('/product/<int:product_id>')
 def product_detail(product_id):
     """Page de détails d'un produit"""
     try:
-        product_response = requests.get(f'{API_URL}/api/products/{product_id}')
-        stock_response = requests.get(f'{API_URL}/api/stock/{product_id}')
+        # Fiche et stock en un seul appel à l'API
+        product_response = api_client.get(f'{API_URL}/api/products/{product_id}', params={'include': 'stock'})
         
         if product_response.status_code == 200:
             product = product_response.json()
-            stock = stock_response.json().get('stock', 0) if stock_response.status_code == 200 else 0
+            stock = product.get('stock') or 0
             return render_template('product.html', product=product, stock=stock)
         else:
             return render_template('error.html', message='Produit non trouvé'), 404
     except Exception as e:
-        print(f"Erreur lors de la récupération du produit: {e}")
+        log.exception("Erreur lors de la récupération du produit: %s", e)
         return render_template('error.html', message='Erreur de connexion au serveur'), 500
 
 # Route pour ajouter au panier
@@ -102,9 +237,8 @@ def add_to_cart():
     # Mark session as modified to ensure it saves
     session.modified = True
     
-    # Debug: afficher le contenu du panier
-    print(f"Produit ajouté au panier: {product_id}, Quantité: {quantity}")
-    print(f"Contenu du panier: {session['cart']}")
+    log.debug("Produit ajouté au panier: %s, Quantité: %s", product_id, quantity)
+    log.debug("Contenu du panier: %s", session['cart'])
     
     return redirect(url_for('view_cart'))
 
@@ -117,24 +251,15 @@ def view_cart():
     if not cart:
         return render_template('cart.html', cart={}, total=0)
     
-    products = []
-    total = 0
-    
-    for product_id, quantity in cart.items():
-        try:
-            response = requests.get(f'{API_URL}/api/products/{product_id}')
-            if response.status_code == 200:
-                product = response.json()
-                # Ensure the product ID is preserved for cart operations
-                product['id'] = str(product.get('id', product_id))
-                product['quantity'] = quantity
-                product['subtotal'] = product.get('price', 0) * quantity
-                products.append(product)
-                total += product['subtotal']
-        except Exception as e:
-            print(f"Erreur lors de la récupération du produit {product_id}: {e}")
+    try:
+        # Prix, sous-totaux et stock de toutes les lignes en un seul appel
+        quote = quote_cart(cart)
+    except Exception as e:
+        log.exception("Erreur lors du chiffrage du panier: %s", e)
+        flash('Impossible de calculer le panier pour le moment', 'danger')
+        return render_template('cart.html', cart=[], total=0)
     
-    return render_template('cart.html', cart=products, total=total)
+    return render_template('cart.html', cart=quote['lines'], total=quote['total'])
 
 # Route pour mettre à jour le panier
 @app.route('/update_cart', methods=['POST'])
@@ -143,21 +268,20 @@ def update_cart():
     product_id = str(request.form.get('product_id'))  # Convert to string for consistent session keys
     new_quantity = int(request.form.get('quantity', 0))
     
-    # Debug: afficher les informations
-    print(f"Mise à jour du panier: Produit {product_id}, Nouvelle quantité: {new_quantity}")
+    log.debug("Mise à jour du panier: Produit %s, Nouvelle quantité: %s", product_id, new_quantity)
     
     if new_quantity <= 0:
         if 'cart' in session and product_id in session['cart']:
             del session['cart'][product_id]
             session.modified = True
-            print(f"Produit {product_id} supprimé du panier")
+            log.debug("Produit %s supprimé du panier", product_id)
     else:
         if 'cart' in session:
             session['cart'][product_id] = new_quantity
             session.modified = True
-            print(f"Quantité mise à jour: {new_quantity}")
+            log.debug("Quantité mise à jour: %s", new_quantity)
     
-    print(f"Contenu final du panier: {session.get('cart', {})}")
+    log.debug("Contenu final du panier: %s", session.get('cart', {}))
     
     return redirect(url_for('view_cart'))
 
@@ -169,9 +293,9 @@ def remove_from_cart(product_id):
     if 'cart' in session and product_id in session['cart']:
         del session['cart'][product_id]
         session.modified = True
-        print(f"Produit {product_id} supprimé du panier")
+        log.debug("Produit %s supprimé du panier", product_id)
     
-    print(f"Contenu du panier après suppression: {session.get('cart', {})}")
+    log.debug("Contenu du panier après suppression: %s", session.get('cart', {}))
     
     return redirect(url_for('view_cart'))
 
@@ -188,20 +312,25 @@ def checkout():
             'phone': request.form.get('phone')
         }
         
-        # Créer le client dans Dolibarr
         try:
-            customer_response = requests.post(f'{API_URL}/api/customers', json=customer_data)
+            cart = session.get('cart', {})
+            if not cart:
+                return render_template('checkout.html', error='Votre panier est vide')
+            
+            # Vérifier prix et disponibilité avant de créer le client et la commande
+            quote = quote_cart(cart)
+            if not quote['available']:
+                return render_template('checkout.html', cart_items=quote['lines'], total=quote['total'],
+                                       error='Stock insuffisant pour certains produits')
+            
+            # Créer le client dans Dolibarr
+            customer_response = api_session.post(f'{API_URL}/api/customers', json=customer_data)
             if customer_response.status_code != 200:
                 return render_template('checkout.html', error='Erreur lors de la création du client')
                 
             customer = customer_response.json()
             customer_id = customer.get('id')
             
-            # Créer la commande
-            cart = session.get('cart', {})
-            if not cart:
-                return render_template('checkout.html', error='Votre panier est vide')
-            
             # Préparer les données de la commande
             order_items = []
             for product_id, quantity in cart.items():
@@ -217,7 +346,7 @@ def checkout():
             }
             
             # Créer la commande dans Dolibarr
-            order_response = requests.post(f'{API_URL}/api/orders', json=order_data)
+            order_response = api_session.post(f'{API_URL}/api/orders', json=order_data)
             
             if order_response.status_code == 200:
                 # Vider le panier après la commande
@@ -227,7 +356,7 @@ def checkout():
                 return render_template('checkout.html', error='Erreur lors de la création de la commande')
                 
         except Exception as e:
-            print(f"Erreur lors du checkout: {e}")
+            log.exception("Erreur lors du checkout: %s", e)
             return render_template('checkout.html', error='Erreur de connexion au serveur')
     
     # Si GET, afficher le formulaire de checkout
@@ -235,7 +364,13 @@ def checkout():
     if not cart:
         return redirect(url_for('home'))
     
-    return render_template('checkout.html')
+    try:
+        quote = quote_cart(cart)
+    except Exception as e:
+        log.exception("Erreur lors du chiffrage du panier: %s", e)
+        return render_template('checkout.html', cart_items=[], total=0, error='Erreur de connexion au serveur')
+    
+    return render_template('checkout.html', cart_items=quote['lines'], total=quote['total'])
 
 @app.route('/demo_end')
 def demo_end():
@@ -276,96 +411,73 @@ def admin_dashboard():
 def admin_products():
     """Gestion des produits admin"""
     try:
-        response = requests.get(f'{API_URL}/api/products')
+        response = fetch_page('/api/products', request.args.get('cursor'))
         if response.status_code == 200:
             products = response.json()
-            return render_template('admin/products.html', products=products)
+            next_cursor, total = page_meta(response)
+            return render_template('admin/products.html', products=products, next_cursor=next_cursor, total=total)
         else:
             return render_template('admin/products.html', products=[], error='Impossible de charger les produits')
     except Exception as e:
-        print(f"Erreur lors de la récupération des produits: {e}")
+        log.exception("Erreur lors de la récupération des produits: %s", e)
         return render_template('admin/products.html', products=[], error='Erreur de connexion au serveur')
 
 @app.route('/admin/stock')
 def admin_stock():
     """Gestion des stocks admin"""
     try:
-        # Récupérer les produits avec leurs stocks
-        products_response = requests.get(f'{API_URL}/api/products')
+        # Récupérer une page de produits avec leurs stocks
+        products_response = fetch_page('/api/products', request.args.get('cursor'))
         
         if products_response.status_code == 200:
             products = products_response.json()
+            next_cursor, total = page_meta(products_response)
             
-            # Pour chaque produit, récupérer son stock
+            # Récupérer les stocks de la page en un seul appel
+            stocks = fetch_stocks([product['id'] for product in products])
             for product in products:
-                stock_response = requests.get(f'{API_URL}/api/stock/{product["id"]}')
-                if stock_response.status_code == 200:
-                    product['stock'] = stock_response.json().get('stock', 0)
-                else:
-                    product['stock'] = 0
+                product['stock'] = stocks.get(str(product['id']), 0)
             
-            return render_template('admin/stock.html', products=products)
+            return render_template('admin/stock.html', products=products, next_cursor=next_cursor, total=total)
         else:
             return render_template('admin/stock.html', products=[], error='Impossible de charger les produits et stocks')
     except Exception as e:
-        print(f"Erreur lors de la récupération des stocks: {e}")
+        log.exception("Erreur lors de la récupération des stocks: %s", e)
         return render_template('admin/stock.html', products=[], error='Erreur de connexion au serveur')
 
 @app.route('/admin/stock/export')
 def export_stock():
-    """Export des stocks en CSV"""
+    """Export des stocks en CSV, relayé en flux depuis l'API (?warehouses=1 : une colonne par entrepôt)"""
+    params = {}
+    if request.args.get('warehouses') == '1':
+        params['warehouses'] = '1'
+    # Le flux reste compressé de bout en bout si le navigateur accepte gzip
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        params['gzip'] = '1'
+    
     try:
-        # Récupérer les produits avec leurs stocks
-        products_response = requests.get(f'{API_URL}/api/products')
-        
-        if products_response.status_code == 200:
-            products = products_response.json()
-            
-            # Pour chaque produit, récupérer son stock
-            stock_data = []
-            for product in products:
-                stock_response = requests.get(f'{API_URL}/api/stock/{product["id"]}')
-                if stock_response.status_code == 200:
-                    stock = stock_response.json().get('stock', 0)
-                else:
-                    stock = 0
-                
-                stock_data.append({
-                    'id': product['id'],
-                    'name': product['name'],
-                    'price': product['price'],
-                    'stock': stock
-                })
-            
-            # Créer un fichier CSV
-            import csv
-            from io import StringIO
-            
-            si = StringIO()
-            cw = csv.writer(si)
-            cw.writerow(['ID', 'Nom', 'Prix', 'Stock'])
-            
-            for item in stock_data:
-                cw.writerow([item['id'], item['name'], item['price'], item['stock']])
-            
-            output = si.getvalue()
-            
-            return Response(
-                output,
-                mimetype='text/csv',
-                headers={'Content-Disposition': 'attachment;filename=stock_export.csv'}
-            )
-        else:
-            flash('Impossible de charger les données de stock pour l\'export', 'danger')
-            return redirect(url_for('admin_stock'))
-    except Exception as e:
-        print(f"Erreur lors de l'export des stocks: {e}")
-        flash('Erreur lors de l\'export des stocks', 'danger')
+        api_response = api_session.get(f'{API_URL}/api/stock/export', params=params, stream=True, timeout=(3, 300))
+        api_response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        log.error("Erreur lors de l'export des stocks: %s", e)
+        flash('Impossible de charger les données de stock pour l\'export', 'danger')
         return redirect(url_for('admin_stock'))
+    
+    def relay():
+        try:
+            yield from api_response.raw.stream(STOCK_EXPORT_CHUNK_SIZE, decode_content=False)
+        finally:
+            api_response.close()
+    
+    headers = {'Content-Disposition': 'attachment;filename=stock_export.csv'}
+    if api_response.headers.get('Content-Encoding') == 'gzip':
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    return Response(relay(), mimetype='text/csv', headers=headers)
 
 @app.route('/admin/stock/import', methods=['POST'])
 def import_stock():
-    """Import des stocks depuis un fichier CSV"""
+    """Import des stocks depuis un fichier CSV : envoyé en flux à l'API, traité en tâche de fond"""
     if 'file' not in request.files:
         flash('Aucun fichier sélectionné', 'danger')
         return redirect(url_for('admin_stock'))
@@ -378,40 +490,75 @@ def import_stock():
     
     if file and file.filename.endswith('.csv'):
         try:
-            import csv
-            from io import StringIO
-            
-            stream = StringIO(file.stream.read().decode("UTF8"))
-            csv_input = csv.reader(stream)
-            
-            # Sauter l'en-tête
-            next(csv_input)
-            
-            updated_count = 0
-            
-            for row in csv_input:
-                if len(row) >= 4:
-                    product_id = row[0]
-                    stock_quantity = row[3]
-                    
-                    # Mettre à jour le stock via l'API
-                    stock_data = {'stock': int(stock_quantity)}
-                    update_response = requests.put(f'{API_URL}/api/stock/{product_id}', json=stock_data)
-                    
-                    if update_response.status_code == 200:
-                        updated_count += 1
+            # Corps transmis par blocs, sans charger le fichier en mémoire
+            response = api_session.post(
+                f'{API_URL}/api/stock/import',
+                params={'filename': file.filename},
+                data=file.stream,
+                headers={'Content-Type': 'text/csv'}
+            )
+            if response.status_code != 202:
+                flash(response.json().get('error', 'Erreur lors de l\'import des stocks'), 'danger')
+                return redirect(url_for('admin_stock'))
             
-            flash(f'Import terminé ! {updated_count} produits mis à jour', 'success')
-            return redirect(url_for('admin_stock'))
+            flash('Import lancé : le fichier est traité en arrière-plan', 'success')
+            return redirect(url_for('stock_import_status', job_id=response.json()['id']))
             
         except Exception as e:
-            print(f"Erreur lors de l'import des stocks: {e}")
+            log.exception("Erreur lors de l'import des stocks: %s", e)
             flash('Erreur lors de l\'import des stocks', 'danger')
             return redirect(url_for('admin_stock'))
     else:
         flash('Veuillez sélectionner un fichier CSV valide', 'danger')
         return redirect(url_for('admin_stock'))
 
+@app.route('/admin/stock/import/<job_id>')
+def stock_import_status(job_id):
+    """Suivi d'un import de stock (JSON avec ?format=json, pour le rafraîchissement de la page)"""
+    try:
+        response = api_session.get(f'{API_URL}/api/stock/import/{job_id}')
+        if request.args.get('format') == 'json':
+            return jsonify(response.json()), response.status_code
+        if response.status_code != 200:
+            flash('Import non trouvé', 'danger')
+            return redirect(url_for('admin_stock'))
+        return render_template('admin/stock_import.html', job=response.json())
+    except Exception as e:
+        log.exception("Erreur lors du suivi de l'import %s: %s", job_id, e)
+        if request.args.get('format') == 'json':
+            return jsonify({'error': 'Erreur de connexion au serveur'}), 502
+        return render_template('admin/stock_import.html', job=None, error='Erreur de connexion au serveur')
+
+@app.route('/admin/stock/import/<job_id>/errors')
+def stock_import_errors(job_id):
+    """Rapport d'erreurs CSV d'un import, relayé depuis l'API"""
+    try:
+        response = api_session.get(f'{API_URL}/api/stock/import/{job_id}/errors', stream=True)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        log.error("Erreur lors du rapport d'erreurs de l'import %s: %s", job_id, e)
+        flash('Rapport d\'erreurs indisponible', 'danger')
+        return redirect(url_for('stock_import_status', job_id=job_id))
+    return Response(
+        response.iter_content(STOCK_EXPORT_CHUNK_SIZE),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment;filename=import_{job_id}_erreurs.csv'}
+    )
+
+@app.route('/admin/stock/import/<job_id>/resume', methods=['POST'])
+def resume_stock_import(job_id):
+    """Reprend un import interrompu après le dernier lot validé"""
+    try:
+        response = api_session.post(f'{API_URL}/api/stock/import/{job_id}/resume')
+        if response.status_code == 202:
+            flash('Import repris', 'success')
+        else:
+            flash(response.json().get('error', 'Reprise impossible'), 'danger')
+    except Exception as e:
+        log.exception("Erreur lors de la reprise de l'import %s: %s", job_id, e)
+        flash('Erreur de connexion au serveur', 'danger')
+    return redirect(url_for('stock_import_status', job_id=job_id))
+
 @app.route('/admin/stock/update/<int:product_id>', methods=['POST'])
 def update_stock(product_id):
     """Mise à jour individuelle du stock d'un produit"""
@@ -424,32 +571,63 @@ def update_stock(product_id):
         
         # Mettre à jour le stock via l'API
         stock_data = {'stock': int(stock_quantity)}
-        update_response = requests.put(f'{API_URL}/api/stock/{product_id}', json=stock_data)
+        update_response = api_session.put(f'{API_URL}/api/stock/{product_id}', json=stock_data)
         
         if update_response.status_code == 200:
             return jsonify({'success': True, 'message': 'Stock mis à jour avec succès'})
+        elif update_response.status_code in (400, 404, 409):
+            return jsonify({'success': False, 'error': update_response.json().get('error')}), update_response.status_code
         else:
             return jsonify({'success': False, 'error': 'Erreur lors de la mise à jour du stock'}), 500
             
     except Exception as e:
-        print(f"Erreur lors de la mise à jour du stock: {e}")
+        log.exception("Erreur lors de la mise à jour du stock: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/admin/orders')
 def admin_orders():
     """Gestion des commandes admin"""
     try:
-        # Récupérer les commandes depuis l'API
-        orders_response = requests.get(f'{API_URL}/api/orders')
+        # Récupérer une page de commandes depuis l'API
+        orders_response = fetch_page('/api/orders', request.args.get('cursor'))
         
         if orders_response.status_code == 200:
             orders = orders_response.json()
-            return render_template('admin/orders.html', orders=orders)
+            next_cursor, total = page_meta(orders_response)
+            return render_template('admin/orders.html', orders=orders, next_cursor=next_cursor, total=total)
         else:
             return render_template('admin/orders.html', orders=[], error='Impossible de charger les commandes')
     except Exception as e:
-        print(f"Erreur lors de la récupération des commandes: {e}")
+        log.exception("Erreur lors de la récupération des commandes: %s", e)
         return render_template('admin/orders.html', orders=[], error='Erreur de connexion au serveur')
 
+def compile_templates():
+    """Compile tous les gabarits Jinja (conservés compilés par l'environnement de l'application)"""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+def warm_home_page():
+    """Grille produits de la page d'accueil sans filtre, lue auprès de l'API et mise en cache"""
+    with app.test_request_context('/'):
+        blocks = page_cache.get_or_render(('home', '', '', ''), lambda: render_home('', '', ''))
+    if blocks is None:
+        raise RuntimeError("Catalogue refusé par l'API")
+
+# Préchauffage : gabarits compilés, connexion à l'API ouverte et page d'accueil en cache (GET /ready)
+warmup = Warmup()
+warmup.step('templates', compile_templates)
+warmup.step('catalog', warm_home_page)
+warmup.init_app(app)
+
+metrics.collect('warmup_ready', 'Préchauffage du processus terminé', lambda: {(): int(warmup.ready)})
+metrics.collect('warmup_duration_seconds', 'Durée du préchauffage du processus',
+                lambda: {(): warmup.stats()['duration_seconds'] or 0})
+metrics.collect('warmup_step_duration_seconds', 'Durée de chaque étape du préchauffage',
+                lambda: {(result['step'],): result['seconds'] for result in warmup.stats()['steps']}, ('step',))
+
 if __name__ == '__main__':
+    # En tâche de fond : /live répond aussitôt, /ready une fois le préchauffage terminé ; seulement dans le
+    # processus qui sert les requêtes, pas dans celui qui surveille les fichiers pour le rechargement (debug)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warmup.start()
     app.run(host='0.0.0.0', port=5001, debug=True)
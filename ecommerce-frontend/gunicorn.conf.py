@@ -0,0 +1,15 @@
+"""Configuration gunicorn du frontend
+
+Le conteneur lance `python app.py` (serveur de développement) ; ce fichier
+sert aux déploiements et aux benchmarks sous gunicorn, dont les options de
+ligne de commande (-w, -k, --threads, -b) priment.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+
+def post_worker_init(worker):
+    # Gabarits compilés et page d'accueil en cache avant la première requête du worker
+    from app import warmup
+    warmup.run(notify=worker.notify)
@@ -0,0 +1,90 @@
+"""Cache des fragments de pages rendus par le frontend"""
+import threading
+import time
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+# Blocs de base.html propres à chaque page ; le reste du gabarit (badge du
+# panier, messages flash) dépend du visiteur et est rendu à chaque requête
+PAGE_BLOCKS = ('title', 'content', 'scripts')
+
+
+def render_blocks(app, template_name, **context):
+    """Rend uniquement les blocs PAGE_BLOCKS d'un gabarit qui étend base.html"""
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    return {
+        name: Markup(''.join(template.blocks[name](template.new_context(context))))
+        for name in PAGE_BLOCKS if name in template.blocks
+    }
+
+
+class FragmentCache:
+    """Fragments HTML rendus, conservés `ttl` secondes, au plus `max_entries` (LRU).
+
+    Les clés sont des tuples dont le premier élément est le nom de la route,
+    ce qui permet de purger une route seule.
+    """
+
+    def __init__(self, ttl=60, max_entries=512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._purges = 0
+
+    def get_or_render(self, key, render):
+        """Fragment en cache pour `key`, sinon le résultat de render() (None : ne pas mettre en cache)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+            generation = self._generation
+
+        fragment = render()
+        if fragment is None:
+            return None
+
+        with self._lock:
+            # Purgé pendant le rendu : le fragment est peut-être déjà périmé
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic(), fragment)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return fragment
+
+    def purge(self, route=None):
+        """Supprime les fragments d'une route, ou tous ; renvoie le nombre supprimé"""
+        with self._lock:
+            if route is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                keys = [key for key in self._entries if key[0] == route]
+                for key in keys:
+                    del self._entries[key]
+                removed = len(keys)
+            self._generation += 1
+            self._purges += 1
+            return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ttl': self.ttl,
+                'max_entries': self.max_entries,
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'purges': self._purges,
+            }
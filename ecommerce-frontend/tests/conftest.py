@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules du frontend importés comme sous gunicorn (répertoire de l'application)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,101 @@
+"""Cache des fragments de pages et revalidation conditionnelle des appels à l'API"""
+import threading
+
+from api_client import RevalidatingClient
+from page_cache import FragmentCache
+
+
+def test_fragments_expire_and_are_evicted(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('page_cache.time.monotonic', lambda: now[0])
+    cache = FragmentCache(ttl=60, max_entries=2)
+    renders = []
+
+    def render(value):
+        renders.append(value)
+        return value
+
+    assert cache.get_or_render(('home',), lambda: render('a')) == 'a'
+    assert cache.get_or_render(('home',), lambda: render('b')) == 'a'
+    now[0] += 61
+    assert cache.get_or_render(('home',), lambda: render('c')) == 'c'
+    cache.get_or_render(('product', 1), lambda: render('p1'))
+    cache.get_or_render(('product', 2), lambda: render('p2'))
+    assert cache.stats()['entries'] == 2
+    assert cache.get_or_render(('home',), lambda: render('d')) == 'd'
+    assert renders == ['a', 'c', 'p1', 'p2', 'd']
+    assert cache.get_or_render(('error',), lambda: None) is None
+    assert cache.stats()['hits'] == 1
+
+
+def test_purge_by_route_and_render_started_before_a_purge():
+    cache = FragmentCache()
+    cache.get_or_render(('home',), lambda: 'home')
+    cache.get_or_render(('product', 1), lambda: 'p1')
+    cache.get_or_render(('product', 2), lambda: 'p2')
+    assert cache.purge('product') == 2
+    assert cache.get_or_render(('home',), lambda: 'other') == 'home'
+
+    # Rendu commencé avant la purge : servi mais pas conservé
+    def render():
+        cache.purge()
+        return 'stale'
+
+    assert cache.get_or_render(('product', 1), render) == 'stale'
+    assert cache.get_or_render(('product', 1), lambda: 'fresh') == 'fresh'
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+
+
+class FakeSession:
+    """API simulée : répond 304 si le validateur envoyé correspond à la version courante"""
+
+    def __init__(self):
+        self.version = '"v1"'
+        self.sent = []
+        self.before_response = None
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        self.sent.append(dict(headers))
+        if self.before_response is not None:
+            self.before_response()
+        if headers.get('If-None-Match') == self.version:
+            return FakeResponse(304, {'ETag': self.version})
+        return FakeResponse(200, {'ETag': self.version}, body=f'{url} {self.version}')
+
+
+def test_revalidation_returns_the_stored_response_on_304():
+    session = FakeSession()
+    client = RevalidatingClient(session=session)
+    first = client.get('/api/products', params={'season': 'Été'})
+    assert client.get('/api/products', params={'season': 'Été'}) is first
+    assert session.sent[1] == {'If-None-Match': '"v1"'}
+
+    session.version = '"v2"'
+    changed = client.get('/api/products', params={'season': 'Été'})
+    assert changed.body == '/api/products "v2"'
+    assert client.get('/api/products', params={'season': 'Été'}) is changed
+    assert client.stats()['not_modified'] == 2
+
+
+def test_entry_evicted_during_the_call_is_kept_again():
+    session = FakeSession()
+    client = RevalidatingClient(max_entries=1, session=session)
+    cached = client.get('/api/products')
+
+    def other_thread():
+        # Un autre thread remplit le cache pendant la revalidation
+        session.before_response = None
+        thread = threading.Thread(target=client.get, args=('/api/categories',))
+        thread.start()
+        thread.join()
+
+    session.before_response = other_thread
+    assert client.get('/api/products') is cached
+    assert client.get('/api/products') is cached
+    assert session.sent[-1] == {'If-None-Match': '"v1"'}
@@ -0,0 +1,100 @@
+"""Préchauffage au démarrage d'un processus, routes /live et /ready
+
+Une copie identique de ce module se trouve dans l'API et le frontend (chacun
+est construit depuis son propre répertoire) : les modifier ensemble.
+
+- les étapes (connexions, catalogue, gabarits) s'exécutent une fois, dans
+  l'ordre : run() bloque jusqu'à la fin (post_worker_init de gunicorn : le
+  worker n'accepte de connexions qu'une fois préchauffé), start() les lance en
+  tâche de fond (serveur de développement)
+- une étape en échec est journalisée sans arrêter les suivantes : la ressource
+  est alors chargée à sa première utilisation, comme sans préchauffage
+- /live : le processus répond, sans autre condition
+- /ready : 503 tant que le préchauffage n'est pas terminé, puis 200 ; le corps
+  donne la durée totale et celle de chaque étape
+"""
+import logging
+import os
+import threading
+import time
+
+from flask import jsonify
+
+log = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Étapes de préchauffage d'une application, exposées par init_app() sur /live et /ready"""
+
+    def __init__(self):
+        self._steps = []
+        self._results = []
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self._created = time.time()
+        self._duration = None
+
+    def step(self, name, function):
+        """Ajoute une étape : function() est appelée sans argument, ses exceptions sont journalisées"""
+        self._steps.append((name, function))
+
+    @property
+    def ready(self):
+        return self._duration is not None
+
+    def run(self, notify=None):
+        """Exécute les étapes (une seule fois par processus) ; renvoie la durée totale en secondes.
+
+        notify : appelée après chaque étape (signal de vie d'un worker gunicorn,
+        qui serait sinon arrêté par le maître au-delà de son timeout).
+        """
+        with self._run_lock:
+            if self._duration is not None:
+                return self._duration
+            started = time.perf_counter()
+            for name, function in self._steps:
+                step_started = time.perf_counter()
+                error = None
+                try:
+                    function()
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+                    log.warning("Préchauffage : étape %s en échec: %s", name, error)
+                self._results.append({
+                    'step': name,
+                    'seconds': round(time.perf_counter() - step_started, 3),
+                    'error': error,
+                })
+                if notify is not None:
+                    notify()
+            self._duration = time.perf_counter() - started
+        log.info("Préchauffage terminé en %.3f s (%s)", self._duration,
+                 ', '.join(f"{result['step']} {result['seconds']} s" for result in self._results))
+        return self._duration
+
+    def start(self):
+        """Lance run() dans un thread ; /ready répond 503 jusqu'à la fin"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        results = list(self._results)
+        return {
+            'ready': self.ready,
+            'duration_seconds': round(self._duration, 3) if self._duration is not None else None,
+            'failed': [result['step'] for result in results if result['error']],
+            'steps': results,
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self._created, 1),
+        }
+
+    def init_app(self, app):
+        """Routes /live (processus vivant) et /ready (préchauffage terminé)"""
+        app.add_url_rule('/live', 'live', lambda: jsonify({'live': True, 'pid': os.getpid()}))
+
+        def ready():
+            stats = self.stats()
+            return jsonify(stats), 200 if stats['ready'] else 503
+
+        app.add_url_rule('/ready', 'ready', ready)